@@ -0,0 +1,38 @@
+"""
+Dependencias de FastAPI sobre los recursos del lifespan.
+"""
+from typing import Any, Optional
+
+from fastapi import Depends, Request
+from langchain_core.vectorstores import VectorStore
+
+from app.resources import AppResources
+from app.services.quality import QualityEvaluator
+from app.services.single_flight import SingleFlight
+from app.services.triaje import TriajeService
+
+
+def get_resources(request: Request) -> AppResources:
+    return request.app.state.resources
+
+
+def get_vector_store(resources: AppResources = Depends(get_resources)) -> VectorStore:
+    return resources.vector_store
+
+
+def get_db_pool(resources: AppResources = Depends(get_resources)) -> Optional[Any]:
+    return resources.db_pool
+
+
+def get_redis(resources: AppResources = Depends(get_resources)) -> Optional[Any]:
+    return resources.redis
+
+
+def get_triaje_service(resources: AppResources = Depends(get_resources)) -> TriajeService:
+    """Servicio de triaje sobre el LLM y el vector store compartidos."""
+    evaluator = QualityEvaluator(resources.evaluator_llm) if resources.evaluator_llm is not None else None
+    return TriajeService(resources.llm, resources.vector_store, evaluator=evaluator)
+
+
+def get_single_flight(request: Request) -> SingleFlight:
+    return request.app.state.single_flight
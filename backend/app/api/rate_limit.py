@@ -0,0 +1,239 @@
+"""
+Rate limiting por usuario/sesión (`max_requests_per_minute`) y por IP.
+
+GCRA (generic cell rate algorithm): por clave se guarda un solo número, el
+"theoretical arrival time" (TAT). Cada petición lo adelanta un intervalo
+(60 / límite segundos); se rechaza si quedaría más de `burst` intervalos por
+delante del reloj. En Redis el cálculo corre en un script Lua atómico con el
+reloj del servidor, así que el límite se cumple entre workers y pods. Si
+Redis no está disponible se usa un limitador en memoria del proceso.
+
+Los IDs de usuario/sesión los envía el cliente sin autenticar: bastaría uno
+nuevo por petición para no toparse nunca con el límite. Por eso cada
+petición pasa además por un límite por IP (`rate_limit_ip_requests_per_minute`),
+más holgado porque una IP puede agrupar a varios usuarios detrás de un NAT.
+
+El middleware actúa antes de enrutar: una petición rechazada nunca llega a
+llamar al LLM.
+"""
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_MAX_BODY_PEEK = 64 * 1024
+
+GCRA_LUA = """
+local key = KEYS[1]
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', key) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+    return {0, allow_at - now, 0}
+end
+redis.call('SET', key, new_tat, 'PX', new_tat - now)
+return {1, 0, math.floor((now - allow_at) / interval)}
+"""
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    retry_after: float   # segundos hasta poder reintentar
+    remaining: int       # peticiones disponibles sin esperar
+
+
+class MemoryRateLimiter:
+    """GCRA en memoria del proceso (respaldo sin Redis)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tat: Dict[str, float] = {}
+
+    async def hit(self, key: str, interval: float, burst: int) -> RateLimitDecision:
+        now = time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + interval
+        allow_at = new_tat - burst * interval
+        if now < allow_at:
+            return RateLimitDecision(False, allow_at - now, 0)
+        if len(self._tat) >= self.max_keys and key not in self._tat:
+            self._prune(now)
+        self._tat[key] = new_tat
+        return RateLimitDecision(True, 0.0, int((now - allow_at) // interval))
+
+    def _prune(self, now: float):
+        # Claves cuyo TAT ya pasó equivalen a no tener historial
+        self._tat = {key: tat for key, tat in self._tat.items() if tat > now}
+
+
+class RedisRateLimiter:
+    """GCRA atómico en Redis (script Lua con el reloj del servidor)."""
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_LUA)
+
+    async def hit(self, key: str, interval: float, burst: int) -> RateLimitDecision:
+        allowed, retry_ms, remaining = await self._script(
+            keys=[f"{self.prefix}:{key}"], args=[int(interval * 1000), burst]
+        )
+        return RateLimitDecision(bool(allowed), int(retry_ms) / 1000, int(remaining))
+
+
+def _client_ip(scope) -> str:
+    if settings.rate_limit_trust_forwarded:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _identity_from_headers(scope) -> Optional[str]:
+    headers = dict(scope.get("headers", []))
+    for header, kind in ((b"x-user-id", "user"), (b"x-session-id", "session")):
+        if headers.get(header):
+            return f"{kind}:{headers[header].decode('latin-1')}"
+    return None
+
+
+def _identity_from_body(body: bytes) -> Optional[str]:
+    """`user_id` o `session_id` del JSON de `TriajeRequest`."""
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    for field, kind in (("user_id", "user"), ("session_id", "session")):
+        if data.get(field):
+            return f"{kind}:{data[field]}"
+    return None
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que aplica el límite a las rutas bajo `api_prefix`.
+
+    La identidad es, en orden: cabeceras X-User-Id / X-Session-Id, los campos
+    `user_id` / `session_id` del cuerpo JSON y la IP del cliente. La IP se
+    limita siempre, haya o no identidad.
+    """
+
+    def __init__(self, app, path_prefix: Optional[str] = None):
+        self.app = app
+        self.path_prefix = path_prefix if path_prefix is not None else settings.api_prefix
+        self.memory = MemoryRateLimiter()
+        self._redis_limiter: Optional[RedisRateLimiter] = None
+        self._redis_client = None
+
+    def _limiter(self, scope):
+        """Limitador Redis de los recursos del lifespan, o el de memoria."""
+        resources = getattr(getattr(scope.get("app"), "state", None), "resources", None)
+        client = getattr(resources, "redis", None)
+        if client is None:
+            return self.memory
+        if client is not self._redis_client:
+            self._redis_client = client
+            self._redis_limiter = RedisRateLimiter(client)
+        return self._redis_limiter
+
+    async def _hit(self, limiter, key: str, limit: int, burst: int) -> RateLimitDecision:
+        interval = 60.0 / limit
+        burst = max(1, burst)
+        try:
+            return await limiter.hit(key, interval, burst)
+        except Exception as exc:
+            logger.warning(f"Rate limiter en Redis falló, usando memoria: {exc}")
+            return await self.memory.hit(key, interval, burst)
+
+    async def _read_body(self, receive) -> Tuple[bytes, list]:
+        messages, body = [], b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body") or len(body) > _MAX_BODY_PEEK:
+                break
+        return body, messages
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.rate_limit_enabled
+            or not scope["path"].startswith(self.path_prefix)
+            or scope["method"] == "OPTIONS"
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        identity = _identity_from_headers(scope)
+        if identity is None and scope["method"] in ("POST", "PUT", "PATCH"):
+            body, messages = await self._read_body(receive)
+            identity = _identity_from_body(body)
+
+            # Reinyectar el cuerpo ya leído para la aplicación
+            async def replay(receive=receive):
+                if messages:
+                    return messages.pop(0)
+                return await receive()
+            receive = replay
+
+        ip = _client_ip(scope)
+        checks = [
+            # Límite por IP: siempre, con clave propia para no compartir TAT
+            (f"net:{ip}", settings.rate_limit_ip_requests_per_minute, settings.rate_limit_ip_burst),
+            (identity or f"ip:{ip}", settings.max_requests_per_minute, settings.rate_limit_burst),
+        ]
+        limiter = self._limiter(scope)
+        limit, decision = 0, None
+        for key, key_limit, burst in checks:
+            result = await self._hit(limiter, key, key_limit, burst)
+            # Se informa el límite más restrictivo (o el que rechazó)
+            if decision is None or not result.allowed or result.remaining < decision.remaining:
+                limit, decision = key_limit, result
+            if not result.allowed:
+                break
+
+        rate_headers = [
+            (b"x-ratelimit-limit", str(limit).encode()),
+            (b"x-ratelimit-remaining", str(decision.remaining).encode()),
+        ]
+        if not decision.allowed:
+            retry_after = max(1, math.ceil(decision.retry_after))
+            body = json.dumps({"detail": "Demasiadas solicitudes, intente más tarde"}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                    *rate_headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *rate_headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
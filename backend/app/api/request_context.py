@@ -0,0 +1,46 @@
+"""
+Middleware que fija el contexto de logging de cada petición.
+"""
+import re
+import uuid
+
+from app.monitoring.context import bind_context, reset_context
+
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestContextMiddleware:
+    """
+    Asigna un `request_id` por petición (el de `X-Request-ID` si es válido)
+    y lo devuelve en la respuesta. `X-User-Id` / `X-Session-Id`, si vienen,
+    quedan como `user_id` / `case_id` del contexto.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        tokens = bind_context(
+            request_id=request_id,
+            user_id=headers[b"x-user-id"].decode("latin-1") if b"x-user-id" in headers else None,
+            case_id=headers[b"x-session-id"].decode("latin-1") if b"x-session-id" in headers else None,
+        )
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            reset_context(tokens)
@@ -0,0 +1,62 @@
+"""
+Endpoint de triaje jurídico con Server-Sent Events.
+"""
+import json
+import logging
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import get_single_flight, get_triaje_service
+from app.config import settings
+from app.models.schemas import TriajeRequest
+from app.rag.answer_cache import question_key
+from app.services.single_flight import SingleFlight
+from app.services.triaje import TriajeEvent, TriajeService
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["triaje"])
+
+
+def encode_sse(event: TriajeEvent) -> str:
+    """Serializa un evento en formato SSE."""
+    return f"event: {event.event}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/triaje")
+async def triaje(
+    request: TriajeRequest,
+    service: TriajeService = Depends(get_triaje_service),
+    flights: SingleFlight = Depends(get_single_flight),
+):
+    """
+    Triaje jurídico en streaming (text/event-stream).
+
+    Eventos: start, references, token (uno por fragmento), result y, si algo
+    falla a mitad del stream, error. Consultas idénticas en vuelo comparten
+    una sola ejecución.
+    """
+    if settings.triaje_coalescing_enabled:
+        source = flights.stream(question_key(request.query), lambda: service.stream(request))
+    else:
+        source = service.stream(request)
+
+    async def events():
+        try:
+            async for event in source:
+                yield encode_sse(event)
+        except Exception:
+            logger.error("Triaje failed", exc_info=True)
+            yield encode_sse(TriajeEvent("error", {"detail": "No fue posible completar el triaje"}))
+        finally:
+            # Si el cliente se desconecta, cerrar `source` ahora (cancela el
+            # grafo y espera su limpieza) en vez de cuando lo recoja el GC
+            await source.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,6 +4,7 @@ Carga variables de entorno y define configuraciones globales.
 """
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -21,6 +22,15 @@ class Settings(BaseSettings):
     openai_api_key: str
     openai_model: str = "gpt-4"
     openai_embedding_model: str = "text-embedding-ada-002"
+    openai_base_url: Optional[str] = None
+    
+    # Proveedor de modelos: openai | fake (LLM y embeddings deterministas, sin red)
+    model_provider: str = "openai"
+    fake_llm_first_token_ms: float = 0.0
+    fake_llm_token_delay_ms: float = 0.0
+    fake_embedding_latency_ms: float = 0.0   # por llamada
+    fake_latency_distribution: str = "fixed"  # fixed | uniform | exponential | lognormal
+    fake_latency_jitter: float = 0.5          # dispersión relativa (uniform: ±, lognormal: sigma)
     
     # PostgreSQL
     postgres_host: str = "localhost"
@@ -28,6 +38,61 @@ class Settings(BaseSettings):
     postgres_db: str = "consultorio_juridico"
     postgres_user: str = "postgres"
     postgres_password: str
+    postgres_pool_min_size: int = 2
+    postgres_pool_max_size: int = 10
+    postgres_pool_max_idle_seconds: float = 300.0
+    postgres_command_timeout: float = 30.0
+    
+    # Indexing
+    index_manifest_dir: str = "data/index_manifests"
+    preprocess_workers: int = 0  # 0 = todos los cores
+    
+    # Vector store
+    vector_store_backend: str = "pgvector"  # pgvector | postgres | local
+    local_index_dir: str = "data/vector_index"
+    local_index_dtype: str = "float32"  # float32 | float16 | int8
+    local_index_search: str = "brute"  # brute | ivf
+    local_index_nprobe: int = 8
+    hnsw_m: int = 16                 # índices de legal_embeddings (setup_db.py / tune_hnsw.py)
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 0          # candidatos por búsqueda en el pool de la API (0 = default del servidor, 40)
+    postgres_copy_threshold: int = 100   # lotes con al menos estas filas se escriben con COPY binario
+    
+    # Retrieval
+    retrieval_mode: str = "vector"  # vector | hybrid (hybrid es opt-in: requiere backend postgres o local)
+    retrieval_fetch_k: int = 20
+    retrieval_rrf_k: int = 60
+    
+    # Triaje
+    triaje_top_k: int = 4
+    triaje_coalescing_enabled: bool = True       # consultas idénticas en vuelo comparten ejecución
+    triaje_coalesce_lock_ttl_seconds: float = 30.0   # se renueva con cada evento del líder
+    triaje_coalesce_stream_ttl_seconds: float = 60.0
+    triaje_structure_timeout_seconds: float = 15.0   # nodo opcional: si vence, se recomienda sin él
+    triaje_retrieval_timeout_seconds: float = 10.0
+    triaje_generation_timeout_seconds: float = 120.0
+    
+    # Answer cache (Redis con respaldo en memoria)
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_seconds: int = 86_400
+    answer_cache_max_entries: int = 10_000
+    answer_cache_prune_interval_seconds: float = 300
+    
+    # Embedding cache
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/cache/embeddings.sqlite3"
+    embedding_cache_max_entries: int = 200_000
+    embedding_cache_touch_interval_seconds: float = 60   # volcado diferido de last_used
+    
+    # Embedding pipeline (límites del proveedor)
+    embedding_requests_per_minute: int = 3000
+    embedding_tokens_per_minute: int = 1_000_000
+    embedding_max_concurrency: int = 8
+    embedding_batch_max_tokens: int = 8000
+    embedding_batch_max_items: int = 256
+    embedding_max_retries: int = 6
+    index_inflight_chunks: int = 2000
     
     # MongoDB
     mongodb_url: str = "mongodb://localhost:27017"
@@ -35,6 +100,14 @@ class Settings(BaseSettings):
     
     # Redis
     redis_url: str = "redis://localhost:6379/0"
+    redis_max_connections: int = 50
+    
+    # Cliente HTTP del proveedor de modelos (compartido, keep-alive)
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    http_timeout_seconds: float = 60.0
     
     # Security
     secret_key: str
@@ -42,15 +115,37 @@ class Settings(BaseSettings):
     
     # Rate Limiting
     max_requests_per_minute: int = 10
+    rate_limit_enabled: bool = True
+    rate_limit_burst: int = 3              # peticiones seguidas permitidas antes de espaciar
+    rate_limit_trust_forwarded: bool = False  # usar X-Forwarded-For (detrás de un proxy)
+    rate_limit_ip_requests_per_minute: int = 30   # siempre, aunque haya user_id/session_id
+    rate_limit_ip_burst: int = 10
     max_iterations: int = 3
     
     # Quality
     min_quality_score: int = 35
     evaluation_temperature: float = 0.0
     
+    # Health checks (probes en segundo plano)
+    health_probe_interval_seconds: float = 10.0
+    health_probe_timeout_seconds: float = 3.0
+    health_stale_after_seconds: float = 30.0
+    
+    # Metrics
+    metrics_quality_window: int = 1000   # casos recientes para las estadísticas de calidad
+    metrics_loop_lag_interval_ms: float = 100.0   # muestreo del retraso del event loop (0 = desactivado)
+    
+    # Tracing (spans por etapa exportados a JSONL)
+    tracing_enabled: bool = False
+    tracing_sample_rate: float = 1.0   # fracción de trazas registradas
+    tracing_export_path: str = "data/traces/spans.jsonl"
+    
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"
+    log_queue_size: int = 10_000
+    log_queue_policy: str = "drop"   # drop | block (con la cola llena)
+    log_sample_rates: dict[str, float] = {}   # DEBUG/INFO por logger, p. ej. {"node.answer": 0.1}
     
     # Legal
     disclaimer_text: str = "La información es orientativa y no constituye asesoría legal profesional."
@@ -1,18 +1,25 @@
 """
 Aplicación principal FastAPI.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import logging
 
 from app.config import settings
+from app.api.rate_limit import RateLimitMiddleware
+from app.api.request_context import RequestContextMiddleware
+from app.api.triaje import router as triaje_router
+from app.monitoring.health import build_health_monitor
+from app.monitoring.logger import setup_logging
+from app.monitoring.loop_lag import LoopLagMonitor
+from app.monitoring.metrics import metrics_collector
+from app.resources import AppResources
+from app.services.single_flight import SingleFlight
 
-# Configurar logging
-logging.basicConfig(
-    level=settings.log_level,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configurar logging (cola + listener en otro hilo)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -22,10 +29,21 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Backend...")
     logger.info(f"Environment: {settings.environment}")
     
+    # Pools y clientes compartidos por todas las peticiones
+    app.state.resources = await AppResources.create()
+    app.state.single_flight = SingleFlight(app.state.resources.redis)
+    app.state.health_monitor = build_health_monitor(app.state.resources)
+    await app.state.health_monitor.start()
+    app.state.loop_lag_monitor = LoopLagMonitor(settings.metrics_loop_lag_interval_ms / 1000)
+    app.state.loop_lag_monitor.start()
+    
     yield
     
     # Cleanup
     logger.info("👋 Shutting down...")
+    await app.state.loop_lag_monitor.stop()
+    await app.state.health_monitor.stop()
+    await app.state.resources.close()
 
 
 # Crear aplicación
@@ -36,15 +54,26 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS
+# Rate limiting por usuario/sesión/IP, antes de cualquier trabajo del LLM
+app.add_middleware(RateLimitMiddleware)
+
+# CORS, por fuera del rate limiting: los 429 también llevan las cabeceras
+# CORS y el frontend puede leer Retry-After
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
+# Contexto de logging por petición (request_id); el más externo, para que
+# todo lo demás lo herede
+app.add_middleware(RequestContextMiddleware)
+
+# Routers
+app.include_router(triaje_router, prefix=settings.api_prefix)
 
 
 @app.get("/")
@@ -59,18 +88,25 @@ async def root():
 
 
 @app.get("/health")
-async def health():
-    """Detailed health check."""
-    return {
-        "status": "healthy",
-        "checks": {
-            "api": "ok",
-            # TODO: Add database checks
-            # "postgres": "ok",
-            # "mongodb": "ok",
-            # "openai": "ok"
-        }
-    }
+async def health(request: Request):
+    """
+    Detailed health check.
+    
+    Devuelve el último resultado de los probes en segundo plano (latencia y
+    antigüedad incluidas) sin consultar las dependencias en cada llamada.
+    """
+    snapshot = request.app.state.health_monitor.snapshot()
+    status_code = 503 if snapshot["status"] == "unhealthy" else 200
+    return JSONResponse(snapshot, status_code=status_code)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(
+        metrics_collector.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+"""
+Contexto de logging propagado con `contextvars`.
+
+El middleware fija `request_id` una vez por petición y el triaje agrega
+`case_id`/`user_id`; `log_node_execution` fija `node_name` dentro de cada
+nodo. `ContextFilter` copia esos valores a cada record, así que cualquier
+logger (incluidas librerías y tareas creadas después) queda correlacionado
+sin pasar contexto en cada llamada. Las tareas de asyncio heredan una copia
+del contexto al crearse.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+case_id_var: ContextVar[Optional[str]] = ContextVar("case_id", default=None)
+user_id_var: ContextVar[Optional[str]] = ContextVar("user_id", default=None)
+node_name_var: ContextVar[Optional[str]] = ContextVar("node_name", default=None)
+
+CONTEXT_VARS: Dict[str, ContextVar] = {
+    "request_id": request_id_var,
+    "case_id": case_id_var,
+    "user_id": user_id_var,
+    "node_name": node_name_var,
+}
+
+
+def bind_context(**values: Optional[str]) -> Dict[ContextVar, object]:
+    """Fija valores de contexto (los None se ignoran); devuelve tokens para `reset_context`."""
+    return {
+        CONTEXT_VARS[name]: CONTEXT_VARS[name].set(value)
+        for name, value in values.items()
+        if value is not None
+    }
+
+
+def reset_context(tokens: Dict[ContextVar, object]):
+    for var, token in tokens.items():
+        var.reset(token)
+
+
+@contextmanager
+def log_context(**values: Optional[str]) -> Iterator[None]:
+    """Contexto de logging durante un bloque."""
+    tokens = bind_context(**values)
+    try:
+        yield
+    finally:
+        reset_context(tokens)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copia el contexto actual a los atributos del record.
+
+    Debe ir en el handler que recibe el record en el hilo/tarea que loguea
+    (el de cola), no en el listener.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        attributes = record.__dict__
+        attributes["request_id"] = request_id_var.get()
+        # Un `extra` explícito tiene prioridad sobre el contexto
+        if attributes.get("case_id") is None:
+            attributes["case_id"] = case_id_var.get()
+        if attributes.get("user_id") is None:
+            attributes["user_id"] = user_id_var.get()
+        if attributes.get("node_name") is None:
+            attributes["node_name"] = node_name_var.get()
+        return True
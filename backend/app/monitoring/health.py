@@ -0,0 +1,245 @@
+"""
+Health checks de dependencias con probes en segundo plano.
+
+Un `HealthMonitor` ejecuta los probes cada `health_probe_interval_seconds`,
+todos en paralelo y con timeout, y guarda el último resultado. `/health`
+solo lee esa caché: el balanceador puede consultarlo cada segundo sin
+generar carga sobre PostgreSQL, Redis o el proveedor.
+
+Estado global:
+    healthy    todas las dependencias críticas responden
+    degraded   falla (o está vieja) alguna dependencia opcional
+    unhealthy  falla o está vieja alguna dependencia crítica
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ProbeFn = Callable[[], Awaitable[Tuple[str, Optional[str]]]]
+
+
+@dataclass
+class Probe:
+    """Chequeo de una dependencia: devuelve (estado, detalle)."""
+    name: str
+    check: ProbeFn
+    critical: bool = False
+
+
+@dataclass
+class ProbeResult:
+    status: str                      # ok | degraded | down
+    latency_ms: float
+    checked_at: float                # time.time()
+    checked_monotonic: float         # time.monotonic()
+    detail: Optional[str] = None
+
+    def to_dict(self, stale_after: float) -> Dict[str, Any]:
+        age = time.monotonic() - self.checked_monotonic
+        return {
+            "status": self.status,
+            "latency_ms": round(self.latency_ms, 2),
+            "checked_at": datetime.fromtimestamp(self.checked_at, timezone.utc).isoformat(),
+            "age_seconds": round(age, 2),
+            "stale": age > stale_after,
+            **({"detail": self.detail} if self.detail else {}),
+        }
+
+
+@dataclass
+class HealthMonitor:
+    """
+    Ejecuta probes periódicamente y cachea sus resultados.
+
+    Args:
+        probes: Dependencias a chequear.
+        interval: Segundos entre rondas.
+        timeout: Tiempo máximo por probe.
+        stale_after: Antigüedad a partir de la cual un resultado no cuenta.
+    """
+    probes: List[Probe]
+    interval: float = 10.0
+    timeout: float = 3.0
+    stale_after: float = 30.0
+    results: Dict[str, ProbeResult] = field(default_factory=dict)
+    _task: Optional[asyncio.Task] = None
+
+    async def _run_probe(self, probe: Probe):
+        started = time.perf_counter()
+        try:
+            status, detail = await asyncio.wait_for(probe.check(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            status, detail = "down", f"timeout after {self.timeout}s"
+        except Exception as exc:
+            status, detail = "down", f"{type(exc).__name__}: {exc}"
+        latency = (time.perf_counter() - started) * 1000
+
+        previous = self.results.get(probe.name)
+        if previous is not None and previous.status != status:
+            logger.warning(f"Health {probe.name}: {previous.status} -> {status} ({detail or 'ok'})")
+        self.results[probe.name] = ProbeResult(status, latency, time.time(), time.monotonic(), detail)
+
+    async def run_once(self):
+        await asyncio.gather(*(self._run_probe(probe) for probe in self.probes))
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.error("Health probe round failed", exc_info=True)
+
+    async def start(self):
+        """Ejecuta una primera ronda (para no arrancar sin datos) y agenda el resto."""
+        await self.run_once()
+        self._task = asyncio.create_task(self._loop(), name="health-monitor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Último estado conocido, sin ejecutar ningún probe."""
+        checks: Dict[str, Any] = {"api": {"status": "ok"}}
+        status = "healthy"
+        for probe in self.probes:
+            result = self.results.get(probe.name)
+            if result is None:
+                check = {"status": "unknown", "stale": True}
+            else:
+                check = result.to_dict(self.stale_after)
+            check["critical"] = probe.critical
+            checks[probe.name] = check
+
+            failing = check["status"] != "ok" or check["stale"]
+            if failing and probe.critical:
+                status = "unhealthy"
+            elif failing and status == "healthy":
+                status = "degraded"
+        return {"status": status, "checks": checks}
+
+
+# ----------------------------------------------------------------------
+# Probes
+# ----------------------------------------------------------------------
+
+_PGVECTOR_VERSION_SQL = "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+
+
+def postgres_probe(resources) -> ProbeFn:
+    """
+    Conexión a PostgreSQL y extensión pgvector instalada.
+
+    Con el backend "pgvector" consulta por `resources.sql_engine`, el motor
+    que usa el vector store. Si no, usa el pool de asyncpg; si PostgreSQL no
+    respondía al arrancar, reintenta crearlo y lo deja en `resources` para que
+    `/health` (y `get_db_pool`) se recuperen sin reiniciar.
+    """
+    async def check():
+        if resources.sql_engine is not None:
+            from sqlalchemy import text
+
+            async with resources.sql_engine.connect() as conn:
+                version = (await conn.execute(text(_PGVECTOR_VERSION_SQL))).scalar()
+        else:
+            if resources.db_pool is None:
+                from app.resources import create_db_pool
+
+                resources.db_pool = await create_db_pool()
+                if resources.db_pool is None:
+                    return "down", "pool not initialized"
+            async with resources.db_pool.acquire() as conn:
+                version = await conn.fetchval(_PGVECTOR_VERSION_SQL)
+        if version is None:
+            return "degraded", "pgvector extension missing"
+        return "ok", f"pgvector {version}"
+    return check
+
+
+def redis_probe(client) -> ProbeFn:
+    async def check():
+        if client is None:
+            return "down", "client not initialized"
+        await client.ping()
+        return "ok", None
+    return check
+
+
+def mongodb_probe(url: str) -> ProbeFn:
+    """`ping` con motor si está instalado; si no, solo conexión TCP."""
+    async def check():
+        try:
+            from motor.motor_asyncio import AsyncIOMotorClient
+        except ImportError:
+            parsed = urlparse(url)
+            _, writer = await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 27017)
+            writer.close()
+            await writer.wait_closed()
+            return "ok", "tcp only (motor not installed)"
+
+        client = AsyncIOMotorClient(url, serverSelectionTimeoutMS=int(settings.health_probe_timeout_seconds * 1000))
+        try:
+            await client.admin.command("ping")
+        finally:
+            client.close()
+        return "ok", None
+    return check
+
+
+def embedding_provider_probe(http_client) -> ProbeFn:
+    """
+    Consulta el modelo de embeddings en la API del proveedor (sin gastar tokens).
+
+    401/403 indican una API key inválida; 429, cuota agotada.
+    """
+    async def check():
+        if settings.model_provider == "fake":
+            return "ok", "fake provider"
+        base_url = (settings.openai_base_url or "https://api.openai.com/v1").rstrip("/")
+        response = await http_client.get(
+            f"{base_url}/models/{settings.openai_embedding_model}",
+            headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+        )
+        if response.status_code in (401, 403):
+            return "down", f"authentication failed ({response.status_code})"
+        if response.status_code == 429:
+            return "degraded", "rate limited"
+        if response.status_code >= 500:
+            return "down", f"provider error ({response.status_code})"
+        return "ok", None
+    return check
+
+
+def build_health_monitor(resources) -> HealthMonitor:
+    """Probes para las dependencias de `Settings` sobre los recursos compartidos."""
+    backend_needs_postgres = settings.vector_store_backend in ("pgvector", "postgres")
+    return HealthMonitor(
+        probes=[
+            Probe("postgres", postgres_probe(resources), critical=backend_needs_postgres),
+            Probe("redis", redis_probe(resources.redis)),
+            Probe("mongodb", mongodb_probe(settings.mongodb_url)),
+            Probe(
+                "embedding_provider",
+                embedding_provider_probe(resources.http_client),
+                critical=settings.model_provider != "fake",
+            ),
+        ],
+        interval=settings.health_probe_interval_seconds,
+        timeout=settings.health_probe_timeout_seconds,
+        stale_after=settings.health_stale_after_seconds,
+    )
@@ -1,23 +1,74 @@
 """
 Sistema de logging y monitoreo centralizado.
+
+Los handlers de la aplicación no escriben en stdout desde el event loop: un
+`QueueHandler` encola el record (cola acotada) y un `QueueListener` en otro
+hilo lo formatea y escribe. Con la cola llena se descarta (`drop`, se cuenta
+en `/metrics`) o se espera (`block`) según `LOG_QUEUE_POLICY`.
 """
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import json
-from datetime import datetime
 from typing import Any, Dict, Optional
 from functools import wraps
 import time
 
 from app.config import settings
+from app.monitoring.context import ContextFilter, bind_context, node_name_var, reset_context
+from app.monitoring.metrics import MetricsCollector, metrics_collector  # noqa: F401 (reexport)
+from app.monitoring.tracing import tracer
+
+try:
+    import orjson
+
+    def _dumps(data: Dict[str, Any]) -> str:
+        return orjson.dumps(data, default=str).decode("utf-8")
+except ImportError:  # orjson es opcional
+    def _dumps(data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":"))
 
 
 class JSONFormatter(logging.Formatter):
-    """Formatter para logs estructurados en JSON."""
+    """
+    Formatter para logs estructurados en JSON.
+    
+    Los campos fijos (servicio, entorno) se serializan una sola vez y el
+    prefijo del timestamp se reutiliza dentro del mismo segundo.
+    """
+    
+    CONTEXT_FIELDS = (
+        ("request_id", "request_id"),
+        ("case_id", "case_id"),
+        ("user_id", "user_id"),
+        ("node_name", "node_name"),
+        ("duration", "duration_ms"),
+    )
+    
+    def __init__(self, static_fields: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        static = static_fields if static_fields is not None else {
+            "service": "tuavocadonet-backend",
+            "environment": settings.environment,
+        }
+        # Fragmento JSON sin llaves para anteponer a cada línea
+        self._static = _dumps(static)[1:-1] if static else ""
+        self._second: Optional[int] = None
+        self._second_prefix = ""
+    
+    def _timestamp(self, record: logging.LogRecord) -> str:
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._second_prefix}.{int(record.msecs):03d}Z"
     
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": self._timestamp(record),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -27,30 +78,110 @@ class JSONFormatter(logging.Formatter):
         }
         
         # Agregar contexto adicional si existe
-        if hasattr(record, "case_id"):
-            log_data["case_id"] = record.case_id
-        if hasattr(record, "user_id"):
-            log_data["user_id"] = record.user_id
-        if hasattr(record, "node_name"):
-            log_data["node_name"] = record.node_name
-        if hasattr(record, "duration"):
-            log_data["duration_ms"] = record.duration
+        attributes = record.__dict__
+        for attribute, key in self.CONTEXT_FIELDS:
+            value = attributes.get(attribute)
+            if value is not None:
+                log_data[key] = value
             
         # Agregar exception info si existe
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
-            
-        return json.dumps(log_data)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
+        
+        body = _dumps(log_data)
+        if not self._static:
+            return body
+        return "{" + self._static + "," + body[1:]
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Muestreo de DEBUG/INFO por logger (p. ej. `node.answer`).
+    
+    La tasa de un logger es la de su nombre o la del prefijo más cercano en
+    `rates`; WARNING y superiores nunca se muestrean.
+    """
+    
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+    
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            candidate, rate = name, 1.0
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` sobre una cola acotada.
+    
+    `prepare` no formatea el record (eso lo hace el listener en su hilo):
+    solo fija el mensaje para no depender de argumentos mutables.
+    """
+    
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop", block_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            metrics_collector.record_log_drop(record.levelname)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el listener (al salir del proceso)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def setup_logging():
-    """Configura logging global de la aplicación."""
+    """
+    Configura logging global de la aplicación.
+    
+    Es idempotente: al reconfigurar se reemplaza el handler de cola anterior.
+    """
+    global _listener, _queue_handler
     
     # Root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(settings.log_level)
     
-    # Handler para stdout
+    # Handler para stdout (se ejecuta en el hilo del listener)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(settings.log_level)
     
@@ -64,9 +195,19 @@ def setup_logging():
     
     console_handler.setFormatter(formatter)
     
-    # Agregar handler si no existe
-    if not root_logger.handlers:
-        root_logger.addHandler(console_handler)
+    # Reemplazar la configuración anterior
+    shutdown_logging()
+    if _queue_handler is not None:
+        root_logger.removeHandler(_queue_handler)
+    
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue, policy=settings.log_queue_policy)
+    _queue_handler.addFilter(ContextFilter())
+    if settings.log_sample_rates:
+        _queue_handler.addFilter(SamplingFilter(settings.log_sample_rates))
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    _listener.start()
+    root_logger.addHandler(_queue_handler)
     
     # Silenciar logs verbose de librerías
     logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -76,14 +217,20 @@ def setup_logging():
     return root_logger
 
 
+atexit.register(shutdown_logging)
+
+
 class ContextLogger:
-    """Logger con contexto enriquecido para casos jurídicos."""
+    """
+    Logger con contexto enriquecido para casos jurídicos.
+    
+    El contexto vive en `contextvars` (ver `app/monitoring/context.py`):
+    `set_context` lo fija para la tarea actual y las que cree después, y
+    cualquier logger lo incluye, no solo este.
+    """
     
     def __init__(self, name: str):
         self.logger = logging.getLogger(name)
-        self.case_id: Optional[str] = None
-        self.user_id: Optional[str] = None
-        self.node_name: Optional[str] = None
     
     def set_context(
         self,
@@ -92,66 +239,53 @@ class ContextLogger:
         node_name: Optional[str] = None
     ):
         """Establece contexto para logs subsecuentes."""
-        if case_id:
-            self.case_id = case_id
-        if user_id:
-            self.user_id = user_id
-        if node_name:
-            self.node_name = node_name
-    
-    def _log(self, level: str, message: str, **kwargs):
-        """Log interno con contexto."""
-        extra = {
-            "case_id": self.case_id,
-            "user_id": self.user_id,
-            "node_name": self.node_name,
-            **kwargs
-        }
-        getattr(self.logger, level)(message, extra=extra)
+        bind_context(case_id=case_id, user_id=user_id, node_name=node_name)
+    
+    def _log(self, level: int, message: str, exc_info=None, **kwargs):
+        """Log interno; los kwargs van como atributos del record."""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, exc_info=exc_info, extra=kwargs or None, stacklevel=3)
     
     def debug(self, message: str, **kwargs):
-        self._log("debug", message, **kwargs)
+        self._log(logging.DEBUG, message, **kwargs)
     
     def info(self, message: str, **kwargs):
-        self._log("info", message, **kwargs)
+        self._log(logging.INFO, message, **kwargs)
     
     def warning(self, message: str, **kwargs):
-        self._log("warning", message, **kwargs)
+        self._log(logging.WARNING, message, **kwargs)
     
     def error(self, message: str, **kwargs):
-        self._log("error", message, **kwargs)
+        self._log(logging.ERROR, message, **kwargs)
     
     def critical(self, message: str, **kwargs):
-        self._log("critical", message, **kwargs)
+        self._log(logging.CRITICAL, message, **kwargs)
 
 
 def log_node_execution(node_name: str):
     """
     Decorator para trackear ejecución de nodos LangGraph.
     Registra duración, errores y estado.
+    
+    Fija `node_name` (y `case_id`/`user_id` del estado si vienen) en el
+    contexto de logging mientras corre el nodo, y lo ejecuta dentro de un
+    span `node.<nombre>`. Las duraciones usan reloj monotónico.
     """
+    logger = logging.getLogger(f"node.{node_name}")
+    
     def decorator(func):
-        @wraps(func)
-        async def wrapper(state: Dict[str, Any], *args, **kwargs):
-            logger = ContextLogger(f"node.{node_name}")
-            logger.set_context(
-                case_id=state.get("session_id"),
-                user_id=state.get("user_id"),
-                node_name=node_name
-            )
-            
-            start_time = time.time()
-            logger.info(f"Starting node execution")
+        async def execute(state: Dict[str, Any], *args, **kwargs):
+            start_time = time.perf_counter()
+            logger.info("Starting node execution")
             
             try:
                 result = await func(state, *args, **kwargs)
                 
-                duration = (time.time() - start_time) * 1000  # ms
-                logger.info(
-                    f"Node completed successfully",
-                    duration=duration
-                )
+                duration = (time.perf_counter() - start_time) * 1000  # ms
+                logger.info("Node completed successfully", extra={"duration": duration})
                 
+                metrics_collector.record_node_duration(node_name, duration)
+
                 # Agregar duración al estado
                 if "node_durations" not in result:
                     result["node_durations"] = {}
@@ -160,10 +294,12 @@ def log_node_execution(node_name: str):
                 return result
                 
             except Exception as e:
-                duration = (time.time() - start_time) * 1000
+                duration = (time.perf_counter() - start_time) * 1000
+                metrics_collector.record_node_duration(node_name, duration)
+                metrics_collector.record_error(state.get("session_id"), node_name, str(e))
                 logger.error(
                     f"Node failed with error: {str(e)}",
-                    duration=duration,
+                    extra={"duration": duration},
                     exc_info=True
                 )
                 
@@ -174,73 +310,23 @@ def log_node_execution(node_name: str):
                 
                 raise
         
+        @wraps(func)
+        async def wrapper(state: Dict[str, Any], *args, **kwargs):
+            tokens = bind_context(
+                case_id=state.get("case_id") or state.get("session_id"),
+                user_id=state.get("user_id"),
+            )
+            node_token = node_name_var.set(node_name)
+            try:
+                with tracer.span(f"node.{node_name}", {"node.name": node_name}):
+                    return await execute(state, *args, **kwargs)
+            finally:
+                node_name_var.reset(node_token)
+                reset_context(tokens)
+        
         return wrapper
     return decorator
 
 
-class MetricsCollector:
-    """Colector de métricas para observabilidad."""
-    
-    def __init__(self):
-        self.metrics: Dict[str, list] = {
-            "node_durations": [],
-            "quality_scores": [],
-            "iteration_counts": [],
-            "errors": []
-        }
-    
-    def record_node_duration(self, node_name: str, duration_ms: float):
-        """Registra duración de un nodo."""
-        self.metrics["node_durations"].append({
-            "node": node_name,
-            "duration_ms": duration_ms,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    
-    def record_quality_score(self, case_id: str, score: int):
-        """Registra puntaje de calidad."""
-        self.metrics["quality_scores"].append({
-            "case_id": case_id,
-            "score": score,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    
-    def record_error(self, case_id: str, node: str, error: str):
-        """Registra error ocurrido."""
-        self.metrics["errors"].append({
-            "case_id": case_id,
-            "node": node,
-            "error": error,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    
-    def get_summary(self) -> Dict[str, Any]:
-        """Obtiene resumen de métricas."""
-        return {
-            "total_cases": len(set(m["case_id"] for m in self.metrics["quality_scores"])),
-            "total_errors": len(self.metrics["errors"]),
-            "avg_quality_score": sum(m["score"] for m in self.metrics["quality_scores"]) / len(self.metrics["quality_scores"]) if self.metrics["quality_scores"] else 0,
-            "node_performance": self._get_node_performance()
-        }
-    
-    def _get_node_performance(self) -> Dict[str, Dict[str, float]]:
-        """Calcula performance por nodo."""
-        perf = {}
-        for metric in self.metrics["node_durations"]:
-            node = metric["node"]
-            if node not in perf:
-                perf[node] = {"count": 0, "total_ms": 0, "avg_ms": 0}
-            perf[node]["count"] += 1
-            perf[node]["total_ms"] += metric["duration_ms"]
-        
-        for node in perf:
-            perf[node]["avg_ms"] = perf[node]["total_ms"] / perf[node]["count"]
-        
-        return perf
-
-
-# Singleton global
-metrics_collector = MetricsCollector()
-
 # Setup inicial
 setup_logging()
@@ -0,0 +1,50 @@
+"""
+Retraso del event loop.
+
+Una tarea duerme `interval` y mide cuánto más tardó en despertar. Ese exceso
+es el tiempo que el loop estuvo ocupado con código síncrono (CPU, I/O
+bloqueante) y que sufre cada petición en curso; crece antes que la latencia
+de las respuestas cuando un worker se acerca a la saturación.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.monitoring.metrics import metrics_collector
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Muestrea el retraso del loop y lo registra en `metrics_collector`.
+
+    Args:
+        interval: Segundos entre muestras.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = (time.perf_counter() - started - self.interval) * 1000
+            metrics_collector.record_loop_lag(max(0.0, lag_ms))
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
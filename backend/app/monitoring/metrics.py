@@ -0,0 +1,264 @@
+"""
+Métricas en memoria acotada para observabilidad.
+
+Todo se agrega al registrar, con costo O(1) y sin crear objetos por evento:
+
+    LogHistogram   duraciones en buckets logarítmicos (p50/p95/p99 con error
+                   relativo ~4 %), memoria fija
+    RollingWindow  últimos N puntajes de calidad con suma incremental
+    contadores     errores por nodo, iteraciones por caso, logs descartados
+
+El retraso del event loop (`loop_lag.py`) usa también un `LogHistogram`.
+
+`MetricsCollector.render_prometheus()` expone todo en el formato de texto de
+Prometheus para `GET /metrics`.
+"""
+import math
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+
+class LogHistogram:
+    """
+    Histograma con buckets de crecimiento geométrico.
+
+    El bucket `i` cubre `[min_value·g^i, min_value·g^(i+1))` con
+    `g = 2^(1/subbuckets)`; los valores fuera de rango caen en el primero o
+    el último. Los percentiles devuelven el punto medio geométrico del
+    bucket, así que el error relativo es como mucho `√g - 1`.
+
+    Args:
+        min_value: Menor valor distinguible (por defecto 0.01 ms).
+        max_value: Mayor valor distinguible (por defecto 10 minutos).
+        subbuckets: Buckets por cada potencia de 2.
+    """
+
+    __slots__ = ("min_value", "_log_growth", "_scale", "counts", "count", "total", "min", "max")
+
+    def __init__(self, min_value: float = 0.01, max_value: float = 600_000.0, subbuckets: int = 8):
+        self.min_value = min_value
+        self._log_growth = math.log(2) / subbuckets
+        self._scale = 1 / self._log_growth
+        size = int(math.ceil(math.log(max_value / min_value) * self._scale)) + 1
+        self.counts = array("Q", bytes(8 * size))
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float):
+        if value < self.min_value:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.min_value) * self._scale), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _bucket_value(self, index: int) -> float:
+        return self.min_value * math.exp((index + 0.5) * self._log_growth)
+
+    def percentiles(self, quantiles: Iterable[float]) -> List[float]:
+        """Valores aproximados para `quantiles` (en [0, 1]) en una sola pasada."""
+        quantiles = list(quantiles)
+        if not self.count:
+            return [0.0] * len(quantiles)
+        targets = sorted((max(1, math.ceil(q * self.count)), position) for position, q in enumerate(quantiles))
+        results = [0.0] * len(quantiles)
+        cumulative, target = 0, 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            cumulative += bucket_count
+            while target < len(targets) and cumulative >= targets[target][0]:
+                # Acotar al rango observado para no reportar más que el máximo real
+                results[targets[target][1]] = min(max(self._bucket_value(index), self.min), self.max)
+                target += 1
+            if target == len(targets):
+                break
+        return results
+
+    def percentile(self, quantile: float) -> float:
+        return self.percentiles([quantile])[0]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class RollingWindow:
+    """Últimos `size` valores en un buffer circular, con suma incremental."""
+
+    __slots__ = ("values", "size", "_next", "filled", "sum")
+
+    def __init__(self, size: int = 1000):
+        self.values = array("d", bytes(8 * size))
+        self.size = size
+        self._next = 0
+        self.filled = 0
+        self.sum = 0.0
+
+    def record(self, value: float):
+        if self.filled == self.size:
+            self.sum -= self.values[self._next]
+        else:
+            self.filled += 1
+        self.values[self._next] = value
+        self.sum += value
+        self._next = (self._next + 1) % self.size
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.filled if self.filled else 0.0
+
+    def count_at_least(self, threshold: float) -> int:
+        """Valores de la ventana ≥ `threshold` (O(size), solo al consultar)."""
+        return sum(1 for value in self.values[:self.filled] if value >= threshold)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsCollector:
+    """Colector de métricas para observabilidad."""
+
+    QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99)
+
+    def __init__(self, quality_window: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.node_durations: Dict[str, LogHistogram] = {}
+        self.node_errors: Dict[str, int] = {}
+        self.iteration_counts: Dict[int, int] = {}
+        self.quality_scores = RollingWindow(quality_window or settings.metrics_quality_window)
+        self.total_cases = 0
+        self.log_drops: Dict[str, int] = {}
+        self.loop_lag = LogHistogram()
+
+    def record_node_duration(self, node_name: str, duration_ms: float):
+        """Registra duración de un nodo."""
+        histogram = self.node_durations.get(node_name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.node_durations.setdefault(node_name, LogHistogram())
+        histogram.record(duration_ms)
+
+    def record_quality_score(self, case_id: str, score: int):
+        """Registra puntaje de calidad de un caso."""
+        self.quality_scores.record(score)
+        self.total_cases += 1
+
+    def record_iteration_count(self, iterations: int):
+        self.iteration_counts[iterations] = self.iteration_counts.get(iterations, 0) + 1
+
+    def record_error(self, case_id: str, node: str, error: str):
+        """Registra error ocurrido (solo se cuenta por nodo)."""
+        self.node_errors[node] = self.node_errors.get(node, 0) + 1
+
+    def record_log_drop(self, level: str):
+        """Record de log descartado por la cola llena."""
+        self.log_drops[level] = self.log_drops.get(level, 0) + 1
+
+    def record_loop_lag(self, lag_ms: float):
+        """Muestra del retraso del event loop."""
+        self.loop_lag.record(lag_ms)
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Obtiene resumen de métricas."""
+        return {
+            "total_cases": self.total_cases,
+            "total_errors": sum(self.node_errors.values()),
+            "avg_quality_score": self.quality_scores.mean,
+            "node_performance": self._get_node_performance(),
+        }
+
+    def _get_node_performance(self) -> Dict[str, Dict[str, float]]:
+        """Performance por nodo, con percentiles."""
+        perf = {}
+        for node, histogram in list(self.node_durations.items()):
+            p50, p95, p99 = histogram.percentiles(self.QUANTILES)
+            perf[node] = {
+                "count": histogram.count,
+                "total_ms": histogram.total,
+                "avg_ms": histogram.mean,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": histogram.max,
+            }
+        return perf
+
+    def render_prometheus(self) -> str:
+        """Métricas en formato de exposición de texto de Prometheus."""
+        lines = [
+            "# HELP triaje_node_duration_milliseconds Duración de los nodos del triaje.",
+            "# TYPE triaje_node_duration_milliseconds summary",
+        ]
+        for node, histogram in sorted(self.node_durations.items()):
+            label = f'node="{_escape(node)}"'
+            for quantile, value in zip(self.QUANTILES, histogram.percentiles(self.QUANTILES)):
+                lines.append(f'triaje_node_duration_milliseconds{{{label},quantile="{quantile}"}} {value:.3f}')
+            lines.append(f"triaje_node_duration_milliseconds_sum{{{label}}} {histogram.total:.3f}")
+            lines.append(f"triaje_node_duration_milliseconds_count{{{label}}} {histogram.count}")
+
+        lines += [
+            "# HELP triaje_node_errors_total Errores por nodo.",
+            "# TYPE triaje_node_errors_total counter",
+        ]
+        for node, count in sorted(self.node_errors.items()):
+            lines.append(f'triaje_node_errors_total{{node="{_escape(node)}"}} {count}')
+
+        lines += [
+            "# HELP triaje_cases_total Casos con puntaje de calidad registrado.",
+            "# TYPE triaje_cases_total counter",
+            f"triaje_cases_total {self.total_cases}",
+            "# HELP triaje_iterations_total Casos por número de iteraciones de calidad.",
+            "# TYPE triaje_iterations_total counter",
+        ]
+        for iterations, count in sorted(self.iteration_counts.items()):
+            lines.append(f'triaje_iterations_total{{iterations="{iterations}"}} {count}')
+
+        window = self.quality_scores
+        passed = window.count_at_least(settings.min_quality_score)
+        lines += [
+            "# HELP triaje_quality_score_window_mean Puntaje medio en la ventana reciente.",
+            "# TYPE triaje_quality_score_window_mean gauge",
+            f"triaje_quality_score_window_mean {window.mean:.3f}",
+            "# HELP triaje_quality_pass_ratio_window Fracción de casos recientes que superan min_quality_score.",
+            "# TYPE triaje_quality_pass_ratio_window gauge",
+            f"triaje_quality_pass_ratio_window {passed / window.filled if window.filled else 0.0:.4f}",
+            "# HELP triaje_quality_window_size Casos en la ventana de calidad.",
+            "# TYPE triaje_quality_window_size gauge",
+            f"triaje_quality_window_size {window.filled}",
+            "# HELP log_records_dropped_total Records de log descartados por la cola llena.",
+            "# TYPE log_records_dropped_total counter",
+        ]
+        for level, count in sorted(self.log_drops.items()):
+            lines.append(f'log_records_dropped_total{{level="{level}"}} {count}')
+
+        lag = self.loop_lag
+        lines += [
+            "# HELP event_loop_lag_milliseconds Retraso del event loop respecto al intervalo de muestreo.",
+            "# TYPE event_loop_lag_milliseconds summary",
+        ]
+        for quantile, value in zip(self.QUANTILES, lag.percentiles(self.QUANTILES)):
+            lines.append(f'event_loop_lag_milliseconds{{quantile="{quantile}"}} {value:.3f}')
+        lines += [
+            f"event_loop_lag_milliseconds_sum {lag.total:.3f}",
+            f"event_loop_lag_milliseconds_count {lag.count}",
+            "# HELP event_loop_lag_max_milliseconds Mayor retraso observado del event loop.",
+            "# TYPE event_loop_lag_max_milliseconds gauge",
+            f"event_loop_lag_max_milliseconds {lag.max:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+# Instancia global
+metrics_collector = MetricsCollector()
@@ -0,0 +1,244 @@
+"""
+Trazas por etapa (spans) con exportación local a JSONL.
+
+Los spans siguen el modelo de datos de OpenTelemetry: `trace_id` de 16
+bytes y `span_id` de 8 en hex, padre, inicio/fin en nanosegundos Unix,
+atributos, eventos y estado (UNSET | OK | ERROR). La duración se mide con
+reloj monotónico (`perf_counter_ns`); el fin se calcula como inicio +
+duración, así que nunca es negativa aunque el reloj del sistema salte.
+
+El span activo vive en un `ContextVar`: los spans hijos (y las tareas
+creadas dentro de un span) toman su padre automáticamente.
+
+Con `TRACING_ENABLED=false` (por defecto) `start_span` devuelve un span
+nulo compartido y no hay costo de exportación.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """Span en curso o terminado."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "_start_perf",
+        "duration_ns", "attributes", "events", "status", "status_message",
+    )
+
+    recording = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "INTERNAL"):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.duration_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = "UNSET"
+        self.status_message: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        offset = time.perf_counter_ns() - self._start_perf
+        self.events.append({"name": name, "time_unix_nano": self.start_ns + offset, "attributes": attributes or {}})
+
+    def record_exception(self, exc: BaseException):
+        self.add_event("exception", {"exception.type": type(exc).__name__, "exception.message": str(exc)})
+        self.status, self.status_message = "ERROR", f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._start_perf
+            if self.status == "UNSET":
+                self.status = "OK"
+            tracer.exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.duration_ns or 0) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.start_ns + (self.duration_ns or 0),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, **({"message": self.status_message} if self.status_message else {})},
+            "resource": {"service.name": "tuavocadonet-backend", "deployment.environment": settings.environment},
+        }
+
+
+class _NonRecordingSpan:
+    """Span nulo: trazas desactivadas o traza no muestreada."""
+
+    recording = False
+    trace_id = span_id = parent_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+current_span_var: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+def current_span():
+    """Span activo (o el nulo, para poder llamar `set_attribute` sin comprobar)."""
+    return current_span_var.get() or NON_RECORDING_SPAN
+
+
+class JsonlSpanExporter:
+    """
+    Escribe cada span terminado como una línea JSON.
+
+    La escritura ocurre en un hilo aparte; con la cola llena el span se
+    descarta (nunca se bloquea al llamador).
+    """
+
+    def __init__(self, path: str, max_queue: int = 10_000):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def export(self, span: Span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self):
+        with open(self.path, "a", encoding="utf-8") as output:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    break
+                try:
+                    output.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except Exception:
+                    logger.warning("No se pudo exportar un span", exc_info=True)
+                if self._queue.empty():
+                    output.flush()
+
+    def shutdown(self):
+        """Escribe lo pendiente y detiene el hilo."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class Tracer:
+    """Crea spans y decide el muestreo al inicio de cada traza."""
+
+    def __init__(self, enabled: bool, sample_rate: float, exporter: JsonlSpanExporter):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def _new_span(self, name: str, kind: str = "INTERNAL"):
+        parent = current_span_var.get()
+        if parent is not None:
+            if not parent.recording:
+                return NON_RECORDING_SPAN
+            return Span(name, parent.trace_id, parent.span_id, kind)
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NON_RECORDING_SPAN
+        return Span(name, os.urandom(16).hex(), kind=kind)
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "INTERNAL"):
+        """Span sin activar (p. ej. para callbacks con inicio y fin separados)."""
+        span = self._new_span(name, kind)
+        if attributes:
+            span.set_attributes(attributes)
+        return span
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "INTERNAL") -> Iterator[Any]:
+        """Span activo durante el bloque; registra la excepción si la hay."""
+        if not self.enabled and current_span_var.get() is None:
+            yield NON_RECORDING_SPAN
+            return
+        span = self.start_span(name, attributes, kind)
+        token = current_span_var.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            current_span_var.reset(token)
+            span.end()
+
+
+def traced(name: str):
+    """Decorator: ejecuta la corrutina dentro de un span `name`."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+tracer = Tracer(
+    enabled=settings.tracing_enabled,
+    sample_rate=settings.tracing_sample_rate,
+    exporter=JsonlSpanExporter(settings.tracing_export_path),
+)
+
+atexit.register(tracer.exporter.shutdown)
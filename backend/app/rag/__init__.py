@@ -0,0 +1 @@
+"""RAG package initialization."""
@@ -0,0 +1,526 @@
+"""
+Caché semántica de respuestas del RAG.
+
+Antes de ejecutar la cadena completa (embedding + búsqueda + LLM):
+1. Búsqueda exacta por la pregunta normalizada (sin tildes, signos ni
+   mayúsculas); no necesita embedding.
+2. Vecino más cercano sobre el embedding de la pregunta, dentro de la misma
+   área, si la similitud coseno supera el umbral configurado.
+
+Cada entrada guarda los IDs de los chunks usados como fuente; al reindexar,
+`invalidate_chunks` elimina las respuestas que citaban chunks que cambiaron.
+
+El almacén es Redis (`redis_url`) cuando está disponible, con respaldo en
+memoria del proceso. En Redis las entradas son la fuente de verdad y cada
+proceso mantiene una copia local de la matriz de vectores que se actualiza
+con el log de altas y bajas. Las entradas vencidas se podan periódicamente
+(`SemanticAnswerCache.start`).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+from app.monitoring.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin tildes ni signos y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_PUNCT_RE.sub(" ", text).split())
+
+
+def question_key(question: str, area: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{area or '*'}\x00{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    """Respuesta cacheada con sus fuentes."""
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    area: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    # Cómo se encontró: "exact" o "semantic" (no se persiste)
+    match: str = ""
+    similarity: float = 1.0
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data.pop("match")
+        data.pop("similarity")
+        return json.dumps(data, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "CachedAnswer":
+        return cls(**json.loads(raw))
+
+    @classmethod
+    def from_documents(
+        cls, question: str, answer: str, documents: Iterable[Document], area: Optional[str] = None
+    ) -> "CachedAnswer":
+        documents = list(documents)
+        return cls(
+            question=question,
+            answer=answer,
+            sources=[{"id": doc.id, "metadata": doc.metadata, "content": doc.page_content} for doc in documents],
+            chunk_ids=[doc.id for doc in documents if doc.id],
+            area=area,
+        )
+
+    def documents(self) -> List[Document]:
+        return [
+            Document(id=source.get("id"), page_content=source.get("content", ""), metadata=source.get("metadata", {}))
+            for source in self.sources
+        ]
+
+
+class _VectorIndex:
+    """
+    Matriz preasignada de vectores normalizados; cada clave ocupa una fila.
+
+    Altas, reemplazos y bajas tocan una sola fila (las liberadas se
+    reutilizan) y la matriz duplica su capacidad cuando se llena, así que
+    ninguna escritura reconstruye el índice completo.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._keys: List[Optional[str]] = []
+        # Áreas como códigos enteros para enmascarar sin recorrer listas
+        self._area_codes: Dict[Optional[str], int] = {None: 0}
+        self._areas = np.zeros(0, dtype=np.int32)
+        self._live = np.zeros(0, dtype=bool)
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _new_row(self, dimension: int) -> int:
+        row = len(self._keys)
+        if self._matrix is None or self._matrix.shape[1] != dimension:
+            if self._rows:
+                raise ValueError(f"Dimensión {dimension} distinta a la del índice ({self._matrix.shape[1]})")
+            self._matrix = np.zeros((self.capacity, dimension), dtype=np.float32)
+            self._areas = np.zeros(self.capacity, dtype=np.int32)
+            self._live = np.zeros(self.capacity, dtype=bool)
+        elif row == self._matrix.shape[0]:
+            grow = self._matrix.shape[0]
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix[:grow])])
+            self._areas = np.concatenate([self._areas, np.zeros(grow, dtype=np.int32)])
+            self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+        self._keys.append(None)
+        return row
+
+    def set(self, key: str, area: Optional[str], vector: np.ndarray):
+        row = self._rows.get(key)
+        if row is None:
+            row = self._free.pop() if self._free else self._new_row(vector.shape[0])
+            self._rows[key] = row
+            self._keys[row] = key
+        self._matrix[row] = vector
+        self._areas[row] = self._area_codes.setdefault(area, len(self._area_codes))
+        self._live[row] = True
+
+    def remove(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._live[row] = False
+        self._keys[row] = None
+        self._free.append(row)
+
+    def nearest(self, vector: np.ndarray, area: Optional[str]) -> Optional[Tuple[str, float]]:
+        code = self._area_codes.get(area)
+        if not self._rows or code is None:
+            return None
+        used = len(self._keys)
+        mask = self._live[:used] & (self._areas[:used] == code)
+        if not mask.any():
+            return None
+        scores = np.where(mask, self._matrix[:used] @ vector, -np.inf)
+        best = int(np.argmax(scores))
+        return self._keys[best], float(scores[best])
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / (np.linalg.norm(array) or 1.0)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class InMemoryAnswerStore:
+    """Almacén en memoria del proceso con TTL y límite de entradas (LRU)."""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CachedAnswer]]" = OrderedDict()
+        self._by_chunk: Dict[str, set] = {}
+        self._index = _VectorIndex()
+
+    async def get(self, key: str) -> Optional[CachedAnswer]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires, entry = item
+        if expires < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def put(self, key: str, entry: CachedAnswer, vector: np.ndarray, ttl: float):
+        self._remove(key)
+        self._entries[key] = (time.time() + ttl, entry)
+        self._index.set(key, entry.area, vector)
+        for chunk_id in entry.chunk_ids:
+            self._by_chunk.setdefault(chunk_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def nearest(self, vector: np.ndarray, area: Optional[str]) -> Optional[Tuple[str, float]]:
+        return self._index.nearest(vector, area)
+
+    def _remove(self, key: str):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        self._index.remove(key)
+        for chunk_id in item[1].chunk_ids:
+            keys = self._by_chunk.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_chunk[chunk_id]
+
+    async def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        keys = set()
+        for chunk_id in chunk_ids:
+            keys |= self._by_chunk.get(chunk_id, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    async def prune_expired(self) -> int:
+        now = time.time()
+        expired = [key for key, (expires, _) in self._entries.items() if expires < now]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    async def clear(self):
+        self._entries.clear()
+        self._by_chunk.clear()
+        self._index.clear()
+
+
+class RedisAnswerStore:
+    """
+    Almacén en Redis compartido entre procesos.
+
+    Claves (prefijo `answer_cache`):
+        entry:<key>   JSON de la respuesta, con TTL
+        vectors       hash clave -> vector float32
+        areas         hash clave -> área de la respuesta
+        expiry        zset clave -> vencimiento (para la poda periódica)
+        chunk:<id>    claves de las respuestas que usan ese chunk
+        log           stream de altas y bajas (`op`, `key`, `area`, `vector`),
+                      recortado a `log_length` entradas
+        seq           contador de escrituras al log
+
+    Cada proceso aplica a su índice local solo las entradas del log
+    posteriores a la última que vio. La carga completa de los hashes ocurre
+    al arrancar y cuando el proceso quedó más atrás de lo que conserva el
+    log (o alguien vació la caché). Las entradas vencidas se quitan del
+    índice con `prune_expired`, que corre periódicamente, no en cada lectura.
+
+    El cliente debe devolver bytes (`decode_responses=False`, el valor por
+    defecto).
+    """
+
+    def __init__(self, client, prefix: str = "answer_cache", max_entries: int = 10_000, log_length: int = 10_000):
+        self.client = client
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.log_length = log_length
+        self._index = _VectorIndex()
+        self._seq: Optional[int] = None
+        self._last_id = "0-0"
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    async def get(self, key: str) -> Optional[CachedAnswer]:
+        raw = await self.client.get(self._key("entry", key))
+        return CachedAnswer.from_json(raw) if raw else None
+
+    def _log(self, pipe, op: str, key: str, area: Optional[str] = None, vector: Optional[np.ndarray] = None):
+        fields = {"op": op, "key": key, "area": area or ""}
+        if vector is not None:
+            fields["vector"] = vector.tobytes()
+        pipe.incr(self._key("seq"))
+        pipe.xadd(self._key("log"), fields, maxlen=self.log_length, approximate=False)
+
+    async def put(self, key: str, entry: CachedAnswer, vector: np.ndarray, ttl: float):
+        vector = vector.astype(np.float32)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._key("entry", key), entry.to_json(), ex=int(ttl))
+        pipe.hset(self._key("vectors"), key, vector.tobytes())
+        pipe.hset(self._key("areas"), key, entry.area or "")
+        pipe.zadd(self._key("expiry"), {key: time.time() + ttl})
+        for chunk_id in entry.chunk_ids:
+            pipe.sadd(self._key("chunk", chunk_id), key)
+            pipe.expire(self._key("chunk", chunk_id), int(ttl))
+        self._log(pipe, "put", key, entry.area, vector)
+        await pipe.execute()
+
+    async def _remove(self, keys: List[str]):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(*(self._key("entry", key) for key in keys))
+        pipe.hdel(self._key("vectors"), *keys)
+        pipe.hdel(self._key("areas"), *keys)
+        pipe.zrem(self._key("expiry"), *keys)
+        for key in keys:
+            self._log(pipe, "del", key)
+        await pipe.execute()
+
+    async def _load(self):
+        """Carga completa: hashes y posición del log en una sola transacción."""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self._key("seq"))
+        pipe.xrevrange(self._key("log"), count=1)
+        pipe.hgetall(self._key("vectors"))
+        pipe.hgetall(self._key("areas"))
+        seq, last, vectors, areas = await pipe.execute()
+        self._index.clear()
+        for key, raw in vectors.items():
+            self._index.set(_decode(key), _decode(areas.get(key) or b"") or None, np.frombuffer(raw, dtype=np.float32))
+        self._seq = int(seq or 0)
+        self._last_id = _decode(last[0][0]) if last else "0-0"
+
+    async def _refresh(self):
+        if self._seq is None:
+            await self._load()
+            return
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self._key("seq"))
+        pipe.xread({self._key("log"): self._last_id}, count=self.log_length)
+        seq, streams = await pipe.execute()
+        seq = int(seq or 0)
+        if seq == self._seq:
+            return
+        # Contador reiniciado (clear) o más cambios de los que guarda el log
+        if seq < self._seq or seq - self._seq > self.log_length:
+            await self._load()
+            return
+        for _, entries in streams:
+            for entry_id, fields in entries:
+                fields = {_decode(name): value for name, value in fields.items()}
+                key = _decode(fields["key"])
+                if _decode(fields["op"]) == "put":
+                    area = _decode(fields.get("area") or b"") or None
+                    self._index.set(key, area, np.frombuffer(fields["vector"], dtype=np.float32))
+                else:
+                    self._index.remove(key)
+                self._last_id = _decode(entry_id)
+        self._seq = seq
+
+    async def nearest(self, vector: np.ndarray, area: Optional[str]) -> Optional[Tuple[str, float]]:
+        await self._refresh()
+        return self._index.nearest(vector, area)
+
+    async def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        chunk_keys = [self._key("chunk", chunk_id) for chunk_id in chunk_ids]
+        if not chunk_keys:
+            return 0
+        keys = set()
+        for start in range(0, len(chunk_keys), 1000):
+            members = await self.client.sunion(*chunk_keys[start:start + 1000])
+            keys |= {_decode(member) for member in members}
+        if keys:
+            await self._remove(sorted(keys))
+        await self.client.delete(*chunk_keys)
+        return len(keys)
+
+    async def prune_expired(self) -> int:
+        """Quita las entradas vencidas y, si sobran, las más próximas a vencer."""
+        expiry = self._key("expiry")
+        keys = await self.client.zrangebyscore(expiry, "-inf", time.time())
+        excess = await self.client.zcard(expiry) - len(keys) - self.max_entries
+        if excess > 0:
+            keys += await self.client.zrange(expiry, len(keys), len(keys) + excess - 1)
+        keys = [_decode(key) for key in keys]
+        for start in range(0, len(keys), 1000):
+            await self._remove(keys[start:start + 1000])
+        return len(keys)
+
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match=self._key("*"))]
+        if keys:
+            await self.client.delete(*keys)
+        self._index.clear()
+        self._seq = None
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas por pregunta exacta o semánticamente equivalente.
+
+    Args:
+        embeddings: Embeddings de consultas (idealmente con la caché local,
+            así la cadena reutiliza el vector calculado aquí).
+        store: `RedisAnswerStore` o `InMemoryAnswerStore`.
+        threshold: Similitud coseno mínima para reutilizar una respuesta.
+        ttl_seconds: Vigencia de cada respuesta.
+        prune_interval: Segundos entre podas de entradas vencidas (0 = sin poda).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        store,
+        threshold: float = 0.95,
+        ttl_seconds: float = 86_400,
+        prune_interval: float = 300,
+    ):
+        self.embeddings = embeddings
+        self.store = store
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self._pruner: Optional[asyncio.Task] = None
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            try:
+                pruned = await self.store.prune_expired()
+                if pruned:
+                    logger.debug(f"Caché de respuestas: {pruned} entradas podadas")
+            except Exception as exc:
+                logger.warning(f"No se pudo podar la caché de respuestas: {exc}")
+
+    def start(self):
+        """Arranca la poda periódica (requiere un event loop en curso)."""
+        if self.prune_interval > 0 and self._pruner is None:
+            self._pruner = asyncio.create_task(self._prune_loop(), name="answer-cache-pruner")
+
+    async def stop(self):
+        if self._pruner is not None:
+            self._pruner.cancel()
+            try:
+                await self._pruner
+            except asyncio.CancelledError:
+                pass
+            self._pruner = None
+
+    async def lookup(self, question: str, area: Optional[str] = None) -> Optional[CachedAnswer]:
+        with tracer.span("answer_cache.lookup") as span:
+            entry = await self._lookup(question, area)
+            span.set_attributes({
+                "cache.hit": entry is not None,
+                "cache.match": entry.match if entry is not None else "miss",
+                **({"cache.similarity": round(entry.similarity, 4)} if entry is not None else {}),
+            })
+            return entry
+
+    async def _lookup(self, question: str, area: Optional[str]) -> Optional[CachedAnswer]:
+        key = question_key(question, area)
+        entry = await self.store.get(key)
+        if entry is not None:
+            entry.match, entry.similarity = "exact", 1.0
+            self.hits["exact"] += 1
+            return entry
+
+        vector = _unit(await self.embeddings.aembed_query(question))
+        nearest = await self.store.nearest(vector, area)
+        if nearest is not None and nearest[1] >= self.threshold:
+            entry = await self.store.get(nearest[0])
+            if entry is not None:
+                entry.match, entry.similarity = "semantic", nearest[1]
+                self.hits["semantic"] += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    async def store_answer(self, entry: CachedAnswer):
+        vector = _unit(await self.embeddings.aembed_query(entry.question))
+        await self.store.put(question_key(entry.question, entry.area), entry, vector, self.ttl_seconds)
+
+    async def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Elimina las respuestas que citaban alguno de los chunks."""
+        return await self.store.invalidate_chunks(chunk_ids)
+
+    async def clear(self):
+        await self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.hits.values()) + self.misses
+        return {
+            **{f"{kind}_hits": count for kind, count in self.hits.items()},
+            "misses": self.misses,
+            "hit_rate": round(sum(self.hits.values()) / total, 4) if total else 0.0,
+        }
+
+
+async def create_answer_store(redis_client=None):
+    """
+    Almacén Redis si responde; si no, en memoria del proceso.
+
+    Args:
+        redis_client: Cliente `redis.asyncio` ya creado (opcional).
+    """
+    max_entries = settings.answer_cache_max_entries
+    try:
+        if redis_client is None:
+            import redis.asyncio as redis
+
+            redis_client = redis.from_url(settings.redis_url)
+        await asyncio.wait_for(redis_client.ping(), timeout=1.0)
+        return RedisAnswerStore(redis_client, max_entries=max_entries)
+    except Exception as exc:
+        logger.warning(f"Redis no disponible para la caché de respuestas, usando memoria: {exc}")
+        return InMemoryAnswerStore(max_entries=max_entries)
+
+
+async def create_answer_cache(embeddings: Embeddings, redis_client=None) -> Optional[SemanticAnswerCache]:
+    """Caché de respuestas según la configuración (None si está deshabilitada)."""
+    if not settings.answer_cache_enabled:
+        return None
+    return SemanticAnswerCache(
+        embeddings,
+        await create_answer_store(redis_client),
+        threshold=settings.answer_cache_similarity_threshold,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        prune_interval=settings.answer_cache_prune_interval_seconds,
+    )
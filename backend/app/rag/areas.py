@@ -0,0 +1,72 @@
+"""
+Áreas legales del corpus.
+
+Las áreas son las mismas que `index_legal_docs.py` guarda en la columna
+`area`. `normalize_area` traduce el `tentative_area` que devuelve el modelo
+("Derecho Laboral", "trabajo", "comercial"...) a una de ellas.
+"""
+import unicodedata
+from typing import Optional
+
+
+LEGAL_AREAS = (
+    "civil",
+    "laboral",
+    "penal",
+    "contractual",
+    "administrativo",
+    "familia",
+    "consumo",
+    "propiedad_intelectual",
+    "constitucional",
+    "otros",
+)
+
+AREA_ALIASES = {
+    "trabajo": "laboral",
+    "trabajador": "laboral",
+    "seguridad_social": "laboral",
+    "criminal": "penal",
+    "comercial": "contractual",
+    "contratos": "contractual",
+    "contrato": "contractual",
+    "mercantil": "contractual",
+    "datos_personales": "administrativo",
+    "habeas_data": "administrativo",
+    "proteccion_de_datos": "administrativo",
+    "publico": "administrativo",
+    "constitucion": "constitucional",
+    "tutela": "constitucional",
+    "derechos_fundamentales": "constitucional",
+    "consumidor": "consumo",
+    "proteccion_al_consumidor": "consumo",
+    "derechos_de_autor": "propiedad_intelectual",
+    "marcas": "propiedad_intelectual",
+    "propiedad_industrial": "propiedad_intelectual",
+    "sucesiones": "familia",
+    "divorcio": "familia",
+    "alimentos": "familia",
+}
+
+
+def _slug(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value.strip().lower())
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    for prefix in ("derecho ", "area "):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    return "_".join(value.replace("-", " ").split())
+
+
+def normalize_area(value: Optional[str]) -> Optional[str]:
+    """
+    Área del corpus para un área tentativa, o None si no se reconoce.
+
+    "otros" también devuelve None: no conviene restringir la búsqueda a los
+    documentos sin clasificar.
+    """
+    if not value:
+        return None
+    slug = _slug(value)
+    area = slug if slug in LEGAL_AREAS else AREA_ALIASES.get(slug)
+    return None if area == "otros" else area
@@ -0,0 +1,326 @@
+"""
+Caché persistente de embeddings.
+
+Envuelve cualquier objeto `Embeddings` de LangChain y guarda cada vector en
+SQLite, indexado por (modelo, hash del texto normalizado). Ingesta, indexado y
+consultas comparten el mismo archivo, así que un texto ya embebido nunca se
+vuelve a pagar.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+from app.monitoring.tracing import current_span, tracer
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza unicode (NFC) y espacios en blanco."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Clave de caché para un texto ya normalizado."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """
+    Almacén de vectores float32 en SQLite con desalojo LRU.
+
+    El tamaño se limita por número de entradas; al superarlo se eliminan las
+    menos usadas recientemente.
+
+    Los aciertos no escriben: el último uso se anota en memoria y se vuelca
+    en una sola transacción cada `touch_interval` segundos, antes de desalojar
+    y al cerrar. Así una consulta con caché es solo una lectura de SQLite.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000, touch_interval: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)"
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _flush_touched(self):
+        """Escribe los `last_used` pendientes (con el lock tomado)."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Busca vectores por clave y anota los encontrados como usados."""
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # SQLite limita el número de parámetros por sentencia
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._touched.update((key, now) for key in found)
+                if time.monotonic() - self._last_flush >= self.touch_interval:
+                    self._conn.execute("BEGIN")
+                    self._flush_touched()
+                    self._conn.execute("COMMIT")
+
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Guarda vectores y aplica el límite de tamaño."""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(key, model, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._count += self._conn.total_changes - before
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                # El orden LRU necesita los usos aún en memoria
+                self._flush_touched()
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._count -= overflow
+                self.evictions += overflow
+            self._conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de uso de la caché."""
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings con caché persistente por (modelo, texto normalizado)."""
+
+    def __init__(self, embeddings: Embeddings, model: str, store: SQLiteEmbeddingStore):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store
+
+    def _plan(self, texts: List[str]):
+        normalized = [normalize_text(text) for text in texts]
+        keys = [cache_key(self.model, text) for text in normalized]
+        return normalized, keys
+
+    @staticmethod
+    def _missing(normalized: List[str], keys: List[str], found: Dict[str, List[float]]):
+        # Textos sin vector, deduplicados dentro del lote
+        pending: Dict[str, str] = {}
+        for text, key in zip(normalized, keys):
+            if key not in found and key not in pending:
+                pending[key] = text
+        return pending
+
+    @staticmethod
+    def _annotate(total: int, hits: int):
+        current_span().set_attributes({"embedding.cache_hits": hits, "embedding.cache_misses": total - hits})
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        normalized, keys = self._plan(texts)
+        found = self.store.get_many(keys)
+        pending = self._missing(normalized, keys, found)
+        self._annotate(len(keys), sum(1 for key in keys if key in found))
+
+        if pending:
+            vectors = self.embeddings.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self.store.put_many(self.model, computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        normalized, keys = self._plan([text])
+        found = self.store.get_many(keys)
+        self._annotate(1, int(keys[0] in found))
+        if keys[0] in found:
+            return found[keys[0]]
+
+        vector = self.embeddings.embed_query(normalized[0])
+        self.store.put_many(self.model, {keys[0]: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        normalized, keys = self._plan(texts)
+        found = await asyncio.to_thread(self.store.get_many, keys)
+        pending = self._missing(normalized, keys, found)
+        self._annotate(len(keys), sum(1 for key in keys if key in found))
+
+        if pending:
+            vectors = await self.embeddings.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            await asyncio.to_thread(self.store.put_many, self.model, computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        normalized, keys = self._plan([text])
+        found = await asyncio.to_thread(self.store.get_many, keys)
+        self._annotate(1, int(keys[0] in found))
+        if keys[0] in found:
+            return found[keys[0]]
+
+        vector = await self.embeddings.aembed_query(normalized[0])
+        await asyncio.to_thread(self.store.put_many, self.model, {keys[0]: vector})
+        return vector
+
+
+class TracedEmbeddings(Embeddings):
+    """Embeddings con un span `embedding` por llamada (modelo, textos, aciertos de caché)."""
+
+    def __init__(self, embeddings: Embeddings, model: str):
+        self.embeddings = embeddings
+        self.model = model
+
+    def _span(self, count: int):
+        return tracer.span("embedding", {"embedding.model": self.model, "embedding.texts": count}, kind="CLIENT")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._span(len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._span(1):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._span(len(texts)):
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with self._span(1):
+            return await self.embeddings.aembed_query(text)
+
+
+@lru_cache()
+def get_embedding_store() -> SQLiteEmbeddingStore:
+    """Almacén de caché compartido por el proceso."""
+    return SQLiteEmbeddingStore(
+        settings.embedding_cache_path,
+        max_entries=settings.embedding_cache_max_entries,
+        touch_interval=settings.embedding_cache_touch_interval_seconds,
+    )
+
+
+def close_embedding_store():
+    """Cierra el almacén del proceso si llegó a abrirse (vuelca los usos pendientes)."""
+    if get_embedding_store.cache_info().currsize:
+        get_embedding_store().close()
+        get_embedding_store.cache_clear()
+
+
+def build_embeddings(
+    model: Optional[str] = None,
+    max_retries: int = 2,
+    http_async_client=None,
+) -> Embeddings:
+    """
+    Crea el cliente de embeddings de OpenAI envuelto en la caché local.
+
+    Con `MODEL_PROVIDER=fake` devuelve embeddings deterministas sin red.
+
+    El pipeline de indexado usa `max_retries=0` para gestionar él mismo los
+    reintentos y el backoff ante 429. `http_async_client` permite reutilizar
+    el cliente HTTP compartido de la aplicación (keep-alive).
+
+    Con `TRACING_ENABLED` el resultado va envuelto en `TracedEmbeddings`.
+    """
+    if settings.model_provider == "fake":
+        from app.rag.fakes import DeterministicFakeEmbeddings
+
+        model = "fake"
+        embeddings: Embeddings = DeterministicFakeEmbeddings(
+            latency_ms=settings.fake_embedding_latency_ms,
+            latency_distribution=settings.fake_latency_distribution,
+            latency_jitter=settings.fake_latency_jitter,
+        )
+    else:
+        from langchain_openai import OpenAIEmbeddings
+
+        model = model or settings.openai_embedding_model
+        embeddings = OpenAIEmbeddings(
+            model=model,
+            openai_api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            max_retries=max_retries,
+            http_async_client=http_async_client,
+        )
+        if settings.embedding_cache_enabled:
+            embeddings = CachedEmbeddings(embeddings, model, get_embedding_store())
+
+    if settings.tracing_enabled:
+        return TracedEmbeddings(embeddings, model)
+    return embeddings
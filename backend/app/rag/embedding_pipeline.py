@@ -0,0 +1,323 @@
+"""
+Pipeline concurrente de embeddings para indexado masivo.
+
+Agrupa los chunks en lotes por número de tokens, solapa las llamadas al
+proveedor de embeddings con las escrituras en la base vectorial y respeta los
+límites de requests y tokens por minuto con token buckets. Ante un 429 pausa
+a todos los workers, reduce el tamaño de lote y reintenta con backoff.
+
+La entrada se consume en streaming: como máximo `max_inflight` chunks están
+leídos pero aún no escritos, así que la memoria no depende del corpus.
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator,
+    List, Optional, Tuple, TypeVar, Union
+)
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+
+T = TypeVar("T")
+Items = Union[Iterable[Tuple[Document, str]], AsyncIterable[Tuple[Document, str]]]
+WriteFn = Callable[[List[str], List[List[float]], List[Dict[str, Any]], List[str]], Awaitable[None]]
+
+
+@lru_cache()
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Cuenta tokens con tiktoken si está disponible; si no, aproxima."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Token bucket asíncrono con recarga continua."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Espera hasta poder consumir `amount` (en orden de llegada)."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Limita requests y tokens por minuto hacia el proveedor."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float = 10.0):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self._paused_until = 0.0
+
+    async def acquire(self, tokens: int):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+    def pause(self, seconds: float):
+        """Detiene a todos los solicitantes (p. ej. tras un 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    return _status_code(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """429, errores 5xx y timeouts/conexión del proveedor."""
+    if is_rate_limit_error(exc):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or type(exc).__name__ in {
+        "APITimeoutError", "APIConnectionError"
+    }
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Lee el header Retry-After de la respuesta, si viene."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def aiter_in_thread(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """
+    Recorre un iterable síncrono (lectura de disco, splitting) en un thread.
+
+    Cada `next()` corre fuera del event loop, así que la E/S del productor no
+    bloquea a los workers de embeddings ni de escritura.
+    """
+    iterator: Iterator[T] = iter(iterable)
+    sentinel = object()
+    while (item := await asyncio.to_thread(next, iterator, sentinel)) is not sentinel:
+        yield item
+
+
+def vectorstore_writer(vectorstore, use_async: bool = True) -> WriteFn:
+    """Adapta un VectorStore de LangChain a la etapa de escritura del pipeline."""
+    async def write(texts, vectors, metadatas, ids):
+        if use_async:
+            await vectorstore.aadd_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+        else:
+            await asyncio.to_thread(vectorstore.add_embeddings, texts, vectors, metadatas=metadatas, ids=ids)
+    return write
+
+
+@dataclass
+class _Batch:
+    items: List[Tuple[Document, str]]
+    tokens: int
+
+
+@dataclass
+class PipelineStats:
+    """Estadísticas de una ejecución del pipeline."""
+    chunks: int = 0
+    batches: int = 0
+    tokens: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    started: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        elapsed = self.elapsed or (time.monotonic() - self.started)
+        rate = self.chunks / elapsed if elapsed else 0.0
+        tpm = self.tokens / elapsed * 60 if elapsed else 0.0
+        return (
+            f"{self.chunks} chunks in {self.batches} batches, {self.tokens} tokens, "
+            f"{elapsed:.1f}s ({rate:.1f} chunks/s, {tpm:,.0f} tokens/min), "
+            f"{self.retries} retries, {self.rate_limited} rate-limited"
+        )
+
+
+class EmbeddingPipeline:
+    """
+    Embebe y escribe chunks con concurrencia acotada.
+
+    Etapas: lotes por tokens -> N workers de embeddings -> M workers de
+    escritura, conectadas por colas acotadas (backpressure).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        write: WriteFn,
+        limiter: Optional[RateLimiter] = None,
+        max_concurrency: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_items: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        writers: int = 2,
+        on_progress: Optional[Callable[[PipelineStats], None]] = None,
+    ):
+        self.embeddings = embeddings
+        self.write = write
+        self.limiter = limiter or RateLimiter(
+            settings.embedding_requests_per_minute,
+            settings.embedding_tokens_per_minute,
+        )
+        self.max_concurrency = max_concurrency or settings.embedding_max_concurrency
+        self.max_batch_tokens = max_batch_tokens or settings.embedding_batch_max_tokens
+        self.max_batch_items = max_batch_items or settings.embedding_batch_max_items
+        self.max_retries = settings.embedding_max_retries if max_retries is None else max_retries
+        self.max_inflight = max_inflight or settings.index_inflight_chunks
+        self.writers = writers
+        self.on_progress = on_progress
+        self.min_batch_tokens = max(256, self.max_batch_tokens // 16)
+        self._batch_tokens = self.max_batch_tokens
+        self.stats = PipelineStats()
+
+    async def run(self, items: Items) -> PipelineStats:
+        """Procesa pares (documento, id), síncronos o asíncronos, hasta agotarlos."""
+        self.stats = PipelineStats()
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.writers * 2)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._produce(items, embed_queue))
+            embedders = [
+                tg.create_task(self._embed_worker(embed_queue, write_queue))
+                for _ in range(self.max_concurrency)
+            ]
+            tg.create_task(self._close_writers(embedders, write_queue))
+            for _ in range(self.writers):
+                tg.create_task(self._write_worker(write_queue))
+
+        self.stats.elapsed = time.monotonic() - self.stats.started
+        return self.stats
+
+    @staticmethod
+    async def _iterate(items: Items) -> AsyncIterator[Tuple[Document, str]]:
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    async def _produce(self, items: Items, queue: asyncio.Queue):
+        batch: List[Tuple[Document, str]] = []
+        batch_tokens = 0
+        async for doc, doc_id in self._iterate(items):
+            tokens = estimate_tokens(doc.page_content)
+            if batch and (
+                batch_tokens + tokens > self._batch_tokens
+                or len(batch) >= self.max_batch_items
+                # Ventana llena: enviar el lote parcial para que avance
+                or self._inflight.locked()
+            ):
+                await queue.put(_Batch(batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            await self._inflight.acquire()
+            batch.append((doc, doc_id))
+            batch_tokens += tokens
+
+        if batch:
+            await queue.put(_Batch(batch, batch_tokens))
+        for _ in range(self.max_concurrency):
+            await queue.put(None)
+
+    async def _embed_worker(self, in_queue: asyncio.Queue, out_queue: asyncio.Queue):
+        while (batch := await in_queue.get()) is not None:
+            vectors = await self._embed_with_retry(batch)
+            await out_queue.put((batch, vectors))
+
+    async def _embed_with_retry(self, batch: _Batch) -> List[List[float]]:
+        texts = [doc.page_content for doc, _ in batch.items]
+        attempt = 0
+        while True:
+            await self.limiter.acquire(batch.tokens)
+            try:
+                vectors = await self.embeddings.aembed_documents(texts)
+            except Exception as exc:
+                if not is_retryable_error(exc) or attempt >= self.max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                if is_rate_limit_error(exc):
+                    delay = retry_after(exc) or delay
+                    self.stats.rate_limited += 1
+                    self.limiter.pause(delay)
+                    # Lotes más pequeños hasta que el proveedor se recupere
+                    self._batch_tokens = max(self.min_batch_tokens, self._batch_tokens // 2)
+                self.stats.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self._batch_tokens = min(self.max_batch_tokens, int(self._batch_tokens * 1.25))
+            return vectors
+
+    async def _close_writers(self, embedders: List[asyncio.Task], queue: asyncio.Queue):
+        await asyncio.gather(*embedders)
+        for _ in range(self.writers):
+            await queue.put(None)
+
+    async def _write_worker(self, queue: asyncio.Queue):
+        while (item := await queue.get()) is not None:
+            batch, vectors = item
+            await self.write(
+                [doc.page_content for doc, _ in batch.items],
+                vectors,
+                [doc.metadata for doc, _ in batch.items],
+                [doc_id for _, doc_id in batch.items],
+            )
+            for _ in batch.items:
+                self._inflight.release()
+            self.stats.chunks += len(batch.items)
+            self.stats.batches += 1
+            self.stats.tokens += batch.tokens
+            if self.on_progress:
+                self.on_progress(self.stats)
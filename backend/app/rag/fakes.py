@@ -0,0 +1,221 @@
+"""
+Proveedores falsos y deterministas para pruebas, benchmarks y modo offline.
+
+Las respuestas son deterministas; las latencias simuladas pueden seguir una
+distribución (`LATENCY_DISTRIBUTIONS`) para pruebas de carga realistas.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import unicodedata
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_AREA_RE = re.compile(r"Área probable: (\w+)")
+_SOURCE_RE = re.compile(r"^\[(\d+)\] (.+)$", re.MULTILINE)
+_STREAM_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def sample_latency_ms(mean_ms: float, distribution: str = "fixed", jitter: float = 0.5) -> float:
+    """
+    Latencia simulada con media `mean_ms`.
+
+    `jitter` es la dispersión relativa: ±jitter·media en "uniform" y sigma
+    en "lognormal" (cola larga, como la de un proveedor real).
+    "exponential" no lo usa.
+    """
+    if mean_ms <= 0:
+        return 0.0
+    if distribution == "fixed":
+        return mean_ms
+    if distribution == "uniform":
+        return mean_ms * random.uniform(max(0.0, 1 - jitter), 1 + jitter)
+    if distribution == "exponential":
+        return random.expovariate(1 / mean_ms)
+    if distribution == "lognormal":
+        return random.lognormvariate(math.log(mean_ms) - jitter ** 2 / 2, jitter)
+    raise ValueError(f"Distribución de latencia desconocida: {distribution} (opciones: {LATENCY_DISTRIBUTIONS})")
+
+
+class DeterministicFakeEmbeddings(Embeddings):
+    """
+    Embeddings deterministas por feature hashing de palabras.
+
+    Textos que comparten vocabulario quedan cerca en el espacio, así que las
+    búsquedas por similitud tienen sentido sin llamar a ningún proveedor.
+    `latency_ms` simula la latencia de red por llamada (no por texto).
+    """
+
+    def __init__(
+        self,
+        dimensions: int = 1536,
+        latency_ms: float = 0.0,
+        latency_distribution: str = "fixed",
+        latency_jitter: float = 0.5,
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Distribución de latencia desconocida: {latency_distribution}")
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_jitter = latency_jitter
+
+    def _delay(self) -> float:
+        return sample_latency_ms(self.latency_ms, self.latency_distribution, self.latency_jitter) / 1000
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in _TOKEN_RE.findall(_fold(text)):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            index = value % self.dimensions
+            vector[index] += 1.0 if (value >> 63) & 1 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            # Texto vacío: vector unitario fijo para no devolver ceros
+            vector[0] = 1.0
+            return vector
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay())
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay())
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay())
+        return await asyncio.to_thread(lambda: [self._embed(text) for text in texts])
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay())
+        return await asyncio.to_thread(self._embed, text)
+
+
+class FakeLegalChatModel(BaseChatModel):
+    """
+    Chat model determinista que simula al proveedor (sin red).
+
+    Si el prompt de sistema pide JSON devuelve una recomendación con el área
+    indicada en "Área probable" (o, para el evaluador de calidad, un puntaje
+    que mejora tras una revisión); si no, una respuesta en Markdown que cita
+    las fuentes del contexto. Las latencias simulan el tiempo al primer
+    token y entre tokens del streaming.
+    """
+
+    first_token_ms: float = 0.0
+    token_delay_ms: float = 0.0
+    latency_distribution: str = "fixed"
+    latency_jitter: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-legal"
+
+    def _delay(self, mean_ms: float) -> float:
+        """Segundos a esperar, muestreados de la distribución configurada."""
+        return sample_latency_ms(mean_ms, self.latency_distribution, self.latency_jitter) / 1000
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        system = " ".join(m.content for m in messages if m.type == "system")
+        prompt = messages[-1].content if messages else ""
+        human = "\n".join(m.content for m in messages if m.type == "human")
+        area_match = _AREA_RE.search(human)
+        area = area_match.group(1) if area_match else "otros"
+        sources = _SOURCE_RE.findall(human)
+
+        if "evaluador" in system:
+            revised = "Revisado según la evaluación" in prompt
+            score = (8 if sources else 5) + (2 if revised else 0)
+            return json.dumps({"score": score, "feedback": "" if score >= 7 else "Citar las normas aplicables"})
+
+        if "JSON" in system:
+            revision = " Revisado según la evaluación de calidad." if "no superó la revisión" in prompt else ""
+            return json.dumps({
+                "area": area,
+                "diagnosis": f"Caso del área {area} según el contexto recuperado.{revision}",
+                "risks": ["Vencimiento de términos legales"],
+                "documents_needed": ["Documento de identidad", "Pruebas del caso"],
+                "recommended_action": "Consultar con un abogado del área",
+                "estimated_cost": "Por determinar",
+                "next_steps": ["Reunir documentos", "Agendar asesoría"],
+                "confidence_score": 0.7 if sources else 0.3,
+            }, ensure_ascii=False)
+
+        citations = ", ".join(f"[{n}] {name}" for n, name in sources) or "sin fuentes"
+        return (
+            f"## Diagnóstico\nTu consulta corresponde al área {area}.\n\n"
+            f"## Riesgos\nPodrían vencerse los términos para actuar.\n\n"
+            f"## Documentos necesarios\nDocumento de identidad y pruebas del caso.\n\n"
+            f"## Acción recomendada\nConsultar con un abogado del área ({citations}).\n\n"
+            f"## Próximos pasos\nReunir los documentos y agendar una asesoría."
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._delay(self.first_token_ms))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay(self.first_token_ms))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._delay(self.first_token_ms))
+        for token in _STREAM_TOKEN_RE.findall(self._respond(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            time.sleep(self._delay(self.token_delay_ms))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._delay(self.first_token_ms))
+        for token in _STREAM_TOKEN_RE.findall(self._respond(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self._delay(self.token_delay_ms))
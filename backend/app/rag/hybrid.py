@@ -0,0 +1,128 @@
+"""
+Recuperación híbrida: búsqueda léxica + vectorial con reciprocal rank fusion.
+
+Las consultas con citas exactas ("artículo 86", "Ley 1581") se resuelven
+solo con el índice léxico, sin llamar al proveedor de embeddings. El resto
+combina ambas listas con RRF, que no necesita calibrar los scores (BM25 y
+similitud coseno no son comparables).
+
+Los vector stores sin `lexical_search` (p. ej. PGVector) usan solo la
+búsqueda vectorial.
+"""
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from app.monitoring.tracing import tracer
+from app.rag.lexical import extract_citations
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+async def _traced_search(name: str, search, **attributes):
+    """Ejecuta una búsqueda dentro de un span con los ids de los chunks devueltos."""
+    with tracer.span(name, attributes) as span:
+        results = await search
+        if span.recording:
+            documents = [item[0] if isinstance(item, tuple) else item for item in results]
+            span.set_attributes({
+                "retrieval.count": len(documents),
+                "retrieval.chunk_ids": [_doc_key(doc) for doc in documents],
+            })
+        return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], rrf_k: int = 60) -> List[Document]:
+    """Fusiona listas ordenadas: score(d) = Σ 1 / (rrf_k + rango)."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever híbrido sobre un vector store con `lexical_search`.
+
+    Args:
+        vectorstore: Vector store (local o postgres para la parte léxica).
+        k: Documentos a devolver.
+        fetch_k: Candidatos por cada lista antes de fusionar.
+        rrf_k: Constante de RRF (60 es el valor habitual).
+        filter: Filtro de metadata aplicado a ambas búsquedas.
+    """
+
+    vectorstore: VectorStore
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    filter: Optional[Dict[str, Any]] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def supports_lexical(self) -> bool:
+        return hasattr(self.vectorstore, "lexical_search")
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if not self.supports_lexical:
+            return self.vectorstore.similarity_search(query, k=self.k, filter=self.filter)
+
+        citations = extract_citations(query)
+        if citations:
+            hits = self.vectorstore.lexical_search(query, self.k, self.filter, citations)
+            if hits:
+                return [doc for doc, _ in hits]
+
+        lexical = [doc for doc, _ in self.vectorstore.lexical_search(query, self.fetch_k, self.filter)]
+        vector = self.vectorstore.similarity_search(query, k=self.fetch_k, filter=self.filter)
+        return reciprocal_rank_fusion([vector, lexical], self.rrf_k)[:self.k]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.supports_lexical:
+            return await _traced_search(
+                "retrieval.vector_search",
+                self.vectorstore.asimilarity_search(query, k=self.k, filter=self.filter),
+                **{"retrieval.k": self.k},
+            )
+
+        citations = extract_citations(query)
+        if citations:
+            hits = await _traced_search(
+                "retrieval.lexical_search",
+                self.vectorstore.alexical_search(query, self.k, self.filter, citations),
+                **{"retrieval.k": self.k, "retrieval.citations": True},
+            )
+            if hits:
+                return [doc for doc, _ in hits]
+
+        lexical, vector = await asyncio.gather(
+            _traced_search(
+                "retrieval.lexical_search",
+                self.vectorstore.alexical_search(query, self.fetch_k, self.filter),
+                **{"retrieval.k": self.fetch_k},
+            ),
+            _traced_search(
+                "retrieval.vector_search",
+                self.vectorstore.asimilarity_search(query, k=self.fetch_k, filter=self.filter),
+                **{"retrieval.k": self.fetch_k},
+            ),
+        )
+        return reciprocal_rank_fusion([vector, [doc for doc, _ in lexical]], self.rrf_k)[:self.k]
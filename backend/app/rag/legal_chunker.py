@@ -0,0 +1,239 @@
+"""
+Chunker para textos legales colombianos.
+
+Reconoce encabezados de Título, Capítulo y Artículo, mantiene cada artículo
+completo cuando cabe en un chunk y adjunta la jerarquía como metadata. Solo
+los artículos (o secciones sin estructura) que exceden el tamaño máximo se
+dividen por párrafos/oraciones, y únicamente entonces se aplica solapamiento
+(la cola del chunk anterior) y se repite el encabezado del artículo.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+_TITLE_RE = re.compile(
+    r"^\s*T[IÍ]TULO\s+([IVXLCDM]+|\d+|PRELIMINAR|[ÚU]NICO)\b\.?\s*[-–:.]?\s*(.*)$",
+    re.IGNORECASE,
+)
+_CHAPTER_RE = re.compile(
+    r"^\s*CAP[IÍ]TULO\s+([IVXLCDM]+|\d+|PRELIMINAR|[ÚU]NICO)\b\.?\s*[-–:.]?\s*(.*)$",
+    re.IGNORECASE,
+)
+# Número de artículo: "5", "1o", "5A", "5-A", "5o-A". La letra va pegada y en
+# mayúscula, o tras un guion: "86 y", "20 a" o "5 e" son el número seguido de
+# una conjunción o preposición, no un artículo con letra. Lo comparten el
+# chunker (encabezados) y `lexical.extract_citations` (consultas).
+_NOT_LETTER = r"(?![^\W\d_])"
+ARTICLE_NUMBER_PATTERN = rf"\d+(?:\s*[oº°]{_NOT_LETTER})?(?:\s*-\s*[A-Z]{_NOT_LETTER}|(?-i:[A-Z]){_NOT_LETTER})?"
+
+_ARTICLE_RE = re.compile(
+    rf"^\s*ART[IÍ]CULO\s+({ARTICLE_NUMBER_PATTERN}|TRANSITORIO|[ÚU]NICO)\s*[\.:\-–]?\s*",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"(?<=[\.;:])\s+")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class _Section:
+    """Bloque de texto con su posición en la jerarquía."""
+    metadata: Dict[str, str]
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """`text[start:end]` sin espacios en los extremos, como posiciones."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _is_name_line(line: str) -> bool:
+    """Línea en mayúsculas que nombra al título/capítulo anterior."""
+    stripped = line.strip()
+    return (
+        0 < len(stripped) <= 200
+        and stripped == stripped.upper()
+        and any(c.isalpha() for c in stripped)
+        and not (_TITLE_RE.match(stripped) or _CHAPTER_RE.match(stripped) or _ARTICLE_RE.match(stripped))
+    )
+
+
+def article_number(raw: str) -> str:
+    """Forma canónica del número de artículo ("5 A" -> "5A", "1o" -> "1")."""
+    return re.sub(r"[\s\-oº°]+", "", raw).upper() if raw[0].isdigit() else raw.upper()
+
+
+class LegalTextSplitter:
+    """
+    Divide textos legales respetando Títulos, Capítulos y Artículos.
+
+    Args:
+        chunk_size: Máximo de caracteres por chunk.
+        chunk_overlap: Solapamiento (caracteres) entre partes de un mismo
+            artículo cuando hay que dividirlo.
+    """
+
+    version = "3"
+
+    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 150):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap debe ser menor que chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def fingerprint(self) -> str:
+        """Identifica la configuración (cambiarla invalida el manifiesto)."""
+        return f"legal:v{self.version}:{self.chunk_size}:{self.chunk_overlap}"
+
+    def _sections(self, text: str) -> List[_Section]:
+        """Recorre las líneas y agrupa el texto por artículo."""
+        hierarchy: Dict[str, str] = {}
+        sections: List[_Section] = []
+        current = _Section(metadata={})
+        pending_name: Optional[str] = None
+
+        for line in text.splitlines():
+            if pending_name and line.strip():
+                # El nombre del título/capítulo suele venir en la línea siguiente
+                if _is_name_line(line):
+                    hierarchy[f"{pending_name}_nombre"] = line.strip()
+                    pending_name = None
+                    continue
+                pending_name = None
+
+            heading = _TITLE_RE.match(line) or _CHAPTER_RE.match(line)
+            if heading:
+                level = "titulo" if heading.re is _TITLE_RE else "capitulo"
+                if level == "titulo":
+                    for key in ("capitulo", "capitulo_nombre"):
+                        hierarchy.pop(key, None)
+                hierarchy[level] = heading.group(1).upper()
+                hierarchy.pop(f"{level}_nombre", None)
+                name = heading.group(2).strip()
+                if name:
+                    hierarchy[f"{level}_nombre"] = name
+                else:
+                    pending_name = level
+                sections.append(current)
+                current = _Section(metadata=dict(hierarchy))
+                continue
+
+            article = _ARTICLE_RE.match(line)
+            if article:
+                sections.append(current)
+                current = _Section(metadata={**hierarchy, "articulo": article_number(article.group(1))})
+
+            current.lines.append(line)
+
+        sections.append(current)
+        return [section for section in sections if section.text]
+
+    def _pieces(self, text: str, limit: int) -> List[Tuple[int, int]]:
+        """Unidades indivisibles (párrafos u oraciones) como posiciones en `text`."""
+        pieces: List[Tuple[int, int]] = []
+        bounds = [0, *(p for m in _PARAGRAPH_BREAK_RE.finditer(text) for p in m.span()), len(text)]
+        for start, end in zip(bounds[0::2], bounds[1::2]):
+            start, end = _strip_span(text, start, end)
+            if start == end:
+                continue
+            if end - start <= limit:
+                pieces.append((start, end))
+                continue
+            # Las oraciones demasiado largas se cortan dejando lugar al solapamiento
+            width = limit - self.chunk_overlap
+            sentences = [start, *(p for m in _SENTENCE_RE.finditer(text, start, end) for p in m.span()), end]
+            for sentence_start, sentence_end in zip(sentences[0::2], sentences[1::2]):
+                while sentence_end - sentence_start > limit:
+                    cut = text.rfind(" ", sentence_start, sentence_start + width)
+                    cut = cut if cut > sentence_start else sentence_start + width
+                    pieces.append((sentence_start, cut))
+                    sentence_start, _ = _strip_span(text, cut, sentence_end)
+                if sentence_start < sentence_end:
+                    pieces.append((sentence_start, sentence_end))
+        return pieces
+
+    def _overlap_start(self, text: str, end: int, piece: Tuple[int, int], limit: int) -> int:
+        """
+        Inicio del chunk siguiente: los últimos `chunk_overlap` caracteres del
+        anterior, desde el comienzo de una palabra, sin que el chunk con
+        `piece` pase de `limit`.
+        """
+        start = max(end - self.chunk_overlap, piece[1] - limit)
+        if start >= piece[0]:
+            return piece[0]
+        if start > 0 and not text[start - 1].isspace():
+            space = _SPACE_RE.search(text, start, piece[0])
+            if space is None:
+                return piece[0]
+            start = space.end()
+        return _strip_span(text, start, piece[0])[0] if start < piece[0] else piece[0]
+
+    def _split_long(self, text: str, heading: Optional[str] = None) -> List[str]:
+        """
+        Empaqueta piezas en chunks con solapamiento de caracteres.
+
+        Cada chunk es un tramo continuo del texto original (conserva sus
+        saltos de línea) y las partes 2..n repiten `heading` ("ARTÍCULO 5.")
+        para que el chunk se entienda sin la metadata.
+        """
+        prefix = f"{heading}\n" if heading else ""
+        limit = self.chunk_size - len(prefix)
+        chunks: List[str] = []
+        start = end = None
+
+        for piece in self._pieces(text, limit):
+            if start is not None and piece[1] - start > limit:
+                chunks.append(text[start:end])
+                start = self._overlap_start(text, end, piece, limit)
+            if start is None:
+                start = piece[0]
+            end = piece[1]
+
+        if start is not None:
+            chunks.append(text[start:end])
+        if heading and len(chunks) > 1 and chunks[0].strip() == heading:
+            # El encabezado solo no es un chunk útil: ya va en las demás partes
+            chunks = chunks[1:]
+            return [prefix + chunk for chunk in chunks]
+        return chunks[:1] + [prefix + chunk for chunk in chunks[1:]]
+
+    def split_text(self, text: str) -> List[str]:
+        return [doc.page_content for doc in self._split(text, {})]
+
+    def _split(self, text: str, metadata: Dict) -> List[Document]:
+        documents = []
+        for section in self._sections(text):
+            section_text = section.text
+            if len(section_text) <= self.chunk_size:
+                documents.append(Document(
+                    page_content=section_text,
+                    metadata={**metadata, **section.metadata},
+                ))
+                continue
+
+            heading = _ARTICLE_RE.match(section_text) if "articulo" in section.metadata else None
+            parts = self._split_long(section_text, heading.group(0).strip() if heading else None)
+            for index, part in enumerate(parts, 1):
+                documents.append(Document(
+                    page_content=part,
+                    metadata={**metadata, **section.metadata, "parte": f"{index}/{len(parts)}"},
+                ))
+        return documents
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Divide documentos conservando su metadata y agregando la jerarquía."""
+        chunks: List[Document] = []
+        for document in documents:
+            chunks.extend(self._split(document.page_content, document.metadata))
+        return chunks
@@ -0,0 +1,195 @@
+"""
+Búsqueda léxica para textos legales en español.
+
+- `tokenize`: minúsculas sin tildes, sin stopwords y con un stemmer ligero,
+  igual para documentos y consultas.
+- `BM25Index`: índice invertido en memoria (backend local).
+- `extract_citations`: detecta citas exactas ("artículo 86", "Ley 1581")
+  que se resuelven sin embeddings.
+
+En el backend "postgres" el equivalente es la columna `content_tsv`
+(configuración `spanish_unaccent`) con su índice GIN; ver setup_db.py.
+"""
+import math
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.rag.legal_chunker import ARTICLE_NUMBER_PATTERN, article_number
+
+
+_WORD_RE = re.compile(r"\w+")
+_ARTICLE_CITE_RE = re.compile(
+    rf"\bart(?:[ií]culo|\.)?\s*(?:n[°º.o]*\s*)?({ARTICLE_NUMBER_PATTERN})",
+    re.IGNORECASE,
+)
+_NORM_CITE_RE = re.compile(
+    r"\b(ley|decreto|resoluci[oó]n|acuerdo|circular)\s+(?:estatutaria\s+)?(?:n[°º.o]*\s*)?(\d+)\b",
+    re.IGNORECASE,
+)
+_RULING_CITE_RE = re.compile(r"\b(?:sentencia\s+)?([TCU]|SU)\s*-\s*(\d+)\b", re.IGNORECASE)
+
+STOPWORDS = frozenset("""
+a al algo ante antes como con contra cual cuando de del desde donde durante e el ella ellas ellos
+en entre era es esa ese eso esta este esto fue ha hay la las le les lo los mas me mi mis muy
+ni no nos o os otra otro para pero por porque que quien se ser si sin sobre son su sus tambien
+te tiene tu un una uno unos unas y ya yo
+""".split())
+
+# Sufijos en orden de prueba (más largos primero)
+_SUFFIXES = (
+    "amientos", "imientos", "aciones", "uciones", "amiento", "imiento", "idades",
+    "mente", "acion", "ucion", "idad", "ables", "ibles", "istas", "able", "ible",
+    "ista", "ivos", "ivas", "osos", "osas", "ados", "adas", "idos", "idas",
+    "ivo", "iva", "oso", "osa", "ado", "ada", "ido", "ida",
+    "es", "os", "as", "an", "en", "ar", "er", "ir", "a", "o", "e", "s",
+)
+_MIN_STEM = 3
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes (la ñ queda como n)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(word: str) -> str:
+    """Stemmer ligero: quita el primer sufijo que deje una raíz razonable."""
+    if word.isdigit():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(word) for word in _WORD_RE.findall(fold(text)) if word not in STOPWORDS]
+
+
+@dataclass
+class Citations:
+    """Citas exactas de una consulta."""
+    articles: List[str] = field(default_factory=list)
+    # Frases normalizadas ("ley 1581", "t 760") a buscar en texto o fuente
+    norms: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.articles or self.norms)
+
+
+def extract_citations(query: str) -> Citations:
+    citations = Citations()
+    for match in _ARTICLE_CITE_RE.finditer(query):
+        citations.articles.append(article_number(match.group(1)))
+    for match in _NORM_CITE_RE.finditer(query):
+        citations.norms.append(f"{fold(match.group(1))} {match.group(2)}")
+    for match in _RULING_CITE_RE.finditer(query):
+        citations.norms.append(f"{fold(match.group(1))} {match.group(2)}")
+    citations.articles = list(dict.fromkeys(citations.articles))
+    citations.norms = list(dict.fromkeys(citations.norms))
+    return citations
+
+
+_RULING_KINDS = frozenset({"t", "c", "u", "su"})
+
+
+def _norm_pattern(norm: str) -> re.Pattern:
+    """
+    Patrón de una cita normalizada sobre texto plegado (`fold`).
+
+    Las sentencias exigen la forma de cita ("t-760", "sentencia t 760",
+    "t_760" en nombres de archivo): una letra suelta seguida de un número no
+    basta. Los límites no usan `\b` porque "_" cuenta como letra y los
+    nombres de archivo separan con guiones bajos.
+    """
+    kind, number = norm.split(" ")
+    if kind in _RULING_KINDS:
+        body = rf"(?:{kind}\s*-\s*|{kind}_|sentencia[\s_\-]+{kind}[\s_\-]*)"
+    else:
+        body = rf"{kind}(?:[\s_\-]+(?:estatutaria|organica|unico(?:[\s_\-]+reglamentario)?))?[\s_\-]+(?:(?:n|no|nro|numero)[\s_.\-°]*)?"
+    return re.compile(rf"(?<![a-z0-9]){body}{number}(?!\d)")
+
+
+def matches_citations(citations: Citations, text: str, metadata: Dict) -> bool:
+    """
+    True si el chunk satisface todas las citas.
+
+    Los artículos se comparan con `metadata["articulo"]` del chunker; las
+    normas, con el texto o el nombre del archivo ("ley_1581_2012.txt").
+    """
+    if citations.articles and metadata.get("articulo") not in citations.articles:
+        return False
+    if citations.norms:
+        haystack = fold(f"{metadata.get('source', '')} {text}")
+        return all(_norm_pattern(norm).search(haystack) for norm in citations.norms)
+    return True
+
+
+class BM25Index:
+    """
+    Índice BM25 en memoria sobre filas de un vector store.
+
+    Las listas de postings son arrays NumPy, así que puntuar una consulta es
+    proporcional a la longitud de las listas de sus términos.
+    """
+
+    def __init__(self, rows: Sequence[int], texts: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.rows = np.asarray(rows, dtype=np.int64)
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[position] = counts.get(position, 0) + 1
+
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if len(lengths) else 0.0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            token: (
+                np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+            )
+            for token, counts in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score BM25 de cada posición del índice para la consulta."""
+        n = len(self.rows)
+        scores = np.zeros(n, dtype=np.float32)
+        if n == 0:
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / (self.avg_length or 1.0))
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            positions, tf = self.postings[token]
+            idf = math.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * tf * (self.k1 + 1) / (tf + norm[positions])
+        return scores
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (fila, score) con score > 0.
+
+        Args:
+            allowed: Máscara booleana por posición (filtros), opcional.
+        """
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) == 0 or k <= 0:
+            return []
+        top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+        return [(int(self.rows[p]), float(scores[p])) for p in top]
@@ -0,0 +1,593 @@
+"""
+Vector store local sobre matrices NumPy mapeadas en memoria.
+
+Alternativa a PGVector sin servicios externos: los vectores (normalizados,
+float32 o cuantizados a float16/int8) se guardan en un `.npy` que se abre con
+memory-map, y los textos/metadata en un JSONL. Soporta búsqueda exacta
+(fuerza bruta) o aproximada (IVF) y filtrado previo por `area`. La búsqueda
+léxica (BM25) usa un índice invertido que se construye al primer uso.
+
+Estructura en disco:
+    <path>/index.json     configuración y conteo
+    <path>/vectors.npy    matriz (n, dim)
+    <path>/scales.npy     escala por fila (solo int8)
+    <path>/docs.jsonl     id, texto y metadata por fila
+    <path>/ivf.npz        centroides y listas invertidas (modo ivf)
+"""
+import asyncio
+import json
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.rag.lexical import BM25Index, Citations, matches_citations
+
+
+INDEX_VERSION = 1
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+SEARCH_MODES = ("brute", "ivf")
+
+# Filas por bloque al calcular similitudes (acota la memoria temporal)
+_BLOCK_ROWS = 65_536
+
+
+@dataclass
+class _IVFIndex:
+    centroids: np.ndarray   # (n_lists, dim) float32 normalizados
+    offsets: np.ndarray     # (n_lists + 1,) inicio de cada lista en `rows`
+    rows: np.ndarray        # filas agrupadas por lista
+    indexed_count: int      # filas existentes al construir el índice
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store en memoria/memory-map con similitud coseno.
+
+    Los scores devueltos son similitud coseno (mayor es mejor).
+
+    Args:
+        embedding: Función de embeddings para textos y consultas.
+        path: Directorio del índice (necesario para `persist`).
+        dtype: "float32", "float16" o "int8" (cuantización por fila).
+        search_mode: "brute" (exacta) o "ivf" (aproximada).
+        nprobe: Listas IVF a recorrer por consulta.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        search_mode: str = "brute",
+        nprobe: int = 8,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype no soportado: {dtype}")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode no soportado: {search_mode}")
+
+        self.embedding = embedding
+        self.path = Path(path) if path else None
+        self.dtype = dtype
+        self.search_mode = search_mode
+        self.nprobe = nprobe
+
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._deleted = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._area_rows: Dict[str, np.ndarray] = {}
+        self._ivf: Optional[_IVFIndex] = None
+        self._bm25: Optional[BM25Index] = None
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes de las matrices del índice (vectores, escalas e IVF; sin textos)."""
+        arrays = [self._vectors, self._scales, self._deleted]
+        if self._ivf is not None:
+            arrays += [self._ivf.centroids, self._ivf.offsets, self._ivf.rows]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(DTYPES[self.dtype]), None
+
+    def _ensure_capacity(self, dim: int, extra: int):
+        needed = self._count + extra
+        if self._vectors is None:
+            capacity = max(needed, 1024)
+            self._vectors = np.empty((capacity, dim), dtype=DTYPES[self.dtype])
+            self._scales = np.empty(capacity, dtype=np.float32) if self.dtype == "int8" else None
+            self._deleted = np.zeros(capacity, dtype=bool)
+            return
+        if self._vectors.shape[1] != dim:
+            raise ValueError(f"Dimensión {dim} distinta a la del índice ({self._vectors.shape[1]})")
+
+        # Un memory-map de solo lectura se copia a memoria en la primera escritura
+        if isinstance(self._vectors, np.memmap) or needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors), 1024)
+            vectors = np.empty((capacity, dim), dtype=self._vectors.dtype)
+            vectors[:self._count] = self._vectors[:self._count]
+            self._vectors = vectors
+            if self._scales is not None:
+                scales = np.empty(capacity, dtype=np.float32)
+                scales[:self._count] = self._scales[:self._count]
+                self._scales = scales
+            deleted = np.zeros(capacity, dtype=bool)
+            deleted[:self._count] = self._deleted[:self._count]
+            self._deleted = deleted
+
+    def add_embeddings(
+        self,
+        texts: Iterable[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Agrega (o reemplaza por id) textos con sus embeddings ya calculados."""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        # Ids repetidos en el mismo lote: gana la última aparición
+        last_row = {doc_id: row for row, doc_id in enumerate(ids)}
+        if len(last_row) < len(ids):
+            keep = sorted(last_row.values())
+            texts = [texts[row] for row in keep]
+            metadatas = [metadatas[row] for row in keep]
+            unique_ids = [ids[row] for row in keep]
+            matrix = matrix[keep]
+        else:
+            unique_ids = ids
+        encoded, scales = self._encode(_normalize(matrix))
+
+        with self._lock:
+            self._ensure_capacity(matrix.shape[1], len(texts))
+            for doc_id in unique_ids:
+                previous = self._row_by_id.pop(doc_id, None)
+                if previous is not None:
+                    self._deleted[previous] = True
+
+            start, end = self._count, self._count + len(texts)
+            self._vectors[start:end] = encoded
+            if scales is not None:
+                self._scales[start:end] = scales
+            self._deleted[start:end] = False
+            for offset, doc_id in enumerate(unique_ids):
+                self._row_by_id[doc_id] = start + offset
+            self._ids.extend(unique_ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(m) for m in metadatas)
+            self._count = end
+            self._area_rows.clear()
+            self._bm25 = None
+        return list(ids)
+
+    async def aadd_embeddings(self, texts, embeddings, metadatas=None, ids=None, **kwargs) -> List[str]:
+        return await asyncio.to_thread(self.add_embeddings, texts, embeddings, metadatas, ids)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    async def aadd_texts(self, texts, metadatas=None, ids=None, **kwargs) -> List[str]:
+        texts = list(texts)
+        vectors = await self.embedding.aembed_documents(texts)
+        return await self.aadd_embeddings(texts, vectors, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            for doc_id in ids:
+                row = self._row_by_id.pop(doc_id, None)
+                if row is not None:
+                    self._deleted[row] = True
+            self._area_rows.clear()
+            self._bm25 = None
+        return True
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        return self.delete(ids)
+
+    def get_by_ids(self, ids) -> List[Document]:
+        rows = [self._row_by_id[i] for i in ids if i in self._row_by_id]
+        return [self._document(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Índice IVF
+    # ------------------------------------------------------------------
+
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self._deleted[:self._count])
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, sample_size: int = 50_000, seed: int = 0):
+        """Entrena centroides con k-means esférico y agrupa las filas por lista."""
+        with self._lock:
+            rows = self._live_rows()
+            if len(rows) == 0:
+                self._ivf = None
+                return
+            n_lists = min(len(rows), n_lists or max(1, int(np.sqrt(len(rows)))))
+            rng = np.random.default_rng(seed)
+            sample = rows if len(rows) <= sample_size else rng.choice(rows, sample_size, replace=False)
+            train = _normalize(self._dequantize(np.sort(sample)))
+            centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+
+            for _ in range(iterations):
+                assign = np.argmax(train @ centroids.T, axis=1)
+                for c in range(n_lists):
+                    members = train[assign == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+
+            assign = np.empty(len(rows), dtype=np.int32)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                block = self._dequantize(rows[start:start + _BLOCK_ROWS])
+                assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+            self._ivf = _IVFIndex(centroids.astype(np.float32), offsets, rows[order], self._count)
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def _rows_for_area(self, areas: List[str]) -> np.ndarray:
+        parts = []
+        for area in areas:
+            if area not in self._area_rows:
+                self._area_rows[area] = np.fromiter(
+                    (row for row in self._row_by_id.values() if self._metadatas[row].get("area") == area),
+                    dtype=np.int64,
+                )
+            parts.append(self._area_rows[area])
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _split_filter(filter: Optional[Dict[str, Any]]) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+        """Separa el filtro por área (indexado) del resto (post-filtro)."""
+        if not filter:
+            return None, {}
+        rest = dict(filter)
+        area = rest.pop("area", None)
+        if area is None:
+            return None, rest
+        if isinstance(area, dict):
+            if "$in" in area:
+                return list(area["$in"]), rest
+            if "$eq" in area:
+                return [area["$eq"]], rest
+            raise ValueError(f"Operador de filtro no soportado: {area}")
+        return [area], rest
+
+    def _candidates(self, query: np.ndarray, k: int, areas: Optional[List[str]]) -> Optional[np.ndarray]:
+        """Filas a evaluar (None = todas)."""
+        area_rows = self._rows_for_area(areas) if areas is not None else None
+        if self.search_mode != "ivf" or self._ivf is None:
+            return area_rows
+
+        ivf = self._ivf
+        probe = np.argsort(-(ivf.centroids @ query))[:self.nprobe]
+        parts = [ivf.rows[ivf.offsets[c]:ivf.offsets[c + 1]] for c in probe]
+        # Filas agregadas después de construir el índice se evalúan siempre
+        parts.append(np.arange(ivf.indexed_count, self._count))
+        candidates = np.concatenate(parts)
+        if area_rows is not None:
+            candidates = np.intersect1d(candidates, area_rows, assume_unique=False)
+            if len(candidates) < k:
+                # Áreas pequeñas: la búsqueda exacta sobre el subconjunto es barata
+                return area_rows
+        return candidates
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        n = self._count if rows is None else len(rows)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            end = min(n, start + _BLOCK_ROWS)
+            index = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(self._vectors[index], dtype=np.float32)
+            scores[start:end] = block @ query
+            if self._scales is not None:
+                scores[start:end] *= self._scales[index]
+        deleted = self._deleted[:self._count] if rows is None else self._deleted[rows]
+        scores[deleted] = -np.inf
+        return scores
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=self._metadatas[row])
+
+    def _matches(self, row: int, rest: Dict[str, Any]) -> bool:
+        metadata = self._metadatas[row]
+        for key, value in rest.items():
+            if isinstance(value, dict) and "$in" in value:
+                if metadata.get(key) not in value["$in"]:
+                    return False
+            elif metadata.get(key) != value:
+                return False
+        return True
+
+    def search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Top-k por similitud coseno con filtrado previo por área."""
+        with self._lock:
+            if self._count == 0 or k <= 0:
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            areas, rest = self._split_filter(filter)
+
+            rows = self._candidates(query, k, areas)
+            if rows is not None and len(rows) == 0:
+                return []
+            scores = self._scores(query, rows)
+
+            if rest:
+                order = np.argsort(-scores)
+            else:
+                top = min(k, len(scores))
+                order = np.argpartition(-scores, top - 1)[:top]
+                order = order[np.argsort(-scores[order])]
+
+            results = []
+            for position in order:
+                if not np.isfinite(scores[position]):
+                    break
+                row = int(position if rows is None else rows[position])
+                if rest and not self._matches(row, rest):
+                    continue
+                results.append((self._document(row), float(scores[position])))
+                if len(results) == k:
+                    break
+            return results
+
+    async def asearch_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        return await asyncio.to_thread(self.search_by_vector_with_score, embedding, k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Tuple[Document, float]]:
+        return self.search_by_vector_with_score(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, filter=None, **kwargs):
+        vector = await self.embedding.aembed_query(query)
+        return await asyncio.to_thread(self.search_by_vector_with_score, vector, k, filter)
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter)]
+
+    # ------------------------------------------------------------------
+    # Búsqueda léxica
+    # ------------------------------------------------------------------
+
+    def _lexical_index(self) -> BM25Index:
+        if self._bm25 is None:
+            rows = self._live_rows()
+            self._bm25 = BM25Index(rows, (self._texts[row] for row in rows))
+        return self._bm25
+
+    def lexical_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        citations: Optional[Citations] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k por BM25, sin llamar al proveedor de embeddings.
+
+        Con `citations` solo se consideran los chunks que las satisfacen.
+        """
+        with self._lock:
+            index = self._lexical_index()
+            areas, rest = self._split_filter(filter)
+            allowed = None
+            if areas is not None or rest or citations:
+                allowed = np.ones(len(index), dtype=bool)
+                if areas is not None:
+                    allowed &= np.isin(index.rows, self._rows_for_area(areas))
+                for position in np.flatnonzero(allowed) if (rest or citations) else ():
+                    row = int(index.rows[position])
+                    if (rest and not self._matches(row, rest)) or (
+                        citations and not matches_citations(citations, self._texts[row], self._metadatas[row])
+                    ):
+                        allowed[position] = False
+            hits = index.search(query, k, allowed)
+            if not hits and citations and allowed is not None:
+                # Cita exacta sin términos en común: devolver los chunks citados
+                hits = [(int(index.rows[p]), 0.0) for p in np.flatnonzero(allowed)[:k]]
+            return [(self._document(row), score) for row, score in hits]
+
+    async def alexical_search(self, query: str, k: int = 4, filter=None, citations=None):
+        return await asyncio.to_thread(self.lexical_search, query, k, filter, citations)
+
+    def _select_relevance_score_fn(self):
+        # Los scores ya son similitud coseno
+        return lambda score: score
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def persist(self, path: Optional[str] = None):
+        """
+        Compacta (descarta filas borradas) y escribe el índice de forma atómica.
+
+        En modo "ivf" reconstruye las listas invertidas. Un índice que nunca
+        recibió vectores se guarda sin `vectors.npy`: la dimensión sigue sin
+        fijar hasta el primer `add_texts`.
+        """
+        target = Path(path) if path else self.path
+        if target is None:
+            raise ValueError("LocalVectorStore.persist requiere un path")
+
+        with self._lock:
+            rows = self._live_rows()
+            tmp = target.with_name(f"{target.name}.tmp-{uuid.uuid4().hex[:8]}")
+            tmp.mkdir(parents=True)
+
+            dim = self._vectors.shape[1] if self._vectors is not None else 0
+            if self._vectors is not None:
+                vectors = np.ascontiguousarray(self._vectors[rows])
+                np.save(tmp / "vectors.npy", vectors)
+            if self._scales is not None:
+                np.save(tmp / "scales.npy", self._scales[rows])
+            with open(tmp / "docs.jsonl", "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(
+                        {"id": self._ids[row], "text": self._texts[row], "metadata": self._metadatas[row]},
+                        ensure_ascii=False,
+                    ) + "\n")
+
+            # El estado en memoria queda compactado
+            if self._vectors is not None:
+                self._vectors = vectors
+            self._scales = self._scales[rows] if self._scales is not None else None
+            self._deleted = np.zeros(len(rows), dtype=bool)
+            self._ids = [self._ids[row] for row in rows]
+            self._texts = [self._texts[row] for row in rows]
+            self._metadatas = [self._metadatas[row] for row in rows]
+            self._row_by_id = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._count = len(rows)
+            self._area_rows.clear()
+            self._bm25 = None
+
+            if self.search_mode == "ivf":
+                self.build_ivf()
+                if self._ivf is not None:
+                    np.savez(
+                        tmp / "ivf.npz",
+                        centroids=self._ivf.centroids,
+                        offsets=self._ivf.offsets,
+                        rows=self._ivf.rows,
+                    )
+
+            with open(tmp / "index.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": INDEX_VERSION,
+                    "dtype": self.dtype,
+                    "dim": dim,
+                    "count": self._count,
+                }, f)
+
+            if target.exists():
+                old = target.with_name(f"{target.name}.old-{uuid.uuid4().hex[:8]}")
+                target.rename(old)
+                tmp.rename(target)
+                shutil.rmtree(old)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp.rename(target)
+            self.path = target
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding: Embeddings,
+        search_mode: str = "brute",
+        nprobe: int = 8,
+        mmap: bool = True,
+    ) -> "LocalVectorStore":
+        """
+        Abre un índice persistido.
+
+        Con `mmap=True` la matriz no se carga en RAM: las páginas se leen bajo
+        demanda y se comparten entre procesos (réplicas de solo lectura).
+        """
+        path = Path(path)
+        with open(path / "index.json", "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versión de índice no soportada: {info.get('version')}")
+
+        store = cls(embedding, str(path), dtype=info["dtype"], search_mode=search_mode, nprobe=nprobe)
+        mmap_mode = "r" if mmap else None
+        if info.get("dim"):
+            store._vectors = np.load(path / "vectors.npy", mmap_mode=mmap_mode)
+        if (path / "scales.npy").exists():
+            store._scales = np.load(path / "scales.npy")
+        store._count = info["count"]
+        store._deleted = np.zeros(store._count, dtype=bool)
+
+        with open(path / "docs.jsonl", "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                store._ids.append(record["id"])
+                store._texts.append(record["text"])
+                store._metadatas.append(record["metadata"])
+                store._row_by_id[record["id"]] = row
+
+        if search_mode == "ivf" and (path / "ivf.npz").exists():
+            data = np.load(path / "ivf.npz")
+            store._ivf = _IVFIndex(data["centroids"], data["offsets"], data["rows"], store._count)
+        return store
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
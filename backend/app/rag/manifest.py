@@ -0,0 +1,153 @@
+"""
+Manifiesto de indexación incremental.
+
+Guarda, por colección, el hash de contenido de cada archivo indexado y los IDs
+de sus chunks. Los IDs de chunk se derivan del contenido, de modo que un
+re-indexado solo embebe los chunks nuevos y elimina los que desaparecieron.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path: Path) -> str:
+    """Hash SHA-256 del contenido binario de un archivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(source: str, texts: Iterable[str]) -> List[str]:
+    """
+    Calcula IDs estables para los chunks de un archivo.
+
+    El ID depende solo de la fuente y del texto del chunk; si un mismo texto se
+    repite dentro del archivo se desambigua con un sufijo ordinal.
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for text in texts:
+        digest = hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+        count = seen.get(digest, 0)
+        seen[digest] = count + 1
+        ids.append(digest if count == 0 else f"{digest}:{count}")
+    return ids
+
+
+@dataclass
+class FileEntry:
+    """Estado indexado de un archivo."""
+    hash: str
+    chunks: List[str] = field(default_factory=list)
+
+
+@dataclass
+class FileChanges:
+    """Diferencia entre los chunks indexados y los actuales de un archivo."""
+    added: List[str]
+    removed: List[str]
+
+
+class IndexManifest:
+    """Manifiesto de archivos y chunks indexados en una colección."""
+
+    def __init__(self, path: Path, collection: str, chunker: str = ""):
+        self.path = path
+        self.collection = collection
+        self.chunker = chunker
+        self.files: Dict[str, FileEntry] = {}
+        self.rebuild_required = False
+
+    @classmethod
+    def load(cls, path: Path, collection: str, chunker: str = "") -> "IndexManifest":
+        """
+        Carga el manifiesto desde disco.
+
+        Si no existe o pertenece a otra colección se devuelve vacío. Si fue
+        generado con otra configuración de chunking se conserva su contenido
+        (para poder borrar los chunks anteriores) y se marca
+        `rebuild_required`.
+        """
+        manifest = cls(path, collection, chunker)
+        if not path.exists():
+            return manifest
+
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != MANIFEST_VERSION or data.get("collection") != collection:
+            return manifest
+        manifest.rebuild_required = data.get("chunker", "") != chunker
+
+        manifest.files = {
+            name: FileEntry(hash=entry["hash"], chunks=list(entry.get("chunks", [])))
+            for name, entry in data.get("files", {}).items()
+        }
+        return manifest
+
+    def save(self):
+        """Escribe el manifiesto de forma atómica."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "collection": self.collection,
+            "chunker": self.chunker,
+            "files": {
+                name: {"hash": entry.hash, "chunks": entry.chunks}
+                for name, entry in sorted(self.files.items())
+            },
+        }
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> "IndexManifest":
+        """Manifiesto vacío con la misma ruta, colección y chunker."""
+        return IndexManifest(self.path, self.collection, self.chunker)
+
+    def is_unchanged(self, name: str, content_hash: str) -> bool:
+        """Indica si el archivo ya está indexado con el mismo contenido."""
+        entry = self.files.get(name)
+        return entry is not None and entry.hash == content_hash
+
+    def diff(self, name: str, ids: List[str]) -> FileChanges:
+        """Compara los chunks actuales de un archivo con los indexados."""
+        previous = self.files.get(name)
+        old_ids = set(previous.chunks) if previous else set()
+        new_ids = set(ids)
+        return FileChanges(
+            added=[i for i in ids if i not in old_ids],
+            removed=[i for i in (previous.chunks if previous else []) if i not in new_ids],
+        )
+
+    def update(self, name: str, content_hash: str, ids: List[str]):
+        """Registra el estado indexado de un archivo."""
+        self.files[name] = FileEntry(hash=content_hash, chunks=list(ids))
+
+    def missing(self, present: Iterable[str]) -> List[str]:
+        """Archivos del manifiesto que ya no existen en el corpus."""
+        present_set = set(present)
+        return [name for name in self.files if name not in present_set]
+
+    def remove(self, name: str) -> List[str]:
+        """Elimina un archivo del manifiesto y devuelve sus chunks."""
+        entry = self.files.pop(name, None)
+        return entry.chunks if entry else []
+
+    def chunk_count(self) -> int:
+        """Total de chunks registrados."""
+        return sum(len(entry.chunks) for entry in self.files.values())
+
+
+def default_manifest_path(manifest_dir: str, collection: str) -> Path:
+    """Ruta por defecto del manifiesto de una colección."""
+    return Path(manifest_dir) / f"{collection}.manifest.json"
@@ -0,0 +1,488 @@
+"""
+Vector store sobre la tabla `legal_embeddings` (scripts/setup_db.py).
+
+A diferencia de la colección genérica de LangChain, la tabla tiene una
+columna `area` y un índice HNSW parcial por área. Los filtros por área se
+escriben como literales (validados contra `LEGAL_AREAS`) para que el
+planificador elija el índice parcial también con planes genéricos de
+sentencias preparadas; así la búsqueda filtrada recorre solo el grafo del
+área en lugar de post-filtrar el HNSW global.
+
+La búsqueda léxica usa la columna generada `content_tsv` (configuración
+`spanish_unaccent`: stemming en español sin tildes) con su índice GIN.
+
+Las cargas grandes (`abulk_load`, y `aadd_embeddings` desde `copy_threshold`
+filas) van por `COPY ... FROM STDIN` en formato binario a una tabla temporal
+y se fusionan con un solo INSERT ... ON CONFLICT dentro de la transacción.
+"""
+import asyncio
+import json
+import re
+import struct
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.rag.areas import LEGAL_AREAS
+from app.rag.lexical import Citations
+
+
+TABLE_NAME = "legal_embeddings"
+TS_CONFIG = "spanish_unaccent"
+
+_KEY_RE = re.compile(r"^\w+$")
+
+
+HNSW_DEFAULT_M = 16
+HNSW_DEFAULT_EF_CONSTRUCTION = 64
+
+
+def hnsw_indexes(
+    table: str = TABLE_NAME,
+    m: int = HNSW_DEFAULT_M,
+    ef_construction: int = HNSW_DEFAULT_EF_CONSTRUCTION,
+) -> List[Tuple[str, str]]:
+    """
+    (nombre, CREATE INDEX) del índice HNSW global y de los parciales por área.
+
+    Los nombres coinciden con los de scripts/setup_db.py, así que
+    scripts/tune_hnsw.py puede borrarlos y reconstruirlos con otros parámetros.
+    """
+    options = f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    indexes = [(
+        f"{table}_embedding_idx",
+        f"CREATE INDEX IF NOT EXISTS {table}_embedding_idx ON {table} "
+        f"USING hnsw (embedding vector_cosine_ops) {options}",
+    )]
+    for area in LEGAL_AREAS:
+        indexes.append((
+            f"{table}_embedding_{area}_idx",
+            f"CREATE INDEX IF NOT EXISTS {table}_embedding_{area}_idx ON {table} "
+            f"USING hnsw (embedding vector_cosine_ops) {options} WHERE area = '{area}'",
+        ))
+    return indexes
+
+
+def vector_literal(vector: List[float]) -> str:
+    """Representación textual de pgvector ("[0.1,0.2,...]")."""
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    """Formato binario de pgvector: dimensión (int16), reservado (int16) y float4 big-endian."""
+    return struct.pack(f">HH{len(vector)}f", len(vector), 0, *vector)
+
+
+def decode_vector(data: bytes) -> List[float]:
+    dim = struct.unpack_from(">H", data)[0]
+    return list(struct.unpack_from(f">{dim}f", data, 4))
+
+
+@asynccontextmanager
+async def binary_vector_codec(conn) -> AsyncIterator[None]:
+    """
+    Codec binario de `vector` durante el bloque.
+
+    Se quita al salir: las consultas de búsqueda pasan el vector como texto
+    (`vector_literal`) y la conexión puede volver a un pool compartido.
+    """
+    schema = await conn.fetchval(
+        "SELECT n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace WHERE t.typname = 'vector'"
+    )
+    if schema is None:
+        raise RuntimeError("La extensión pgvector no está instalada")
+    await conn.set_type_codec("vector", schema=schema, encoder=encode_vector, decoder=decode_vector, format="binary")
+    try:
+        yield
+    finally:
+        await conn.reset_type_codec("vector", schema=schema)
+
+
+def split_area_filter(filter: Optional[Dict[str, Any]]) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+    """Separa el filtro por área (índices parciales) del resto."""
+    if not filter:
+        return None, {}
+    rest = dict(filter)
+    area = rest.pop("area", None)
+    if area is None:
+        return None, rest
+    if isinstance(area, dict):
+        if "$in" in area:
+            areas = list(area["$in"])
+        elif "$eq" in area:
+            areas = [area["$eq"]]
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {area}")
+    else:
+        areas = [area]
+    unknown = [a for a in areas if a not in LEGAL_AREAS]
+    if unknown:
+        raise ValueError(f"Área desconocida en el filtro: {unknown}")
+    return areas, rest
+
+
+def _scored_document(row) -> Tuple[Document, float]:
+    metadata = json.loads(row["metadata"] or "{}")
+    return Document(id=row["document_id"], page_content=row["content"], metadata=metadata), float(row["score"])
+
+
+BulkRow = Tuple[str, str, List[float], Dict[str, Any]]   # (document_id, texto, vector, metadata)
+
+
+class PostgresVectorStore(VectorStore):
+    """
+    Vector store sobre `legal_embeddings` con asyncpg.
+
+    Los métodos síncronos abren una conexión por llamada (scripts); la API y
+    los procesos de larga duración deben usar los métodos async.
+
+    Los scores devueltos son similitud coseno (mayor es mejor).
+
+    Args:
+        embedding: Función de embeddings para textos y consultas.
+        dsn: URL de PostgreSQL (por defecto `settings.postgres_url`).
+        pool: Pool de asyncpg ya creado; tiene prioridad sobre `dsn`.
+        table: Tabla con el esquema de setup_db.py.
+        copy_threshold: Lotes con al menos estas filas se escriben con COPY.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        dsn: Optional[str] = None,
+        pool=None,
+        table: str = TABLE_NAME,
+        copy_threshold: int = 100,
+    ):
+        if not _KEY_RE.match(table):
+            raise ValueError(f"Nombre de tabla inválido: {table}")
+        if dsn is None and pool is None:
+            from app.config import settings
+            dsn = settings.postgres_url
+        self.embedding = embedding
+        self.dsn = dsn
+        self.pool = pool
+        self.table = table
+        self.copy_threshold = copy_threshold
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[Any]:
+        if self.pool is not None:
+            async with self.pool.acquire() as conn:
+                yield conn
+            return
+
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    def _run(self, coro):
+        """Ejecuta una corrutina desde código síncrono (sin event loop activo)."""
+        if self.pool is not None:
+            coro.close()
+            raise RuntimeError("PostgresVectorStore con pool compartido: usar los métodos async")
+        return asyncio.run(coro)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    async def aadd_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Inserta o reemplaza (por `document_id`) chunks ya embebidos."""
+        if ids is None:
+            raise ValueError("PostgresVectorStore requiere ids estables por chunk")
+        metadatas = metadatas or [{} for _ in texts]
+        if len(ids) >= self.copy_threshold:
+            await self.abulk_load(zip(ids, texts, embeddings, metadatas))
+            return list(ids)
+        records = [
+            (doc_id, text, vector_literal(vector), json.dumps(metadata, ensure_ascii=False), metadata.get("area"))
+            for doc_id, text, vector, metadata in zip(ids, texts, embeddings, metadatas)
+        ]
+        async with self._connection() as conn:
+            await conn.executemany(
+                f"""
+                INSERT INTO {self.table} (document_id, content, embedding, metadata, area)
+                VALUES ($1, $2, $3::vector, $4::jsonb, $5)
+                ON CONFLICT (document_id) DO UPDATE SET
+                    content = EXCLUDED.content,
+                    embedding = EXCLUDED.embedding,
+                    metadata = EXCLUDED.metadata,
+                    area = EXCLUDED.area,
+                    created_at = NOW()
+                """,
+                records,
+            )
+        return list(ids)
+
+    async def abulk_load(
+        self,
+        rows: Union[Iterable[BulkRow], AsyncIterable[BulkRow]],
+        replace: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Carga masiva con COPY binario a una tabla temporal y fusión en una transacción.
+
+        Las filas se transmiten a medida que se leen de `rows` (no se
+        materializan en memoria). Un `document_id` repetido conserva la última
+        aparición; las filas idénticas a las existentes no se reescriben (ni
+        actualizan sus índices HNSW). Con `replace` se eliminan además las
+        filas de la tabla que no vienen en la carga (recarga completa).
+
+        Returns:
+            staged, inserted, updated, unchanged y deleted.
+        """
+        staging = f"{self.table}_staging"
+
+        def record(row: BulkRow) -> Tuple:
+            doc_id, text, vector, metadata = row
+            metadata = metadata or {}
+            return doc_id, text, vector, json.dumps(metadata, ensure_ascii=False), metadata.get("area")
+
+        if isinstance(rows, AsyncIterable):
+            async def records():
+                async for row in rows:
+                    yield record(row)
+            source = records()
+        else:
+            source = (record(row) for row in rows)
+
+        async with self._connection() as conn, binary_vector_codec(conn), conn.transaction():
+            await conn.execute(f"""
+                CREATE TEMP TABLE {staging} (
+                    document_id TEXT,
+                    content TEXT,
+                    embedding vector,
+                    metadata JSONB,
+                    area TEXT,
+                    ord BIGINT GENERATED ALWAYS AS IDENTITY
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                staging, records=source, columns=["document_id", "content", "embedding", "metadata", "area"]
+            )
+            staged = await conn.fetchval(f"SELECT count(*) FROM {staging}")
+
+            deleted = 0
+            if replace:
+                await conn.execute(f"CREATE INDEX ON {staging} (document_id)")
+                await conn.execute(f"ANALYZE {staging}")
+                result = await conn.execute(f"""
+                    DELETE FROM {self.table} AS target
+                    WHERE NOT EXISTS (SELECT 1 FROM {staging} AS s WHERE s.document_id = target.document_id)
+                """)
+                deleted = int(result.split()[-1])
+
+            merged = await conn.fetchrow(f"""
+                WITH merged AS (
+                    INSERT INTO {self.table} (document_id, content, embedding, metadata, area)
+                    SELECT DISTINCT ON (document_id) document_id, content, embedding, metadata, area
+                    FROM {staging}
+                    ORDER BY document_id, ord DESC
+                    ON CONFLICT (document_id) DO UPDATE SET
+                        content = EXCLUDED.content,
+                        embedding = EXCLUDED.embedding,
+                        metadata = EXCLUDED.metadata,
+                        area = EXCLUDED.area,
+                        created_at = NOW()
+                    WHERE ({self.table}.content, {self.table}.embedding, {self.table}.metadata, {self.table}.area)
+                        IS DISTINCT FROM (EXCLUDED.content, EXCLUDED.embedding, EXCLUDED.metadata, EXCLUDED.area)
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted) AS inserted,
+                       count(*) FILTER (WHERE NOT inserted) AS updated,
+                       (SELECT count(DISTINCT document_id) FROM {staging}) AS distinct_ids
+                FROM merged
+            """)
+        return {
+            "staged": staged,
+            "inserted": merged["inserted"],
+            "updated": merged["updated"],
+            "unchanged": merged["distinct_ids"] - merged["inserted"] - merged["updated"],
+            "deleted": deleted,
+        }
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None, **kwargs) -> List[str]:
+        return self._run(self.aadd_embeddings(texts, embeddings, metadatas=metadatas, ids=ids))
+
+    async def aadd_texts(self, texts, metadatas=None, ids=None, **kwargs) -> List[str]:
+        texts = list(texts)
+        vectors = await self.embedding.aembed_documents(texts)
+        return await self.aadd_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        async with self._connection() as conn:
+            await conn.execute(f"DELETE FROM {self.table} WHERE document_id = ANY($1::text[])", list(ids))
+        return True
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        return self._run(self.adelete(ids))
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def _metadata_conditions(self, rest: Dict[str, Any], params: List[Any]) -> List[str]:
+        """Condiciones sobre `metadata` para las claves distintas de `area` (desde $3)."""
+        conditions = []
+        equals = {}
+        for key, value in rest.items():
+            if not _KEY_RE.match(key):
+                raise ValueError(f"Clave de filtro inválida: {key}")
+            if isinstance(value, dict):
+                if "$in" not in value:
+                    raise ValueError(f"Operador de filtro no soportado: {value}")
+                params.append([str(v) for v in value["$in"]])
+                conditions.append(f"metadata->>'{key}' = ANY(${len(params) + 2}::text[])")
+            else:
+                equals[key] = value
+        if equals:
+            params.append(json.dumps(equals, ensure_ascii=False))
+            conditions.append(f"metadata @> ${len(params) + 2}::jsonb")
+        return conditions
+
+    def _search_query(self, areas: Optional[List[str]], rest: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """SQL de búsqueda; $1 es el vector y $2 el k."""
+        params: List[Any] = []
+        conditions = self._metadata_conditions(rest, params)
+
+        def select(area: Optional[str]) -> str:
+            where = ([f"area = '{area}'"] if area else []) + conditions
+            clause = f"WHERE {' AND '.join(where)}" if where else ""
+            return (
+                f"SELECT document_id, content, metadata, 1 - (embedding <=> $1::vector) AS score "
+                f"FROM {self.table} {clause} "
+                f"ORDER BY embedding <=> $1::vector LIMIT $2"
+            )
+
+        if not areas:
+            return select(None), params
+        if len(areas) == 1:
+            return select(areas[0]), params
+        # Un índice parcial por área: unir los top-k de cada una
+        union = " UNION ALL ".join(f"({select(area)})" for area in dict.fromkeys(areas))
+        return f"SELECT * FROM ({union}) AS hits ORDER BY score DESC LIMIT $2", params
+
+    async def asearch_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Top-k por similitud coseno, usando el índice parcial del área si hay filtro."""
+        if k <= 0:
+            return []
+        areas, rest = split_area_filter(filter)
+        sql, params = self._search_query(areas, rest)
+        async with self._connection() as conn:
+            rows = await conn.fetch(sql, vector_literal(embedding), k, *params)
+        return [_scored_document(row) for row in rows]
+
+    def search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter=None) -> List[Tuple[Document, float]]:
+        return self._run(self.asearch_by_vector_with_score(embedding, k, filter))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.search_by_vector_with_score(embedding, k, filter)]
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in await self.asearch_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Tuple[Document, float]]:
+        return self.search_by_vector_with_score(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, filter=None, **kwargs):
+        vector = await self.embedding.aembed_query(query)
+        return await self.asearch_by_vector_with_score(vector, k, filter)
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter)]
+
+    async def alexical_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        citations: Optional[Citations] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k por texto completo (ts_rank_cd), sin llamar al proveedor de embeddings.
+
+        Los términos de la consulta se combinan con OR, como en BM25. Con
+        `citations` solo se consideran los chunks que las satisfacen.
+        """
+        if k <= 0:
+            return []
+        areas, rest = split_area_filter(filter)
+        params: List[Any] = []
+        conditions = self._metadata_conditions(rest, params)
+        if areas:
+            conditions.append("area IN (" + ", ".join(f"'{area}'" for area in areas) + ")")
+        if citations:
+            if citations.articles:
+                params.append(citations.articles)
+                conditions.append(f"metadata->>'articulo' = ANY(${len(params) + 2}::text[])")
+            for norm in citations.norms:
+                params.append(norm)
+                n = len(params) + 2
+                conditions.append(
+                    f"(content_tsv @@ phraseto_tsquery('{TS_CONFIG}', ${n}) "
+                    f"OR replace(lower(metadata->>'source'), '_', ' ') LIKE '%' || ${n} || '%')"
+                )
+        else:
+            conditions.append("content_tsv @@ q")
+
+        sql = (
+            f"SELECT document_id, content, metadata, ts_rank_cd(content_tsv, q) AS score "
+            f"FROM {self.table}, "
+            f"replace(plainto_tsquery('{TS_CONFIG}', $1)::text, ' & ', ' | ')::tsquery AS q "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY score DESC LIMIT $2"
+        )
+        async with self._connection() as conn:
+            rows = await conn.fetch(sql, query, k, *params)
+        return [_scored_document(row) for row in rows]
+
+    def lexical_search(self, query: str, k: int = 4, filter=None, citations=None) -> List[Tuple[Document, float]]:
+        return self._run(self.alexical_search(query, k, filter, citations))
+
+    def _select_relevance_score_fn(self):
+        # Los scores ya son similitud coseno
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "PostgresVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
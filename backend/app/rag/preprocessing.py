@@ -0,0 +1,186 @@
+"""
+Preprocesamiento paralelo del corpus legal.
+
+Lectura, corrección de encoding, normalización y chunking corren por archivo
+en un pool de procesos. Los resultados se entregan en el mismo orden de
+entrada, de modo que los IDs de chunk (derivados del contenido) son estables
+entre ejecuciones sin importar cuántos workers haya.
+"""
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.rag.legal_chunker import LegalTextSplitter
+from app.rag.manifest import chunk_ids
+
+
+PREPROCESS_VERSION = "1"
+
+# Secuencias típicas de UTF-8 leído como Latin-1 ("Ã³" en lugar de "ó")
+_MOJIBAKE_RE = re.compile(r"[ÃÂ][\x80-\xBF¡-¿]")
+_BOILERPLATE_RES = [
+    re.compile(r"^\s*p[áa]gina\s+\d+(\s+de\s+\d+)?\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-?\s*\d{1,4}\s*-?\s*$"),
+    re.compile(r"^\s*[-_=*·.]{3,}\s*$"),
+]
+_SPACES_RE = re.compile(r"[ \t\u00a0\u2000-\u200b\u202f\u205f\u3000]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def decode_bytes(raw: bytes) -> str:
+    """Decodifica como UTF-8 con respaldo a CP1252/Latin-1 y repara mojibake."""
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        try:
+            text = raw.decode("cp1252")
+        except UnicodeDecodeError:
+            text = raw.decode("latin-1")
+
+    if _MOJIBAKE_RE.search(text):
+        try:
+            text = text.encode("cp1252").decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return text
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza unicode y espacios y elimina líneas de relleno."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    for line in text.split("\n"):
+        line = _SPACES_RE.sub(" ", line).strip()
+        if any(pattern.match(line) for pattern in _BOILERPLATE_RES):
+            continue
+        lines.append(line)
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+@dataclass
+class FileTask:
+    """Trabajo de preprocesamiento de un archivo."""
+    path: str
+    name: str
+    metadata: Dict[str, str]
+    known_hash: Optional[str] = None
+
+
+@dataclass
+class FileResult:
+    """Chunks (texto, metadata, id) de un archivo preprocesado."""
+    name: str
+    hash: str
+    size: int
+    skipped: bool = False
+    chunks: List[Tuple[str, Dict, str]] = field(default_factory=list)
+
+
+@lru_cache()
+def _splitter(chunk_size: int, chunk_overlap: int) -> LegalTextSplitter:
+    return LegalTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def preprocess_file(task: FileTask, chunk_size: int, chunk_overlap: int) -> FileResult:
+    """
+    Lee, normaliza y divide un archivo (se ejecuta en un proceso worker).
+
+    Si el hash coincide con `known_hash` no se normaliza ni se divide.
+    """
+    with open(task.path, "rb") as f:
+        raw = f.read()
+    content_hash = hashlib.sha256(raw).hexdigest()
+    if content_hash == task.known_hash:
+        return FileResult(task.name, content_hash, len(raw), skipped=True)
+
+    text = normalize_text(decode_bytes(raw))
+    documents = _splitter(chunk_size, chunk_overlap).split_documents(
+        [Document(page_content=text, metadata=task.metadata)]
+    )
+    ids = chunk_ids(task.name, (doc.page_content for doc in documents))
+    return FileResult(
+        task.name,
+        content_hash,
+        len(raw),
+        chunks=[(doc.page_content, doc.metadata, chunk_id) for doc, chunk_id in zip(documents, ids)],
+    )
+
+
+@dataclass
+class PreprocessStats:
+    """Throughput de la etapa de preprocesamiento."""
+    files: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    def add(self, result: FileResult):
+        self.files += 1
+        self.skipped += result.skipped
+        self.bytes += result.size
+        self.chunks += len(result.chunks)
+        self.elapsed = time.perf_counter() - self.started
+
+    def report(self) -> str:
+        elapsed = self.elapsed or 1e-9
+        return (
+            f"{self.files} files ({self.skipped} unchanged), {self.bytes / 1e6:.1f} MB, "
+            f"{self.chunks} chunks in {self.elapsed:.2f}s → "
+            f"{self.files / elapsed:.1f} files/s, {self.bytes / 1e6 / elapsed:.2f} MB/s, "
+            f"{self.chunks / elapsed:.1f} chunks/s"
+        )
+
+
+def _mp_context():
+    """
+    Contexto "forkserver" (o "spawn" donde no existe).
+
+    El pool se crea desde un hilo de `asyncio.to_thread` con el event loop,
+    SQLite y el listener de logging vivos: un fork copiaría ese estado (y la
+    cola de logs sin su hilo lector) a cada worker.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def iter_preprocessed(
+    tasks: Iterable[FileTask],
+    chunk_size: int,
+    chunk_overlap: int,
+    workers: Optional[int] = None,
+    stats: Optional[PreprocessStats] = None,
+) -> Iterator[FileResult]:
+    """
+    Preprocesa archivos en paralelo y entrega los resultados en orden.
+
+    Como máximo `workers * 4` archivos están en vuelo, así que los resultados
+    no se acumulan si el consumidor (embeddings) va más lento.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else PreprocessStats()
+    window = workers * 4
+    pending: Deque[Future] = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as executor:
+        for task in tasks:
+            pending.append(executor.submit(preprocess_file, task, chunk_size, chunk_overlap))
+            if len(pending) >= window:
+                result = pending.popleft().result()
+                stats.add(result)
+                yield result
+        while pending:
+            result = pending.popleft().result()
+            stats.add(result)
+            yield result
@@ -0,0 +1,71 @@
+"""
+Recuperación de contexto legal con filtro por área.
+
+Cuando el caso ya fue clasificado (`StructuredCase.tentative_area`), la
+búsqueda se restringe a los documentos de esa área: en el backend
+"postgres" eso usa el índice HNSW parcial del área y en el local el
+prefiltro por filas. Si el área no se reconoce se busca en todo el corpus.
+En el triaje lo usa el nodo `retrieve_area`, que corre cuando termina
+`structure_case`.
+
+Con `RETRIEVAL_MODE=hybrid` el retriever combina búsqueda léxica y vectorial
+(`HybridRetriever`).
+"""
+from typing import Any, Dict, Optional
+
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from app.config import settings
+from app.models.schemas import StructuredCase
+from app.rag.areas import normalize_area
+from app.rag.hybrid import HybridRetriever
+
+
+DEFAULT_K = 4
+
+
+def area_filter(area: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Filtro de metadata para un área (tentativa o del corpus)."""
+    area = normalize_area(area)
+    return {"area": area} if area else None
+
+
+def search_kwargs(k: int = DEFAULT_K, area: Optional[str] = None) -> Dict[str, Any]:
+    """`search_kwargs` de un retriever, con filtro si el área es conocida."""
+    kwargs: Dict[str, Any] = {"k": k}
+    filter = area_filter(area)
+    if filter:
+        kwargs["filter"] = filter
+    return kwargs
+
+
+def get_retriever(
+    vector_store: VectorStore,
+    k: int = DEFAULT_K,
+    area: Optional[str] = None,
+    mode: Optional[str] = None,
+) -> BaseRetriever:
+    """
+    Retriever del vector store, restringido al área si se indica.
+
+    Args:
+        mode: "hybrid" o "vector" (por defecto `settings.retrieval_mode`).
+    """
+    mode = mode or settings.retrieval_mode
+    if mode == "hybrid":
+        return HybridRetriever(
+            vectorstore=vector_store,
+            k=k,
+            fetch_k=max(k, settings.retrieval_fetch_k),
+            rrf_k=settings.retrieval_rrf_k,
+            filter=area_filter(area),
+        )
+    if mode == "vector":
+        return vector_store.as_retriever(search_kwargs=search_kwargs(k, area))
+    raise ValueError(f"Modo de recuperación desconocido: {mode}")
+
+
+def retriever_for_case(vector_store: VectorStore, case: StructuredCase, k: int = DEFAULT_K) -> BaseRetriever:
+    """Retriever para un caso estructurado, filtrado por su área tentativa."""
+    return get_retriever(vector_store, k, case.tentative_area)
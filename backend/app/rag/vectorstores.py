@@ -0,0 +1,89 @@
+"""
+Selección del backend de vector store.
+
+`VECTOR_STORE_BACKEND` decide dónde viven los embeddings:
+- "pgvector": colección de LangChain en PostgreSQL (docker-compose).
+- "postgres": tabla `legal_embeddings` de setup_db.py, con índices HNSW
+  parciales por área (`PostgresVectorStore`).
+- "local": índice NumPy en disco (`LocalVectorStore`), sin servicios.
+"""
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.config import settings
+
+
+COLLECTION_NAME = "legal_embeddings"
+BACKENDS = ("pgvector", "postgres", "local")
+
+
+def get_vector_store(
+    embeddings: Embeddings,
+    collection_name: str = COLLECTION_NAME,
+    async_mode: bool = False,
+    backend: Optional[str] = None,
+    pool=None,
+    engine=None,
+) -> VectorStore:
+    """
+    Crea el vector store configurado.
+
+    Args:
+        embeddings: Función de embeddings.
+        collection_name: Colección (PGVector), tabla (postgres) o subdirectorio (local).
+        async_mode: Usar el motor asíncrono de PGVector.
+        backend: Sobrescribe `settings.vector_store_backend`.
+        pool: Pool de asyncpg compartido (backend postgres).
+        engine: Motor SQLAlchemy compartido (backend pgvector); sin él,
+            PGVector crea el suyo desde `postgres_url`.
+    """
+    backend = backend or settings.vector_store_backend
+    if backend == "local":
+        from app.rag.local_store import LocalVectorStore
+
+        path = Path(settings.local_index_dir) / collection_name
+        if (path / "index.json").exists():
+            return LocalVectorStore.load(
+                str(path),
+                embeddings,
+                search_mode=settings.local_index_search,
+                nprobe=settings.local_index_nprobe,
+            )
+        return LocalVectorStore(
+            embeddings,
+            str(path),
+            dtype=settings.local_index_dtype,
+            search_mode=settings.local_index_search,
+            nprobe=settings.local_index_nprobe,
+        )
+
+    if backend == "postgres":
+        from app.rag.pg_store import PostgresVectorStore
+
+        return PostgresVectorStore(
+            embeddings, pool=pool, table=collection_name, copy_threshold=settings.postgres_copy_threshold
+        )
+
+    if backend == "pgvector":
+        from langchain_postgres import PGVector
+
+        driver = "postgresql+psycopg"
+        return PGVector(
+            embeddings=embeddings,
+            collection_name=collection_name,
+            connection=engine if engine is not None else settings.postgres_url.replace("postgresql", driver, 1),
+            use_jsonb=True,
+            async_mode=async_mode,
+        )
+
+    raise ValueError(f"Backend de vector store desconocido: {backend} (opciones: {BACKENDS})")
+
+
+def persist_vector_store(vectorstore: VectorStore):
+    """Guarda en disco los backends locales; no-op para PGVector."""
+    persist = getattr(vectorstore, "persist", None)
+    if callable(persist):
+        persist()
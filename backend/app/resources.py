@@ -0,0 +1,186 @@
+"""
+Recursos de larga duración de la aplicación.
+
+El lifespan de FastAPI los crea una vez y los cierra al apagar; las rutas los
+reciben por dependencias (`app/api/deps.py`). Así ninguna petición paga el
+handshake TCP/TLS ni la autenticación contra PostgreSQL, Redis o el
+proveedor de modelos.
+
+Los scripts pueden usar `AppResources` como context manager asíncrono.
+"""
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.vectorstores import VectorStore
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP compartido para el proveedor de modelos.
+
+    Keep-alive con límites de conexiones configurables y HTTP/2 cuando el
+    paquete `h2` está instalado (una conexión multiplexa muchas peticiones).
+    """
+    http2 = settings.http2_enabled and importlib.util.find_spec("h2") is not None
+    if settings.http2_enabled and not http2:
+        logger.info("Paquete h2 no instalado: cliente HTTP con HTTP/1.1 keep-alive")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.http_timeout_seconds, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
+    )
+
+
+def pool_server_settings() -> Optional[dict]:
+    """Parámetros de sesión de cada conexión del pool (`hnsw.ef_search` elegido con tune_hnsw.py)."""
+    if settings.hnsw_ef_search > 0:
+        return {"hnsw.ef_search": str(settings.hnsw_ef_search)}
+    return None
+
+
+async def create_db_pool(required: bool = False):
+    """
+    Pool de asyncpg dimensionado desde la configuración.
+
+    Si PostgreSQL no responde devuelve None, salvo que `required` (el backend
+    de vectores lo necesita), en cuyo caso propaga el error.
+    """
+    import asyncpg
+
+    try:
+        return await asyncpg.create_pool(
+            settings.postgres_url,
+            min_size=settings.postgres_pool_min_size,
+            max_size=settings.postgres_pool_max_size,
+            command_timeout=settings.postgres_command_timeout,
+            max_inactive_connection_lifetime=settings.postgres_pool_max_idle_seconds,
+            timeout=10.0,
+            server_settings=pool_server_settings(),
+        )
+    except Exception as exc:
+        if required:
+            raise
+        logger.warning(f"PostgreSQL no disponible, se continúa sin pool: {exc}")
+        return None
+
+
+def create_pgvector_engine():
+    """
+    Motor SQLAlchemy asíncrono (psycopg) para el backend "pgvector".
+
+    PGVector abriría su propio motor desde `postgres_url`; con este, sus
+    conexiones salen de un pool dimensionado como el de asyncpg, que el
+    lifespan cierra al apagar. La conexión es perezosa: crear el motor no
+    falla si PostgreSQL no responde.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    options = " ".join(f"-c {name}={value}" for name, value in (pool_server_settings() or {}).items())
+    return create_async_engine(
+        settings.postgres_url.replace("postgresql", "postgresql+psycopg", 1),
+        pool_size=settings.postgres_pool_max_size,
+        max_overflow=0,
+        pool_timeout=10.0,
+        pool_recycle=settings.postgres_pool_max_idle_seconds,
+        pool_pre_ping=True,
+        connect_args={"options": options} if options else {},
+    )
+
+
+async def create_redis_client():
+    """Cliente `redis.asyncio` con pool de conexiones, o None si no responde."""
+    try:
+        import redis.asyncio as redis
+
+        client = redis.from_url(settings.redis_url, max_connections=settings.redis_max_connections)
+        await asyncio.wait_for(client.ping(), timeout=1.0)
+        return client
+    except Exception as exc:
+        logger.warning(f"Redis no disponible: {exc}")
+        return None
+
+
+@dataclass
+class AppResources:
+    """Conexiones y clientes compartidos por todas las peticiones."""
+    http_client: httpx.AsyncClient
+    embeddings: Embeddings
+    llm: BaseChatModel
+    vector_store: VectorStore
+    evaluator_llm: Optional[BaseChatModel] = None
+    db_pool: Optional[Any] = None
+    redis: Optional[Any] = None
+    sql_engine: Optional[Any] = None
+
+    @classmethod
+    async def create(cls) -> "AppResources":
+        from app.rag.embedding_cache import build_embeddings
+        from app.rag.vectorstores import get_vector_store
+        from app.services.llm import build_chat_model
+
+        http_client = build_http_client()
+        db_pool, redis = await asyncio.gather(
+            create_db_pool(required=settings.vector_store_backend == "postgres"),
+            create_redis_client(),
+        )
+        embeddings = build_embeddings(http_async_client=http_client)
+        sql_engine = create_pgvector_engine() if settings.vector_store_backend == "pgvector" else None
+        vector_store = get_vector_store(embeddings, async_mode=True, pool=db_pool, engine=sql_engine)
+        if settings.retrieval_mode == "hybrid" and not hasattr(vector_store, "lexical_search"):
+            logger.warning(
+                f"RETRIEVAL_MODE=hybrid sin búsqueda léxica en el backend '{settings.vector_store_backend}': "
+                "la recuperación será solo vectorial (usar VECTOR_STORE_BACKEND=postgres o local)"
+            )
+        return cls(
+            http_client=http_client,
+            embeddings=embeddings,
+            llm=build_chat_model(http_async_client=http_client),
+            evaluator_llm=build_chat_model(
+                temperature=settings.evaluation_temperature, streaming=False, http_async_client=http_client
+            ),
+            vector_store=vector_store,
+            db_pool=db_pool,
+            redis=redis,
+            sql_engine=sql_engine,
+        )
+
+    async def close(self):
+        """Cierra todo lo abierto; un fallo no impide cerrar el resto."""
+        closers = [self.http_client.aclose()]
+        if self.db_pool is not None:
+            closers.append(self.db_pool.close())
+        if self.redis is not None:
+            closers.append(self.redis.aclose())
+        if self.sql_engine is not None:
+            closers.append(self.sql_engine.dispose())
+        for result in await asyncio.gather(*closers, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"Error cerrando recursos: {result}")
+
+        from app.rag.embedding_cache import close_embedding_store
+
+        try:
+            await asyncio.to_thread(close_embedding_store)
+        except Exception as exc:
+            logger.warning(f"Error cerrando la caché de embeddings: {exc}")
+
+    async def __aenter__(self) -> "AppResources":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,152 @@
+"""
+Ejecutor ligero de grafos de nodos asíncronos (DAG).
+
+Cada nodo es una función `async (state) -> dict` con actualizaciones del
+estado, como en LangGraph. Un nodo arranca en cuanto terminan todas sus
+dependencias, así que los nodos independientes corren en paralelo.
+
+Para evitar carreras, cada nodo recibe una copia del estado al arrancar y
+solo el ejecutor fusiona lo que devuelve, en el orden en que terminan. Las
+claves con reductor (`REDUCERS`) se combinan; el resto se sobrescribe, por
+lo que nodos concurrentes deben escribir claves distintas.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+NodeFn = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _merge_dicts(current: Optional[Dict], update: Dict) -> Dict:
+    return {**(current or {}), **update}
+
+
+def _extend(current: Optional[List], update: List) -> List:
+    return [*(current or []), *update]
+
+
+REDUCERS: Dict[str, Callable[[Any, Any], Any]] = {
+    "node_durations": _merge_dicts,
+    "errors": _extend,
+}
+
+
+class GraphError(Exception):
+    """Error de definición o ejecución del grafo."""
+
+
+class NodeTimeoutError(GraphError):
+    """Un nodo superó su timeout."""
+
+    def __init__(self, node: str, timeout: float):
+        super().__init__(f"{node}: timeout after {timeout}s")
+        self.node = node
+        self.timeout = timeout
+
+
+@dataclass
+class Node:
+    """
+    Nodo del grafo.
+
+    Args:
+        name: Nombre único.
+        func: `async (state) -> dict` con las claves que actualiza.
+        depends_on: Nodos que deben terminar antes.
+        timeout: Segundos máximos de ejecución (None: sin límite).
+        optional: Si falla o vence, el grafo sigue sin sus actualizaciones.
+    """
+    name: str
+    func: NodeFn
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    optional: bool = False
+
+
+def merge_state(state: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica `update` sobre `state` usando los reductores de cada clave."""
+    for key, value in update.items():
+        reducer = REDUCERS.get(key)
+        state[key] = reducer(state.get(key), value) if reducer else value
+    return state
+
+
+class Graph:
+    """DAG de nodos con ejecución concurrente por dependencias."""
+
+    def __init__(self, nodes: Iterable[Node]):
+        self.nodes: Dict[str, Node] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise GraphError(f"Nodo duplicado: {node.name}")
+            self.nodes[node.name] = node
+        self._check()
+
+    def _check(self):
+        """Dependencias existentes y sin ciclos (orden topológico de Kahn)."""
+        for node in self.nodes.values():
+            missing = [dep for dep in node.depends_on if dep not in self.nodes]
+            if missing:
+                raise GraphError(f"{node.name} depende de nodos inexistentes: {missing}")
+
+        pending = {name: set(node.depends_on) for name, node in self.nodes.items()}
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise GraphError(f"Ciclo entre los nodos: {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+    async def _run_node(self, node: Node, state: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(node.func(state), timeout=node.timeout) or {}
+        except asyncio.TimeoutError:
+            raise NodeTimeoutError(node.name, node.timeout) from None
+
+    async def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ejecuta el grafo y devuelve el estado final.
+
+        Si falla un nodo no opcional se cancelan los nodos en curso y se
+        propaga el error.
+        """
+        state = dict(state)
+        finished: set = set()
+        started: set = set()
+        running: Dict[asyncio.Task, Node] = {}
+
+        def launch_ready():
+            for name, node in self.nodes.items():
+                if name not in started and all(dep in finished for dep in node.depends_on):
+                    started.add(name)
+                    task = asyncio.create_task(self._run_node(node, dict(state)), name=f"node-{name}")
+                    running[task] = node
+
+        try:
+            launch_ready()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = running.pop(task)
+                    try:
+                        merge_state(state, task.result())
+                    except Exception as exc:
+                        if not node.optional:
+                            raise
+                        error = str(exc) if isinstance(exc, NodeTimeoutError) else f"{node.name}: {exc}"
+                        logger.warning(f"Nodo opcional falló, se continúa: {error}")
+                        merge_state(state, {"errors": [error]})
+                    finished.add(node.name)
+                launch_ready()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return state
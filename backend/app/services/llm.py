@@ -0,0 +1,118 @@
+"""
+Construcción del modelo de chat según `MODEL_PROVIDER`.
+"""
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from app.config import settings
+from app.monitoring.tracing import tracer
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """
+    Un span `llm.chat` por llamada al modelo (también en streaming).
+
+    Registra modelo, tokens de entrada/salida (si el proveedor los reporta),
+    fragmentos recibidos y el tiempo al primer token como evento. Corre
+    inline para ver el span activo de quien llama al modelo.
+    """
+
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._spans: Dict[UUID, Any] = {}
+
+    async def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any
+    ):
+        span = tracer.start_span("llm.chat", {
+            "gen_ai.system": settings.model_provider,
+            "gen_ai.request.model": self.model,
+            "llm.prompt_messages": sum(len(batch) for batch in messages),
+            "llm.stream_chunks": 0,
+        }, kind="CLIENT")
+        if span.recording:
+            self._spans[run_id] = span
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None:
+            if not span.attributes["llm.stream_chunks"]:
+                span.add_event("first_token")
+            span.attributes["llm.stream_chunks"] += 1
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage = _token_usage(response)
+        if usage:
+            span.set_attributes({
+                "gen_ai.usage.input_tokens": usage.get("input_tokens"),
+                "gen_ai.usage.output_tokens": usage.get("output_tokens"),
+            })
+        span.end()
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.record_exception(error)
+            span.end()
+
+
+def _token_usage(response: LLMResult) -> Optional[Dict[str, int]]:
+    """Tokens de `usage_metadata` del mensaje o, si no, de `llm_output`."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return dict(usage)
+    token_usage = (response.llm_output or {}).get("token_usage")
+    if token_usage:
+        return {
+            "input_tokens": token_usage.get("prompt_tokens"),
+            "output_tokens": token_usage.get("completion_tokens"),
+        }
+    return None
+
+
+def build_chat_model(temperature: float = 0.2, streaming: bool = True, http_async_client=None) -> BaseChatModel:
+    """
+    Modelo de chat de OpenAI o, con `MODEL_PROVIDER=fake`, uno determinista.
+
+    Args:
+        temperature: Temperatura de muestreo.
+        streaming: Pedir la respuesta por tokens al proveedor.
+        http_async_client: Cliente HTTP compartido (keep-alive/HTTP2).
+    """
+    model = "fake" if settings.model_provider == "fake" else settings.openai_model
+    callbacks = [TracingCallbackHandler(model)] if settings.tracing_enabled else None
+    if settings.model_provider == "fake":
+        from app.rag.fakes import FakeLegalChatModel
+
+        return FakeLegalChatModel(
+            first_token_ms=settings.fake_llm_first_token_ms,
+            token_delay_ms=settings.fake_llm_token_delay_ms,
+            latency_distribution=settings.fake_latency_distribution,
+            latency_jitter=settings.fake_latency_jitter,
+            callbacks=callbacks,
+        )
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=settings.openai_model,
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        temperature=temperature,
+        streaming=streaming,
+        stream_usage=True,
+        http_async_client=http_async_client,
+        callbacks=callbacks,
+    )
@@ -0,0 +1,68 @@
+"""
+Prompts del triaje jurídico.
+"""
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from app.models.schemas import StructuredCase
+
+
+ANSWER_SYSTEM_PROMPT = """Eres un asistente de orientación jurídica para ciudadanos en Colombia.
+Responde en español claro, sin jerga innecesaria, usando únicamente el contexto legal dado.
+Estructura la respuesta en Markdown con las secciones: Diagnóstico, Riesgos, Documentos necesarios,
+Acción recomendada y Próximos pasos. Cita los artículos o normas del contexto entre corchetes [n].
+Si el contexto no alcanza para responder, dilo y recomienda consultar a un abogado."""
+
+RECOMMENDATION_SYSTEM_PROMPT = """Eres un abogado colombiano que hace triaje de casos.
+Con la consulta y el contexto legal, devuelve SOLO un objeto JSON con las claves:
+"area" (civil, laboral, penal, contractual, administrativo, familia, consumo, propiedad_intelectual, constitucional u otros),
+"diagnosis" (string), "risks" (lista de strings), "documents_needed" (lista de strings),
+"recommended_action" (string), "estimated_cost" (string), "next_steps" (lista de strings),
+"confidence_score" (número entre 0 y 1)."""
+
+STRUCTURE_SYSTEM_PROMPT = """Extrae los hechos de la consulta jurídica de un ciudadano en Colombia.
+Devuelve SOLO un objeto JSON con las claves: "summary" (string), "actors" (lista de strings),
+"dates" (lista de strings), "jurisdiction" (string), "tentative_area" (civil, laboral, penal,
+contractual, administrativo, familia, consumo, propiedad_intelectual, constitucional u otros),
+"urgency" (bajo, medio o alto), "relevant_documents" (lista de strings)."""
+
+
+def format_context(documents: List[Document]) -> str:
+    """Contexto numerado para el prompt: fuente, área y artículo de cada chunk."""
+    blocks = []
+    for index, doc in enumerate(documents, 1):
+        metadata = doc.metadata
+        header = f"[{index}] {metadata.get('source', 'desconocido')}"
+        if metadata.get("area"):
+            header += f" ({metadata['area']})"
+        if metadata.get("articulo"):
+            header += f" art. {metadata['articulo']}"
+        blocks.append(f"{header}\n{doc.page_content}")
+    return "\n\n".join(blocks)
+
+
+def format_case(case: StructuredCase) -> str:
+    lines = [f"Resumen: {case.summary}", f"Urgencia: {case.urgency}", f"Jurisdicción: {case.jurisdiction}"]
+    if case.actors:
+        lines.append(f"Actores: {', '.join(case.actors)}")
+    if case.dates:
+        lines.append(f"Fechas: {', '.join(case.dates)}")
+    if case.relevant_documents:
+        lines.append(f"Documentos mencionados: {', '.join(case.relevant_documents)}")
+    return "\n".join(lines)
+
+
+def user_prompt(
+    query: str,
+    documents: List[Document],
+    probable_area: str,
+    case: Optional[StructuredCase] = None,
+) -> str:
+    structured = f"Caso estructurado:\n{format_case(case)}\n\n" if case is not None else ""
+    return (
+        f"Consulta del usuario:\n{query}\n\n"
+        f"Área probable: {probable_area}\n\n"
+        f"{structured}"
+        f"Contexto legal:\n{format_context(documents) or '(sin resultados)'}"
+    )
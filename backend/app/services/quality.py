@@ -0,0 +1,155 @@
+"""
+Evaluación de calidad de la recomendación del triaje.
+
+Cada criterio se puntúa de 0 a `MAX_CRITERION_SCORE` con una llamada
+independiente al modelo evaluador; todas corren en paralelo. En cuanto el
+total ya alcanza `min_quality_score`, o ya no puede alcanzarlo aunque los
+criterios pendientes saquen el máximo, se cancelan las evaluaciones
+restantes.
+
+Un criterio falla si queda por debajo de su parte proporcional del mínimo
+(35 sobre 50 → 7 por criterio); solo esos criterios vuelven como feedback
+para regenerar.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.config import settings
+from app.models.schemas import QualityCheck
+from app.monitoring.tracing import tracer
+
+
+logger = logging.getLogger(__name__)
+
+MAX_CRITERION_SCORE = 10
+
+CRITERIA: Dict[str, str] = {
+    "precision_juridica": "El área y el diagnóstico son correctos para la consulta según el contexto legal.",
+    "fundamentacion": "Las afirmaciones se apoyan en normas o artículos del contexto; no inventa normas.",
+    "completitud": "Incluye riesgos, documentos necesarios, acción recomendada y próximos pasos.",
+    "claridad": "Un ciudadano sin formación jurídica puede entenderla sin ambigüedades.",
+    "accionabilidad": "Los próximos pasos son concretos, ordenados y realizables por el usuario.",
+}
+
+EVALUATOR_SYSTEM_PROMPT = """Eres un evaluador de calidad de orientaciones jurídicas en Colombia.
+Evalúa la recomendación únicamente según el criterio indicado, con un puntaje entero de 0 a {max_score}.
+Devuelve SOLO un objeto JSON con las claves "score" (entero) y "feedback" (string breve con qué corregir;
+vacío si no hay nada que corregir)."""
+
+REVISION_PROMPT = """Tu recomendación anterior no superó la revisión de calidad en estos criterios:
+{feedback}
+
+Corrige solo esos aspectos, conserva lo demás y devuelve de nuevo el objeto JSON completo."""
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def revision_prompt(feedback: List[str]) -> str:
+    return REVISION_PROMPT.format(feedback="\n".join(f"- {item}" for item in feedback))
+
+
+def parse_score(text: str) -> Tuple[int, str]:
+    """(score, feedback) del JSON del evaluador; el score se acota al rango válido."""
+    match = _JSON_RE.search(text)
+    data = json.loads(match.group(0)) if match else {}
+    score = int(round(float(data["score"])))
+    return min(MAX_CRITERION_SCORE, max(0, score)), str(data.get("feedback") or "")
+
+
+class QualityEvaluator:
+    """
+    Evalúa una recomendación por criterios, en paralelo y con corte temprano.
+
+    Args:
+        llm: Modelo evaluador (temperatura `evaluation_temperature`).
+        criteria: Nombre → descripción de cada criterio.
+        min_score: Total mínimo para aprobar (`min_quality_score`).
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        criteria: Optional[Dict[str, str]] = None,
+        min_score: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.criteria = criteria or CRITERIA
+        self.min_score = settings.min_quality_score if min_score is None else min_score
+        self.criterion_threshold = math.ceil(self.min_score / len(self.criteria))
+
+    async def evaluate_criterion(self, criterion: str, prompt: str, answer: str) -> Tuple[int, str]:
+        with tracer.span("quality.criterion", {"quality.criterion": criterion}) as span:
+            message = await self.llm.ainvoke([
+                SystemMessage(content=EVALUATOR_SYSTEM_PROMPT.format(max_score=MAX_CRITERION_SCORE)),
+                HumanMessage(content=(
+                    f"Criterio: {criterion} — {self.criteria[criterion]}\n\n"
+                    f"{prompt}\n\nRecomendación a evaluar:\n{answer}"
+                )),
+            ])
+            try:
+                score, feedback = parse_score(message.content)
+            except (KeyError, TypeError, ValueError):
+                # Evaluación ilegible: neutral, para no forzar una regeneración
+                logger.warning(f"Evaluación de '{criterion}' no es JSON válido")
+                score, feedback = self.criterion_threshold, ""
+            span.set_attribute("quality.score", score)
+            return score, feedback
+
+    def _decided(self, total: int, pending: int) -> bool:
+        return total >= self.min_score or total + pending * MAX_CRITERION_SCORE < self.min_score
+
+    async def evaluate(self, prompt: str, answer: str) -> QualityCheck:
+        """
+        Puntúa `answer` (la recomendación) para la consulta y contexto de `prompt`.
+
+        `scores` solo incluye los criterios evaluados antes del corte.
+        """
+        with tracer.span("quality.evaluate") as span:
+            check = await self._evaluate(prompt, answer)
+            span.set_attributes({
+                "quality.total": check.total,
+                "quality.passed": check.passed,
+                "quality.evaluated": len(check.scores),
+                "quality.skipped": len(self.criteria) - len(check.scores),
+            })
+            return check
+
+    async def _evaluate(self, prompt: str, answer: str) -> QualityCheck:
+        tasks = {
+            asyncio.create_task(self.evaluate_criterion(criterion, prompt, answer)): criterion
+            for criterion in self.criteria
+        }
+        scores: Dict[str, int] = {}
+        comments: Dict[str, str] = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    criterion = tasks[task]
+                    try:
+                        scores[criterion], comments[criterion] = task.result()
+                    except Exception as exc:
+                        logger.warning(f"Evaluación de '{criterion}' falló: {exc}")
+                        scores[criterion], comments[criterion] = self.criterion_threshold, ""
+                if pending and self._decided(sum(scores.values()), len(pending)):
+                    logger.debug(f"Evaluación decidida con {len(pending)} criterios pendientes")
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        total = sum(scores.values())
+        feedback = [
+            f"{criterion}: {comments[criterion] or self.criteria[criterion]}"
+            for criterion, score in scores.items()
+            if score < self.criterion_threshold
+        ]
+        return QualityCheck(scores=scores, total=total, passed=total >= self.min_score, feedback=feedback)
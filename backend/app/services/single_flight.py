@@ -0,0 +1,245 @@
+"""
+Coalescencia de consultas de triaje idénticas en vuelo (single-flight).
+
+Cuando muchas personas envían casi la misma consulta a la vez, solo una
+ejecución hace embeddings + recuperación + LLM; el resto se suscribe a sus
+eventos. La clave es la consulta normalizada (ver `question_key`).
+
+Dentro del proceso, cada vuelo guarda sus eventos y los suscriptores los
+reproducen desde el inicio. Entre workers se usa Redis:
+
+    {prefix}:{key}              lock con el id del vuelo (SET NX PX)
+    {prefix}:{key}:{flight_id}  stream (XADD) con los eventos del líder
+
+Quien obtiene el lock ejecuta el triaje y publica cada evento; los demás
+leen el stream con XREAD. Si el líder muere antes de emitir nada, otro
+worker toma el lock y ejecuta la consulta.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.triaje import TriajeEvent
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = ("result", "error")
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+EventFactory = Callable[[], AsyncIterator[TriajeEvent]]
+
+
+class _Flight:
+    """Eventos de una ejecución compartida y sus suscriptores locales."""
+
+    def __init__(self):
+        self.events: List[TriajeEvent] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.leader = False
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: TriajeEvent):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[TriajeEvent]:
+        """Reproduce los eventos ya emitidos y luego los nuevos."""
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.events) > position)
+
+
+def _encode(event: TriajeEvent) -> Dict[str, str]:
+    return {"e": json.dumps({"event": event.event, "data": event.data}, ensure_ascii=False)}
+
+
+def _decode(fields) -> TriajeEvent:
+    payload = json.loads(fields[b"e"] if b"e" in fields else fields["e"])
+    return TriajeEvent(payload["event"], payload["data"])
+
+
+class SingleFlight:
+    """
+    Deduplica ejecuciones concurrentes de triaje por clave.
+
+    Args:
+        redis: Cliente `redis.asyncio` para coalescer entre workers (opcional).
+        prefix: Prefijo de las claves en Redis.
+    """
+
+    def __init__(self, redis=None, prefix: str = "triaje:flight"):
+        self.redis = redis
+        self.prefix = prefix
+        self.lock_ttl_ms = int(settings.triaje_coalesce_lock_ttl_seconds * 1000)
+        self.stream_ttl_ms = int(settings.triaje_coalesce_stream_ttl_seconds * 1000)
+        self._flights: Dict[str, _Flight] = {}
+        self._release = redis.register_script(_RELEASE_LUA) if redis is not None else None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: str, factory: EventFactory) -> AsyncIterator[TriajeEvent]:
+        """
+        Eventos del triaje para `key`, ejecutándolo solo si nadie lo está haciendo.
+
+        Cada suscriptor recibe su propio `case_id`.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory), name=f"triaje-flight-{key[:12]}")
+        else:
+            logger.info(f"Triaje coalescido con una ejecución en curso ({flight.subscribers} suscriptores)")
+
+        case_id = str(uuid.uuid4())
+        flight.subscribers += 1
+        try:
+            async for event in flight.follow():
+                if "case_id" in event.data:
+                    event = TriajeEvent(event.event, {**event.data, "case_id": case_id})
+                yield event
+        finally:
+            flight.subscribers -= 1
+            # Nadie escucha: cancelar, salvo que otros workers lean nuestro stream
+            shared = flight.leader and self.redis is not None
+            if flight.subscribers == 0 and not shared and not flight.task.done():
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: _Flight, factory: EventFactory):
+        error: Optional[BaseException] = None
+        try:
+            if self.redis is not None:
+                await self._run_shared(key, flight, factory)
+            else:
+                flight.leader = True
+                async for event in factory():
+                    await flight.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            error = exc
+        finally:
+            await flight.finish(error)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    # ------------------------------------------------------------------
+    # Coalescencia entre workers (Redis)
+    # ------------------------------------------------------------------
+
+    async def _run_shared(self, key: str, flight: _Flight, factory: EventFactory):
+        lock_key = f"{self.prefix}:{key}"
+        while True:
+            flight_id = uuid.uuid4().hex
+            try:
+                acquired = await self.redis.set(lock_key, flight_id, nx=True, px=self.lock_ttl_ms)
+                current = None if acquired else await self.redis.get(lock_key)
+            except Exception as exc:
+                logger.warning(f"Redis no disponible para coalescer el triaje: {exc}")
+                flight.leader = True
+                async for event in factory():
+                    await flight.publish(event)
+                return
+
+            if acquired:
+                flight.leader = True
+                await self._lead(lock_key, flight_id, flight, factory)
+                return
+            if current is None:
+                continue  # el lock se liberó entre SET y GET
+            if await self._follow_remote(lock_key, current.decode(), flight):
+                return
+            logger.warning("El líder del triaje terminó sin emitir eventos; reintentando")
+
+    async def _lead(self, lock_key: str, flight_id: str, flight: _Flight, factory: EventFactory):
+        stream_key = f"{lock_key}:{flight_id}"
+        publishing = True
+
+        async def share(event: TriajeEvent):
+            nonlocal publishing
+            if not publishing:
+                return
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.xadd(stream_key, _encode(event))
+                    pipe.pexpire(stream_key, self.stream_ttl_ms)
+                    pipe.pexpire(lock_key, self.lock_ttl_ms)
+                    await pipe.execute()
+            except Exception as exc:
+                publishing = False
+                logger.warning(f"No se pudo publicar el triaje en Redis: {exc}")
+
+        try:
+            async for event in factory():
+                await flight.publish(event)
+                await share(event)
+        except Exception:
+            await share(TriajeEvent("error", {"detail": "No fue posible completar el triaje"}))
+            raise
+        finally:
+            try:
+                await self._release(keys=[lock_key], args=[flight_id])
+            except Exception as exc:
+                logger.warning(f"No se pudo liberar el lock del triaje: {exc}")
+
+    async def _follow_remote(self, lock_key: str, flight_id: str, flight: _Flight) -> bool:
+        """
+        Reenvía los eventos del líder remoto al vuelo local.
+
+        Devuelve False si el líder desapareció sin emitir nada (se puede
+        reintentar); falla si desapareció a mitad del stream.
+        """
+        stream_key = f"{lock_key}:{flight_id}"
+        last_id = "0"
+        received = False
+        leader_alive = True
+        while True:
+            response = await self.redis.xread(
+                {stream_key: last_id}, count=100, block=1000 if leader_alive else None
+            )
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    event = _decode(fields)
+                    await flight.publish(event)
+                    received = True
+                    if event.event in TERMINAL_EVENTS:
+                        return True
+            if response:
+                continue
+            if not leader_alive:
+                if received:
+                    raise RuntimeError("El líder del triaje se perdió a mitad del stream")
+                return False
+            current = await self.redis.get(lock_key)
+            leader_alive = current is not None and current.decode() == flight_id
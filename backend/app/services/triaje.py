@@ -0,0 +1,360 @@
+"""
+Servicio de triaje jurídico con salida en streaming.
+
+Orden de los eventos:
+    start       case_id, en cuanto llega la petición
+    references  chunks recuperados (antes de llamar al LLM)
+    token       fragmentos de `formatted_output` a medida que se generan
+    result      `TriajeResponse` completo, con `processing_time`
+
+El triaje es un grafo de nodos (`app/services/graph.py`): la extracción del
+caso estructurado corre en paralelo con la recuperación, y la recomendación
+estructurada (JSON) en paralelo con la respuesta en texto, así que no agrega
+latencia después del último token. Con un
+evaluador, la recomendación pasa por el ciclo de calidad (generar → evaluar
+→ regenerar con los criterios fallidos) hasta `max_iterations`.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.vectorstores import VectorStore
+
+from app.config import settings
+from app.models.schemas import FinalRecommendation, StructuredCase, TriajeRequest, TriajeResponse
+from app.monitoring.context import bind_context
+from app.monitoring.logger import log_node_execution
+from app.monitoring.metrics import metrics_collector
+from app.monitoring.tracing import current_span, tracer
+from app.rag.areas import normalize_area
+from app.rag.retrieval import get_retriever, retriever_for_case
+from app.services.graph import Graph, Node
+from app.services.prompts import (
+    ANSWER_SYSTEM_PROMPT,
+    RECOMMENDATION_SYSTEM_PROMPT,
+    STRUCTURE_SYSTEM_PROMPT,
+    user_prompt,
+)
+from app.services.quality import QualityEvaluator, revision_prompt
+
+
+logger = logging.getLogger(__name__)
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+@dataclass
+class TriajeEvent:
+    """Evento del stream de triaje."""
+    event: str
+    data: Dict[str, Any]
+
+
+def probable_area(documents: List[Document]) -> str:
+    """Área más frecuente entre los chunks recuperados."""
+    areas = Counter(doc.metadata.get("area") for doc in documents if doc.metadata.get("area"))
+    return areas.most_common(1)[0][0] if areas else "otros"
+
+
+def merge_documents(preferred: List[Document], fallback: List[Document], k: int) -> List[Document]:
+    """`preferred` primero y, si faltan, los de `fallback` que no estén repetidos (hasta k)."""
+    seen = {doc.id or doc.page_content for doc in preferred}
+    extra = [doc for doc in fallback if (doc.id or doc.page_content) not in seen]
+    return [*preferred, *extra][:k]
+
+
+def reference_label(doc: Document) -> str:
+    label = doc.metadata.get("source", "desconocido")
+    if doc.metadata.get("articulo"):
+        label += f" art. {doc.metadata['articulo']}"
+    return label
+
+
+def reference_payload(doc: Document) -> Dict[str, Any]:
+    return {
+        "id": doc.id,
+        "label": reference_label(doc),
+        "area": doc.metadata.get("area"),
+        "excerpt": doc.page_content[:300],
+    }
+
+
+def parse_recommendation(text: str, documents: List[Document], fallback_area: str) -> FinalRecommendation:
+    """Construye la recomendación a partir del JSON del modelo (tolerante a texto extra)."""
+    match = _JSON_RE.search(text)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        logger.warning("Recomendación del modelo no es JSON válido")
+        data = {}
+
+    def as_list(value) -> List[str]:
+        return [str(v) for v in value] if isinstance(value, list) else []
+
+    try:
+        confidence = min(1.0, max(0.0, float(data.get("confidence_score", 0.0))))
+    except (TypeError, ValueError):
+        confidence = 0.0
+
+    return FinalRecommendation(
+        area=normalize_area(data.get("area")) or fallback_area,
+        diagnosis=str(data.get("diagnosis", "")),
+        risks=as_list(data.get("risks")),
+        documents_needed=as_list(data.get("documents_needed")),
+        recommended_action=str(data.get("recommended_action", "Consultar con un abogado")),
+        estimated_cost=str(data.get("estimated_cost", "Por determinar")),
+        next_steps=as_list(data.get("next_steps")),
+        references=[reference_label(doc) for doc in documents],
+        disclaimer=settings.disclaimer_text,
+        confidence_score=confidence,
+    )
+
+
+def parse_structured_case(text: str, query: str) -> StructuredCase:
+    """`StructuredCase` a partir del JSON del modelo; lo ilegible queda en sus valores por defecto."""
+    match = _JSON_RE.search(text)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    def as_list(value) -> List[str]:
+        return [str(v) for v in value] if isinstance(value, list) else []
+
+    return StructuredCase(
+        summary=str(data.get("summary") or query[:300]),
+        actors=as_list(data.get("actors")),
+        dates=as_list(data.get("dates")),
+        jurisdiction=str(data.get("jurisdiction") or "nacional"),
+        tentative_area=normalize_area(data.get("tentative_area")) or "otros",
+        urgency=str(data.get("urgency") or "medio"),
+        relevant_documents=as_list(data.get("relevant_documents")),
+    )
+
+
+class TriajeService:
+    """
+    Recuperación + generación asíncronas para `POST /triaje`.
+
+    Args:
+        llm: Modelo de chat (streaming).
+        vector_store: Vector store del corpus legal.
+        top_k: Chunks a recuperar.
+        evaluator: Evaluador de calidad; sin él la recomendación no se revisa.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        vector_store: VectorStore,
+        top_k: Optional[int] = None,
+        evaluator: Optional[QualityEvaluator] = None,
+    ):
+        self.llm = llm
+        self.vector_store = vector_store
+        self.top_k = top_k or settings.triaje_top_k
+        self.evaluator = evaluator
+
+    async def retrieve(self, query: str, area: Optional[str] = None) -> List[Document]:
+        retriever = get_retriever(self.vector_store, k=self.top_k, area=area)
+        return await retriever.ainvoke(query)
+
+    async def recommend(self, prompt: str, documents: List[Document], area: str) -> Tuple[FinalRecommendation, int]:
+        """
+        Recomendación estructurada y número de iteraciones de calidad.
+
+        Cada regeneración recibe la respuesta anterior y solo el feedback de
+        los criterios que fallaron.
+        """
+        messages = [SystemMessage(content=RECOMMENDATION_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+        iteration = 0
+        while True:
+            iteration += 1
+            message = await self.llm.ainvoke(messages)
+            recommendation = parse_recommendation(message.content, documents, area)
+            if self.evaluator is None:
+                return recommendation, iteration
+
+            check = await self.evaluator.evaluate(prompt, message.content)
+            recommendation.quality_metrics = check.scores
+            logger.info(f"Calidad iteración {iteration}: {check.total} ({'ok' if check.passed else 'falla'})")
+            if check.passed or iteration >= settings.max_iterations:
+                return recommendation, iteration
+            messages = [
+                *messages[:2],
+                AIMessage(content=message.content),
+                HumanMessage(content=revision_prompt(check.feedback)),
+            ]
+
+    async def structure(self, query: str) -> StructuredCase:
+        """Extrae los hechos de la consulta (`StructuredCase`)."""
+        message = await self.llm.ainvoke([
+            SystemMessage(content=STRUCTURE_SYSTEM_PROMPT),
+            HumanMessage(content=query),
+        ])
+        return parse_structured_case(message.content, query)
+
+    def build_graph(self, emit: Callable[[TriajeEvent], None]) -> Graph:
+        """
+        Grafo del triaje; `emit` recibe los eventos del stream.
+
+            structure_case ──> retrieve_area ──┐
+            retrieve ──┬──> recommend <────────┘
+                       └──> answer
+
+        La extracción del caso corre en paralelo con la recuperación y con la
+        respuesta en texto; solo la recomendación la espera. Con el área
+        tentativa del caso, `retrieve_area` repite la búsqueda filtrada por
+        esa área (índice parcial en "postgres") y la recomendación usa esos
+        chunks primero.
+        """
+
+        @log_node_execution("structure_case")
+        async def structure_case(state):
+            return {"structured_case": await self.structure(state["query"])}
+
+        @log_node_execution("retrieve")
+        async def retrieve(state):
+            documents = await self.retrieve(state["query"])
+            area = probable_area(documents)
+            current_span().set_attributes({
+                "retrieval.count": len(documents),
+                "retrieval.chunk_ids": [doc.id for doc in documents],
+                "triaje.area": area,
+            })
+            emit(TriajeEvent("references", {
+                "case_id": state["case_id"],
+                "area": area,
+                "references": [reference_payload(doc) for doc in documents],
+            }))
+            return {"documents": documents, "area": area}
+
+        @log_node_execution("retrieve_area")
+        async def retrieve_area(state):
+            case = state.get("structured_case")
+            area = normalize_area(case.tentative_area) if case is not None else None
+            if area is None:
+                return {}
+            documents = await retriever_for_case(self.vector_store, case, k=self.top_k).ainvoke(state["query"])
+            current_span().set_attributes({
+                "retrieval.area": area,
+                "retrieval.count": len(documents),
+                "retrieval.chunk_ids": [doc.id for doc in documents],
+            })
+            return {"area_documents": documents}
+
+        @log_node_execution("answer")
+        async def answer(state):
+            parts: List[str] = []
+            async for chunk in self.llm.astream([
+                SystemMessage(content=ANSWER_SYSTEM_PROMPT),
+                HumanMessage(content=user_prompt(state["query"], state["documents"], state["area"])),
+            ]):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    emit(TriajeEvent("token", {"text": chunk.content}))
+
+            disclaimer = f"\n\n> {settings.disclaimer_text}"
+            parts.append(disclaimer)
+            emit(TriajeEvent("token", {"text": disclaimer}))
+            return {"formatted_output": "".join(parts)}
+
+        @log_node_execution("recommend")
+        async def recommend(state):
+            case = state.get("structured_case")
+            area = state["area"]
+            documents = state["documents"]
+            if state.get("area_documents"):
+                area = normalize_area(case.tentative_area)
+                documents = merge_documents(state["area_documents"], documents, self.top_k)
+            elif area == "otros" and case is not None:
+                area = normalize_area(case.tentative_area) or area
+            prompt = user_prompt(state["query"], documents, area, case)
+            recommendation, iterations = await self.recommend(prompt, documents, area)
+            metrics_collector.record_iteration_count(iterations)
+            if recommendation.quality_metrics:
+                metrics_collector.record_quality_score(state["case_id"], sum(recommendation.quality_metrics.values()))
+            return {"recommendation": recommendation, "iteration_count": iterations}
+
+        return Graph([
+            Node("structure_case", structure_case, timeout=settings.triaje_structure_timeout_seconds, optional=True),
+            Node("retrieve", retrieve, timeout=settings.triaje_retrieval_timeout_seconds),
+            Node(
+                "retrieve_area",
+                retrieve_area,
+                depends_on=("structure_case",),
+                timeout=settings.triaje_retrieval_timeout_seconds,
+                optional=True,
+            ),
+            Node("answer", answer, depends_on=("retrieve",), timeout=settings.triaje_generation_timeout_seconds),
+            Node(
+                "recommend",
+                recommend,
+                depends_on=("retrieve", "structure_case", "retrieve_area"),
+                timeout=settings.triaje_generation_timeout_seconds,
+            ),
+        ])
+
+    async def _run_graph(self, graph: Graph, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Ejecuta el grafo dentro del span raíz `triaje`."""
+        with tracer.span("triaje", {"triaje.case_id": state["case_id"], "triaje.query_length": len(state["query"])}) as span:
+            state = await graph.run(state)
+            recommendation = state.get("recommendation")
+            span.set_attributes({
+                "triaje.area": state.get("area"),
+                "triaje.iterations": state.get("iteration_count"),
+                "quality.total": sum(recommendation.quality_metrics.values()) if recommendation else None,
+            })
+            return state
+
+    async def stream(self, request: TriajeRequest) -> AsyncIterator[TriajeEvent]:
+        """Ejecuta el grafo del triaje y entrega los eventos a medida que ocurren."""
+        started = time.perf_counter()
+        case_id = str(uuid.uuid4())
+        yield TriajeEvent("start", {"case_id": case_id})
+
+        events: asyncio.Queue = asyncio.Queue()
+        graph = self.build_graph(events.put_nowait)
+        # Los nodos (y sus logs) heredan case_id/user_id de este contexto
+        context = contextvars.copy_context()
+        context.run(bind_context, case_id=case_id, user_id=request.user_id)
+        run = asyncio.create_task(self._run_graph(graph, {
+            "case_id": case_id,
+            "session_id": request.session_id or case_id,
+            "user_id": request.user_id,
+            "query": request.query,
+        }), context=context)
+        run.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            state = run.result()
+        finally:
+            # Cliente desconectado o error: no dejar nodos huérfanos y esperar
+            # a que terminen de cancelarse (sus finally liberan conexiones)
+            if not run.done():
+                run.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await run
+
+        response = TriajeResponse(
+            case_id=case_id,
+            formatted_output=state["formatted_output"],
+            recommendation=state["recommendation"],
+            iteration_count=state["iteration_count"],
+            processing_time=round(time.perf_counter() - started, 3),
+        )
+        yield TriajeEvent("result", response.model_dump(mode="json"))
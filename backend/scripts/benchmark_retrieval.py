@@ -0,0 +1,544 @@
+"""
+Benchmark reproducible de recuperación por vector store y configuración de chunking.
+
+Arma el corpus con los textos de data/raw más documentos sintéticos generados
+con semilla fija (vocabulario del corpus real con distribución Zipf), los
+embebe con `DeterministicFakeEmbeddings` (sin red) y, para cada combinación
+de chunking y backend, mide:
+
+    build        tiempo de construcción del índice y memoria (pico y final)
+    latencia     p50/p95/p99 de consultas secuenciales
+    carga        QPS y percentiles con N consultas concurrentes
+    recall@k     contra la verdad exacta por fuerza bruta (NumPy, float32)
+
+El resultado es un JSON para comparar entre commits (`--compare`).
+
+USO:
+    python scripts/benchmark_retrieval.py --output bench.json
+    python scripts/benchmark_retrieval.py --synthetic-docs 20000 --chunk-sizes 800,1500 \\
+        --backends local:float32:brute,local:int8:ivf --area-filter
+    python scripts/benchmark_retrieval.py --output bench_new.json --compare bench.json
+
+REQUIERE:
+    numpy. Para el backend "postgres", una base con scripts/setup_db.py aplicado
+    (--postgres-dsn); se usa una tabla temporal copiada de legal_embeddings.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+
+from app.rag.areas import LEGAL_AREAS
+from app.rag.fakes import DeterministicFakeEmbeddings
+from app.rag.legal_chunker import LegalTextSplitter
+from app.rag.local_store import LocalVectorStore
+from app.rag.preprocessing import normalize_text
+
+
+BENCHMARK_VERSION = 1
+RAW_DIR = Path(__file__).parent.parent / "data" / "raw"
+DEFAULT_BACKENDS = "local:float32:brute,local:float32:ivf,local:int8:brute,local:int8:ivf"
+BENCH_TABLE = "legal_embeddings_bench"
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+
+
+# ----------------------------------------------------------------------
+# Corpus
+# ----------------------------------------------------------------------
+
+def load_raw_documents(raw_dir: Path) -> List[Document]:
+    documents = []
+    for path in sorted(raw_dir.glob("*.txt")):
+        text = normalize_text(path.read_text(encoding="utf-8", errors="replace"))
+        if text:
+            documents.append(Document(page_content=text, metadata={"source": path.name, "area": "otros"}))
+    return documents
+
+
+def synthetic_documents(raw: List[Document], count: int, seed: int) -> List[Document]:
+    """
+    Documentos con estructura de artículos y vocabulario del corpus real.
+
+    Las palabras se muestrean con pesos Zipf sobre su rango de frecuencia y
+    cada área tiene un sesgo propio de vocabulario, así que los vectores son
+    variados (sin empates masivos) pero con vecinos temáticos.
+    """
+    if count <= 0:
+        return []
+    counts = Counter(word.lower() for doc in raw for word in _WORD_RE.findall(doc.page_content))
+    vocabulary = [word for word, _ in counts.most_common()] or ["derecho", "norma", "artículo"]
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+
+    rng = random.Random(seed)
+    area_words = {area: rng.sample(vocabulary, min(30, len(vocabulary))) for area in LEGAL_AREAS}
+    documents = []
+    for index in range(count):
+        area = LEGAL_AREAS[index % len(LEGAL_AREAS)]
+        articles = []
+        for number in range(1, rng.randint(3, 8) + 1):
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(8, 24))
+                words += rng.sample(area_words[area], 3)
+                rng.shuffle(words)
+                sentences.append(" ".join(words).capitalize() + ".")
+            articles.append(f"ARTÍCULO {number}. " + " ".join(sentences))
+        documents.append(Document(
+            page_content=f"DOCUMENTO SINTÉTICO {index} ({area})\n\n" + "\n\n".join(articles),
+            metadata={"source": f"synthetic_{index:06d}.txt", "area": area},
+        ))
+    return documents
+
+
+def chunk_corpus(documents: List[Document], chunk_size: int, chunk_overlap: int) -> List[Document]:
+    chunks = LegalTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_documents(documents)
+    per_source: Counter = Counter()
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "doc")
+        chunk.id = f"{source}:{per_source[source]}"
+        per_source[source] += 1
+    return chunks
+
+
+def sample_queries(chunks: List[Document], count: int, seed: int) -> List[Tuple[str, str]]:
+    """(texto, área) con ventanas de 6–14 palabras de chunks al azar."""
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.choices(chunks, k=count):
+        words = chunk.page_content.split()
+        size = min(len(words), rng.randint(6, 14))
+        start = rng.randint(0, len(words) - size)
+        queries.append((" ".join(words[start:start + size]), chunk.metadata.get("area", "otros")))
+    return queries
+
+
+# ----------------------------------------------------------------------
+# Verdad exacta y recall
+# ----------------------------------------------------------------------
+
+def ground_truth(
+    matrix: np.ndarray, queries: np.ndarray, k: int, row_areas: np.ndarray, query_areas: Optional[List[str]]
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """Top-k exacto (filas ordenadas) por consulta y la matriz de scores exactos."""
+    scores = queries @ matrix.T
+    if query_areas is not None:
+        scores[row_areas[None, :] != np.asarray(query_areas)[:, None]] = -np.inf
+    top = min(k, scores.shape[1])
+    truth = []
+    for row in scores:
+        order = np.argpartition(-row, top - 1)[:top]
+        order = order[np.argsort(-row[order])]
+        order = order[np.isfinite(row[order])]
+        truth.append(order)
+    return truth, scores
+
+
+def recall_at(
+    results: List[List[str]], truth: List[np.ndarray], scores: np.ndarray, row_by_id: Dict[str, int], k: int
+) -> float:
+    """
+    Fracción del top-k exacto recuperada.
+
+    Un resultado cuenta si su score exacto alcanza el del k-ésimo verdadero:
+    documentos empatados son intercambiables.
+    """
+    hits = total = 0
+    for i, ids in enumerate(results):
+        expected = truth[i][:k]
+        if not len(expected):
+            continue
+        threshold = scores[i, expected[-1]] - 1e-5
+        found = sum(1 for doc_id in ids[:k] if scores[i, row_by_id[doc_id]] >= threshold)
+        hits += min(found, len(expected))
+        total += len(expected)
+    return round(hits / total, 4) if total else 1.0
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+
+class BenchmarkBackend:
+    """Construye y consulta un backend con vectores ya calculados."""
+
+    name = ""
+
+    async def build(self, chunks: List[Document], vectors: List[List[float]]):
+        raise NotImplementedError
+
+    async def search(self, vector: List[float], k: int, filter: Optional[Dict[str, Any]]) -> List[str]:
+        raise NotImplementedError
+
+    async def index_bytes(self) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LocalBackend(BenchmarkBackend):
+    """`LocalVectorStore` con dtype y modo de búsqueda dados ("local:int8:ivf")."""
+
+    def __init__(self, embeddings, dtype: str, search_mode: str, nprobe: int):
+        self.name = f"local:{dtype}:{search_mode}" + (f":nprobe={nprobe}" if search_mode == "ivf" else "")
+        self.store = LocalVectorStore(embeddings, dtype=dtype, search_mode=search_mode, nprobe=nprobe)
+
+    async def build(self, chunks, vectors):
+        self.store.add_embeddings(
+            [c.page_content for c in chunks], vectors, [c.metadata for c in chunks], [c.id for c in chunks]
+        )
+        if self.store.search_mode == "ivf":
+            self.store.build_ivf()
+
+    async def search(self, vector, k, filter):
+        return [doc.id for doc, _ in await self.store.asearch_by_vector_with_score(vector, k, filter)]
+
+    async def index_bytes(self) -> int:
+        return self.store.nbytes
+
+
+class PostgresBackend(BenchmarkBackend):
+    """`PostgresVectorStore` sobre una copia vacía de legal_embeddings (índices incluidos)."""
+
+    name = "postgres"
+
+    def __init__(self, embeddings, dsn: str, pool_size: int, batch_size: int = 500):
+        self.embeddings = embeddings
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.pool = None
+        self.store = None
+
+    async def build(self, chunks, vectors):
+        import asyncpg
+
+        from app.rag.pg_store import PostgresVectorStore
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        async with self.pool.acquire() as conn:
+            await conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            await conn.execute(f"CREATE TABLE {BENCH_TABLE} (LIKE legal_embeddings INCLUDING ALL)")
+        self.store = PostgresVectorStore(self.embeddings, pool=self.pool, table=BENCH_TABLE)
+        for start in range(0, len(chunks), self.batch_size):
+            batch = chunks[start:start + self.batch_size]
+            await self.store.aadd_embeddings(
+                [c.page_content for c in batch],
+                vectors[start:start + self.batch_size],
+                [c.metadata for c in batch],
+                [c.id for c in batch],
+            )
+        async with self.pool.acquire() as conn:
+            await conn.execute(f"ANALYZE {BENCH_TABLE}")
+
+    async def search(self, vector, k, filter):
+        return [doc.id for doc, _ in await self.store.asearch_by_vector_with_score(vector, k, filter)]
+
+    async def index_bytes(self) -> int:
+        async with self.pool.acquire() as conn:
+            return int(await conn.fetchval(f"SELECT pg_total_relation_size('{BENCH_TABLE}')"))
+
+    async def close(self):
+        if self.pool is not None:
+            async with self.pool.acquire() as conn:
+                await conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            await self.pool.close()
+
+
+def make_backend(spec: str, embeddings, args) -> BenchmarkBackend:
+    parts = spec.split(":")
+    if parts[0] == "local":
+        dtype = parts[1] if len(parts) > 1 else "float32"
+        mode = parts[2] if len(parts) > 2 else "brute"
+        return LocalBackend(embeddings, dtype, mode, args.nprobe)
+    if parts[0] == "postgres":
+        if not args.postgres_dsn:
+            raise SystemExit("El backend postgres requiere --postgres-dsn")
+        return PostgresBackend(embeddings, args.postgres_dsn, pool_size=max(args.concurrency))
+    raise SystemExit(f"Backend desconocido: {spec} (local:<dtype>:<brute|ivf> | postgres)")
+
+
+# ----------------------------------------------------------------------
+# Medición
+# ----------------------------------------------------------------------
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99]) if samples_ms else (0.0, 0.0, 0.0)
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(samples_ms)) if samples_ms else 0.0, 3),
+    }
+
+
+async def run_sequential(backend, query_vectors, k, filters) -> Tuple[List[List[str]], List[float]]:
+    results, samples = [], []
+    for vector, filter in zip(query_vectors, filters):
+        start = time.perf_counter()
+        results.append(await backend.search(vector, k, filter))
+        samples.append((time.perf_counter() - start) * 1000)
+    return results, samples
+
+
+async def run_concurrent(backend, query_vectors, k, filters, concurrency: int, total: int) -> Dict[str, Any]:
+    """`total` consultas con `concurrency` trabajadores en ciclo sobre las consultas."""
+    samples: List[float] = []
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index % len(query_vectors)
+            next_index += 1
+            start = time.perf_counter()
+            await backend.search(query_vectors[index], k, filters[index])
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "queries": len(samples), "qps": round(len(samples) / elapsed, 1),
+            **latency_summary(samples)}
+
+
+async def benchmark_backend(
+    spec: str, embeddings, args, chunk_size, chunks, vectors, query_vectors, query_areas, truths
+) -> List[Dict[str, Any]]:
+    backend = make_backend(spec, embeddings, args)
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        await backend.build(chunks, vectors)
+        build_s = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = {
+            "index_bytes": await backend.index_bytes(),
+            "python_heap_bytes": current,
+            "python_heap_peak_bytes": peak,
+        }
+
+        max_k = max(args.k)
+        warmup = min(args.warmup, len(query_vectors))
+        results = []
+        for mode, (truth, scores) in truths.items():
+            filters = [{"area": area} for area in query_areas] if mode == "area" else [None] * len(query_vectors)
+            await run_sequential(backend, query_vectors[:warmup], max_k, filters[:warmup])
+            found, samples = await run_sequential(backend, query_vectors, max_k, filters)
+            load = [
+                await run_concurrent(backend, query_vectors, max_k, filters, c, args.load_queries)
+                for c in args.concurrency
+            ]
+            row_by_id = {chunk.id: row for row, chunk in enumerate(chunks)}
+            results.append({
+                "backend": backend.name,
+                "chunk_size": chunk_size,
+                "filter": mode,
+                "build_s": round(build_s, 3),
+                "memory": memory,
+                "latency": latency_summary(samples),
+                "load": load,
+                "recall": {f"@{k}": recall_at(found, truth, scores, row_by_id, k) for k in args.k},
+            })
+            print(
+                f"   {backend.name:<32} filter={mode:<5} build={build_s:7.2f}s "
+                f"p50={results[-1]['latency']['p50_ms']:.2f}ms p95={results[-1]['latency']['p95_ms']:.2f}ms "
+                f"recall@{max_k}={results[-1]['recall'][f'@{max_k}']:.3f} "
+                f"qps@{args.concurrency[-1]}={load[-1]['qps']}",
+                file=sys.stderr,
+            )
+        return results
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        await backend.close()
+
+
+# ----------------------------------------------------------------------
+# Comparación entre ejecuciones
+# ----------------------------------------------------------------------
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    latency_tolerance: float,
+    recall_tolerance: float,
+    latency_floor_ms: float = 1.0,
+) -> int:
+    """
+    Imprime diferencias contra `baseline`; devuelve el número de regresiones.
+
+    Un p95 cuenta como regresión si sube más de `latency_tolerance` (fracción)
+    y además más de `latency_floor_ms`: en backends de décimas de milisegundo
+    el ruido entre dos corridas del mismo commit supera el 20 %.
+    """
+    key = lambda r: (r["backend"], r["chunk_size"], r["filter"])
+    previous = {key(r): r for r in baseline.get("results", [])}
+    regressions = 0
+    print(f"\n📊 Comparación contra {baseline.get('environment', {}).get('git_commit', '?')}", file=sys.stderr)
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        p95, old_p95 = result["latency"]["p95_ms"], old["latency"]["p95_ms"]
+        change = (p95 - old_p95) / old_p95 if old_p95 else 0.0
+        recall_deltas = {k: v - old["recall"].get(k, v) for k, v in result["recall"].items()}
+        slower = change > latency_tolerance and p95 - old_p95 > latency_floor_ms
+        worse = slower or any(d < -recall_tolerance for d in recall_deltas.values())
+        regressions += worse
+        recall_text = " ".join(f"recall{k} {d:+.3f}" for k, d in recall_deltas.items())
+        print(
+            f"   {'❌' if worse else '✅'} {result['backend']:<32} chunk={result['chunk_size']:<5} "
+            f"filter={result['filter']:<5} p95 {old_p95:.2f}→{p95:.2f}ms ({change:+.0%}) {recall_text}",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+async def main(args) -> int:
+    embeddings = DeterministicFakeEmbeddings(dimensions=args.dimensions)
+    raw = load_raw_documents(Path(args.raw_dir))
+    documents = raw + synthetic_documents(raw, args.synthetic_docs, args.seed)
+    print(f"📚 {len(raw)} documentos reales + {len(documents) - len(raw)} sintéticos", file=sys.stderr)
+
+    report: Dict[str, Any] = {
+        "benchmark": "retrieval",
+        "version": BENCHMARK_VERSION,
+        "environment": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "params": {
+            "raw_dir": str(args.raw_dir),
+            "synthetic_docs": args.synthetic_docs,
+            "seed": args.seed,
+            "dimensions": args.dimensions,
+            "chunk_sizes": args.chunk_sizes,
+            "chunk_overlap": args.chunk_overlap,
+            "backends": args.backends,
+            "queries": args.queries,
+            "k": args.k,
+            "concurrency": args.concurrency,
+            "load_queries": args.load_queries,
+            "nprobe": args.nprobe,
+            "area_filter": args.area_filter,
+        },
+        "corpora": [],
+        "results": [],
+    }
+
+    for chunk_size in args.chunk_sizes:
+        start = time.perf_counter()
+        chunks = chunk_corpus(documents, chunk_size, args.chunk_overlap)
+        chunking_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents([c.page_content for c in chunks])
+        embedding_s = time.perf_counter() - start
+
+        queries = sample_queries(chunks, args.queries, args.seed + 1)
+        query_vectors = [embeddings.embed_query(text) for text, _ in queries]
+        query_areas = [area for _, area in queries]
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        query_matrix = np.asarray(query_vectors, dtype=np.float32)
+        row_areas = np.asarray([c.metadata.get("area", "otros") for c in chunks])
+        truths = {"none": ground_truth(matrix, query_matrix, max(args.k), row_areas, None)}
+        if args.area_filter:
+            truths["area"] = ground_truth(matrix, query_matrix, max(args.k), row_areas, query_areas)
+
+        report["corpora"].append({
+            "chunk_size": chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+            "documents": len(documents),
+            "chunks": len(chunks),
+            "avg_chunk_chars": round(sum(len(c.page_content) for c in chunks) / max(1, len(chunks)), 1),
+            "chunking_s": round(chunking_s, 3),
+            "embedding_s": round(embedding_s, 3),
+        })
+        print(f"\n✂️  chunk_size={chunk_size}: {len(chunks)} chunks (embebidos en {embedding_s:.1f}s)", file=sys.stderr)
+
+        for spec in args.backends:
+            report["results"] += await benchmark_backend(
+                spec, embeddings, args, chunk_size, chunks, vectors, query_vectors, query_areas, truths
+            )
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"\n✅ Resultados en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(
+            report, baseline, args.latency_tolerance, args.recall_tolerance, args.latency_floor_ms
+        )
+        if regressions:
+            print(f"\n⚠️  {regressions} regresiones", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación (latencia, QPS, memoria, recall@k)")
+    parser.add_argument("--raw-dir", default=str(RAW_DIR), help="Documentos reales (*.txt)")
+    parser.add_argument("--synthetic-docs", type=int, default=2000, help="Documentos sintéticos adicionales")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dimensions", type=int, default=1536, help="Dimensión de los embeddings falsos")
+    parser.add_argument("--chunk-sizes", type=int_list, default=[800, 1500])
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--backends", type=lambda v: v.split(","), default=DEFAULT_BACKENDS.split(","),
+                        help="local:<float32|float16|int8>:<brute|ivf> y/o postgres")
+    parser.add_argument("--nprobe", type=int, default=8, help="Listas IVF por consulta")
+    parser.add_argument("--postgres-dsn", default=None, help="DSN para el backend postgres")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--k", type=int_list, default=[1, 5, 10])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--load-queries", type=int, default=500, help="Consultas por nivel de concurrencia")
+    parser.add_argument("--area-filter", action="store_true", help="Medir también consultas filtradas por área")
+    parser.add_argument("--output", help="Archivo JSON (por defecto, stdout)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="Aumento de p95 tolerado (fracción)")
+    parser.add_argument("--latency-floor-ms", type=float, default=1.0,
+                        help="Aumento absoluto de p95 por debajo del cual no hay regresión")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01, help="Caída de recall tolerada")
+    sys.exit(asyncio.run(main(parser.parse_args())))
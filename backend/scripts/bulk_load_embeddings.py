@@ -0,0 +1,108 @@
+"""
+Carga (y exportación) masiva de legal_embeddings con COPY binario.
+
+Lee chunks ya embebidos de un JSONL, uno por línea:
+
+    {"id": "...", "content": "...", "embedding": [0.1, ...], "metadata": {"area": "laboral", ...}}
+
+y los escribe con `PostgresVectorStore.abulk_load`: COPY en formato binario
+a una tabla temporal y un solo INSERT ... ON CONFLICT en la misma
+transacción. Si algo falla no queda ninguna fila a medias.
+
+USO:
+    python scripts/bulk_load_embeddings.py --export backup.jsonl
+    python scripts/bulk_load_embeddings.py --input backup.jsonl
+    python scripts/bulk_load_embeddings.py --input backup.jsonl --replace
+
+--replace borra también las filas que no vienen en el archivo (recarga
+completa). Para recargas de millones de filas conviene hacerlo sin índices
+HNSW (setup_db.py --defer-index o DROP) y construirlos al final con
+scripts/tune_hnsw.py build.
+
+REQUIERE:
+    PostgreSQL con pgvector y la tabla de scripts/setup_db.py.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncpg
+
+from app.config import settings
+from app.rag.pg_store import TABLE_NAME, BulkRow, PostgresVectorStore, binary_vector_codec
+
+
+def read_rows(path: Path, counter: list) -> Iterator[BulkRow]:
+    with open(path, encoding="utf-8") as source:
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                yield item["id"], item["content"], item["embedding"], item.get("metadata") or {}
+            except (KeyError, ValueError) as exc:
+                raise SystemExit(f"❌ {path}:{number}: línea inválida ({exc})")
+            counter[0] += 1
+            if counter[0] % 100_000 == 0:
+                print(f"   … {counter[0]} filas enviadas", file=sys.stderr)
+
+
+async def load(dsn: str, table: str, path: Path, replace: bool):
+    store = PostgresVectorStore(embedding=None, dsn=dsn, table=table)
+    counter = [0]
+    started = time.perf_counter()
+    stats = await store.abulk_load(read_rows(path, counter), replace=replace)
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ {stats['staged']} filas en {elapsed:.1f}s ({stats['staged'] / elapsed:.0f} filas/s): "
+        f"{stats['inserted']} nuevas, {stats['updated']} actualizadas, {stats['unchanged']} sin cambios"
+        + (f", {stats['deleted']} eliminadas" if replace else "")
+    )
+
+
+async def export(dsn: str, table: str, path: Path, batch_size: int = 2000):
+    conn = await asyncpg.connect(dsn)
+    count = 0
+    started = time.perf_counter()
+    try:
+        async with binary_vector_codec(conn), conn.transaction():
+            with open(path, "w", encoding="utf-8") as output:
+                cursor = conn.cursor(
+                    f"SELECT document_id, content, embedding, metadata FROM {table} ORDER BY id",
+                    prefetch=batch_size,
+                )
+                async for row in cursor:
+                    output.write(json.dumps({
+                        "id": row["document_id"],
+                        "content": row["content"],
+                        "embedding": row["embedding"],
+                        "metadata": json.loads(row["metadata"] or "{}"),
+                    }, ensure_ascii=False) + "\n")
+                    count += 1
+    finally:
+        await conn.close()
+    print(f"✅ {count} filas exportadas a {path} en {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga/exportación masiva de legal_embeddings")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--input", type=Path, help="JSONL a cargar")
+    action.add_argument("--export", type=Path, help="Exportar la tabla a un JSONL")
+    parser.add_argument("--replace", action="store_true", help="Eliminar las filas que no están en el archivo")
+    parser.add_argument("--dsn", help="URL de PostgreSQL (por defecto la de la configuración)")
+    parser.add_argument("--table", default=TABLE_NAME)
+    args = parser.parse_args()
+
+    dsn = args.dsn or settings.postgres_url
+    if args.export:
+        asyncio.run(export(dsn, args.table, args.export))
+    else:
+        asyncio.run(load(dsn, args.table, args.input, args.replace))
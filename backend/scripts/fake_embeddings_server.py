@@ -0,0 +1,141 @@
+"""
+Servidor de embeddings falso compatible con la API de OpenAI.
+
+Devuelve vectores deterministas y aplica límites de requests y tokens por
+minuto (ventana deslizante de 60 s), respondiendo 429 con Retry-After como el
+proveedor real. Sirve para probar el pipeline de indexado sin gastar cuota.
+
+USO:
+    python scripts/fake_embeddings_server.py --rpm 60 --tpm 20000 --port 8100
+    OPENAI_BASE_URL=http://localhost:8100/v1 python scripts/index_legal_docs.py
+"""
+import argparse
+import asyncio
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Union
+import sys
+
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.rag.fakes import DeterministicFakeEmbeddings
+
+
+class EmbeddingRequest(BaseModel):
+    input: Union[str, List[str], List[int], List[List[int]]]
+    model: str = "text-embedding-3-small"
+    encoding_format: str = "float"
+
+
+class SlidingWindowLimit:
+    """Límite de unidades por ventana deslizante."""
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.events: deque = deque()
+        self.used = 0
+
+    def _expire(self, now: float):
+        while self.events and self.events[0][0] <= now - self.window:
+            self.used -= self.events.popleft()[1]
+
+    def retry_after(self, amount: int, now: float) -> float:
+        """0 si cabe `amount`; si no, segundos hasta que quepa."""
+        self._expire(now)
+        if self.used + amount <= self.limit or not self.events:
+            return 0.0
+        freed = self.used
+        for timestamp, units in self.events:
+            freed -= units
+            if freed + amount <= self.limit:
+                return timestamp + self.window - now
+        return self.window
+
+    def add(self, amount: int, now: float):
+        self.events.append((now, amount))
+        self.used += amount
+
+
+def create_app(rpm: int, tpm: int, dimensions: int, latency_ms: float) -> FastAPI:
+    app = FastAPI(title="Fake embeddings server")
+    embeddings = DeterministicFakeEmbeddings(dimensions)
+    requests_limit = SlidingWindowLimit(rpm)
+    tokens_limit = SlidingWindowLimit(tpm)
+    counters = {"requests": 0, "rejected": 0, "tokens": 0}
+
+    @app.post("/v1/embeddings")
+    async def create_embeddings(request: EmbeddingRequest):
+        inputs = request.input
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        # Los clientes de OpenAI pueden mandar el texto ya tokenizado
+        texts = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+        tokens = sum(len(item) if isinstance(item, list) else len(item) // 4 + 1 for item in inputs)
+
+        now = time.monotonic()
+        wait = max(requests_limit.retry_after(1, now), tokens_limit.retry_after(tokens, now))
+        if wait > 0:
+            counters["rejected"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": f"{wait:.3f}"},
+                content={"error": {
+                    "message": "Rate limit reached",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }},
+            )
+        requests_limit.add(1, now)
+        tokens_limit.add(tokens, now)
+        counters["requests"] += 1
+        counters["tokens"] += tokens
+
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+        vectors = embeddings.embed_documents(texts)
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": vector}
+                for i, vector in enumerate(vectors)
+            ],
+            "model": request.model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--rpm", type=int, default=3000, help="Requests per minute")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="Tokens per minute")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated latency per request")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(
+        create_app(args.rpm, args.tpm, args.dimensions, args.latency_ms),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
 """
-Script para indexar documentos legales en PGVector.
+Script para indexar documentos legales en el vector store configurado
+(PGVector por defecto, o el índice local con VECTOR_STORE_BACKEND=local).
 
 USO:
     python scripts/index_legal_docs.py --docs-dir data/legal_docs
+    python scripts/index_legal_docs.py --docs-dir data/legal_docs --full
+
+El indexado es incremental: un manifiesto con los hashes de cada archivo y de
+cada chunk (data/index_manifests/legal_embeddings.manifest.json) permite
+saltar archivos sin cambios, embeber solo los chunks nuevos y borrar los
+chunks de archivos editados o eliminados. --full ignora el manifiesto.
 
 REQUIERE:
-1. PostgreSQL corriendo con pgvector extension
+1. PostgreSQL corriendo con pgvector extension (solo backend pgvector)
 2. Tabla legal_embeddings creada
 3. OpenAI API key configurada
 4. Documentos legales en data/legal_docs/
@@ -20,18 +27,30 @@ data/legal_docs/
 import asyncio
 import argparse
 from pathlib import Path
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
 import sys
 
 # Agregar parent directory al path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langchain.schema import Document
 
 from app.config import settings
+from app.rag.answer_cache import RedisAnswerStore
+from app.rag.embedding_cache import build_embeddings
+from app.rag.embedding_pipeline import EmbeddingPipeline, aiter_in_thread, vectorstore_writer
+from app.rag.legal_chunker import LegalTextSplitter
+from app.rag.manifest import IndexManifest, default_manifest_path
+from app.rag.preprocessing import (
+    PREPROCESS_VERSION, FileTask, PreprocessStats, decode_bytes, iter_preprocessed, normalize_text
+)
+from app.rag.vectorstores import COLLECTION_NAME, get_vector_store, persist_vector_store
+from app.resources import create_redis_client
+
+
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 150
 
 
 # Mapeo de directorio -> área legal
@@ -44,86 +63,225 @@ AREA_MAPPING = {
     "ley_789": "laboral",
     "familia": "familia",
     "consumo": "consumo",
-    "propiedad_intelectual": "propiedad_intelectual"
+    "propiedad_intelectual": "propiedad_intelectual",
+    "constitucion": "constitucional",
 }
 
 
-def load_documents(docs_dir: Path) -> List[Document]:
-    """Carga documentos del directorio."""
-    documents = []
-    
-    for file_path in docs_dir.rglob("*.txt"):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Determinar área basado en filename
-        area = "otros"
-        for key, value in AREA_MAPPING.items():
-            if key.lower() in file_path.stem.lower():
-                area = value
-                break
-        
-        # Crear documento
-        doc = Document(
-            page_content=content,
-            metadata={
-                "source": file_path.name,
-                "area": area,
-                "path": str(file_path)
-            }
+def detect_area(file_path: Path) -> str:
+    """Determina el área legal basado en el nombre del archivo."""
+    for key, value in AREA_MAPPING.items():
+        if key.lower() in file_path.stem.lower():
+            return value
+    return "otros"
+
+
+def discover_files(docs_dir: Path) -> List[Path]:
+    """Lista los archivos .txt del corpus en orden estable."""
+    return sorted(docs_dir.rglob("*.txt"))
+
+
+def file_metadata(file_path: Path, docs_dir: Path) -> Dict[str, str]:
+    """Metadata base de los chunks de un archivo."""
+    return {
+        "source": file_path.name,
+        "area": detect_area(file_path),
+        "path": str(file_path.relative_to(docs_dir))
+    }
+
+
+def load_document(file_path: Path, docs_dir: Path) -> Document:
+    """Carga un archivo como documento (encoding corregido y normalizado)."""
+    with open(file_path, 'rb') as f:
+        content = normalize_text(decode_bytes(f.read()))
+
+    return Document(page_content=content, metadata=file_metadata(file_path, docs_dir))
+
+
+def iter_documents(docs_dir: Path) -> Iterator[Document]:
+    """Carga documentos del directorio uno a uno."""
+    for file_path in discover_files(docs_dir):
+        yield load_document(file_path, docs_dir)
+
+
+def get_text_splitter() -> LegalTextSplitter:
+    """
+    Splitter usado para dividir los documentos en chunks.
+
+    Un chunk por artículo (con título/capítulo/artículo en la metadata); solo
+    se solapan las partes de artículos que no caben en un chunk.
+    """
+    return LegalTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def chunker_fingerprint() -> str:
+    """Configuración de normalización + chunking registrada en el manifiesto."""
+    return f"{get_text_splitter().fingerprint()}|preprocess:v{PREPROCESS_VERSION}"
+
+
+def iter_chunks(documents: Iterator[Document]) -> Iterator[Document]:
+    """Divide documentos en chunks manejables, documento por documento."""
+    text_splitter = get_text_splitter()
+    for document in documents:
+        yield from text_splitter.split_documents([document])
+
+
+@dataclass
+class IndexPlan:
+    """Cambios detectados mientras se recorre el corpus."""
+    updates: Dict[str, Tuple[str, List[str]]] = field(default_factory=dict)
+    delete_ids: List[str] = field(default_factory=list)
+    removed_files: List[str] = field(default_factory=list)
+    skipped: int = 0
+    new_chunks: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.skipped} unchanged, {len(self.updates)} new/changed, "
+            f"{len(self.removed_files)} removed files → {self.new_chunks} chunks embedded, "
+            f"{len(self.delete_ids)} deleted"
         )
-        documents.append(doc)
-    
-    print(f"✓ Loaded {len(documents)} documents")
-    return documents
 
 
-def chunk_documents(documents: List[Document]) -> List[Document]:
-    """Divide documentos en chunks manejables."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    
-    chunks = text_splitter.split_documents(documents)
-    print(f"✓ Created {len(chunks)} chunks from {len(documents)} documents")
-    return chunks
+def iter_changes(
+    files: List[Path],
+    docs_dir: Path,
+    manifest: IndexManifest,
+    plan: IndexPlan,
+    workers: Optional[int] = None,
+    stats: Optional[PreprocessStats] = None
+) -> Iterator[Tuple[Document, str]]:
+    """
+    Preprocesa el corpus en paralelo y produce solo los chunks nuevos.
+
+    Lectura, normalización y chunking corren en un pool de procesos; los
+    resultados llegan en el orden de `files`. Los archivos cuyo hash no cambió
+    no se normalizan ni se dividen. Los chunks que dejaron de existir y el
+    estado de cada archivo se acumulan en `plan`.
+    """
+    tasks = []
+    for file_path in files:
+        name = str(file_path.relative_to(docs_dir))
+        entry = manifest.files.get(name)
+        tasks.append(FileTask(
+            path=str(file_path),
+            name=name,
+            metadata=file_metadata(file_path, docs_dir),
+            known_hash=entry.hash if entry else None
+        ))
+
+    for result in iter_preprocessed(tasks, CHUNK_SIZE, CHUNK_OVERLAP, workers=workers, stats=stats):
+        if result.skipped:
+            plan.skipped += 1
+            continue
 
+        ids = [chunk_id for _, _, chunk_id in result.chunks]
+        changes = manifest.diff(result.name, ids)
+        added = set(changes.added)
+        plan.delete_ids.extend(changes.removed)
+        plan.updates[result.name] = (result.hash, ids)
 
-async def index_documents(chunks: List[Document]):
-    """Indexa documentos en PGVector."""
+        for text, metadata, chunk_id in result.chunks:
+            if chunk_id in added:
+                plan.new_chunks += 1
+                yield Document(page_content=text, metadata={**metadata, "chunk_id": chunk_id}), chunk_id
+
+
+async def index_documents(
+    files: List[Path],
+    docs_dir: Path,
+    manifest: IndexManifest,
+    prune_missing: bool = True,
+    previous: Optional[IndexManifest] = None,
+    workers: Optional[int] = None
+) -> IndexPlan:
+    """
+    Indexa (upsert) los chunks nuevos y elimina los obsoletos del vector store.
+
+    Lectura, splitting, embeddings y escritura corren como un pipeline en
+    streaming: el primer archivo se escribe antes de leer el resto. Con
+    `previous` (re-indexado completo) también se eliminan los chunks de ese
+    manifiesto que ya no se generan.
+    """
     
     print("Initializing embeddings...")
-    embeddings = OpenAIEmbeddings(
-        model=settings.openai_embedding_model,
-        openai_api_key=settings.openai_api_key
-    )
+    # Embeddings con caché local: chunks ya embebidos no se vuelven a pagar.
+    # Los reintentos ante 429 los gestiona el pipeline.
+    embeddings = build_embeddings(max_retries=0)
     
-    print("Connecting to PostgreSQL...")
-    vectorstore = PGVector(
-        connection_string=settings.postgres_url,
-        embedding_function=embeddings,
-        collection_name="legal_embeddings",
-        pre_delete_collection=False  # No borrar datos existentes
-    )
+    print(f"Opening vector store ({settings.vector_store_backend})...")
+    vectorstore = get_vector_store(embeddings, COLLECTION_NAME, async_mode=True)
+    
+    plan = IndexPlan()
     
-    print(f"Indexing {len(chunks)} chunks...")
-    print("⚠️  This may take several minutes...")
+    def report(stats):
+        print(f"  ✓ Indexed {stats.chunks} chunks ({stats.batches} batches)")
     
-   # Batch processing para evitar rate limits
-    batch_size = 50
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i+batch_size]
-        await vectorstore.aadd_documents(batch)
-        print(f"  ✓ Indexed batch {i//batch_size + 1}/{(len(chunks)-1)//batch_size + 1}")
+    print(f"Indexing changes from {len(files)} files...")
+    # Embeddings y escrituras concurrentes, limitados por RPM/TPM; la lectura
+    # de archivos corre en un thread y como máximo INDEX_INFLIGHT_CHUNKS
+    # chunks están en memoria a la vez.
+    preprocess_stats = PreprocessStats()
+    pipeline = EmbeddingPipeline(embeddings, vectorstore_writer(vectorstore), on_progress=report)
+    stats = await pipeline.run(aiter_in_thread(
+        iter_changes(files, docs_dir, manifest, plan, workers=workers, stats=preprocess_stats)
+    ))
+    print(f"✓ Preprocessing: {preprocess_stats.report()}")
+    if stats.chunks:
+        print(f"✅ Successfully indexed {stats.summary()}")
     
-    print(f"✅ Successfully indexed {len(chunks)} chunks!")
+    if prune_missing:
+        plan.removed_files = manifest.missing(str(f.relative_to(docs_dir)) for f in files)
+        for name in plan.removed_files:
+            plan.delete_ids.extend(manifest.files[name].chunks)
+    
+    if previous is not None:
+        current = {chunk for _, ids in plan.updates.values() for chunk in ids}
+        plan.delete_ids.extend(
+            chunk for entry in previous.files.values()
+            for chunk in entry.chunks if chunk not in current
+        )
+    
+    # Se borra después de insertar: si el proceso se interrumpe, el
+    # manifiesto no se guarda y el siguiente run repite el trabajo.
+    if plan.delete_ids:
+        print(f"Deleting {len(plan.delete_ids)} stale chunks...")
+        await vectorstore.adelete(ids=plan.delete_ids)
+        
+        # Las respuestas cacheadas que citaban esos chunks quedan obsoletas
+        if settings.answer_cache_enabled:
+            await invalidate_cached_answers(plan.delete_ids)
+    
+    persist_vector_store(vectorstore)
+    print(f"✓ {plan.summary()}")
+    return plan
+
+
+async def invalidate_cached_answers(chunk_ids: List[str]) -> None:
+    """
+    Invalida en Redis las respuestas cacheadas que citan `chunk_ids`.
+
+    Sin el fallback en memoria de `create_answer_store`: la caché que ve la
+    API vive en Redis, e invalidar una copia local del script no haría nada.
+    """
+    redis_client = await create_redis_client()
+    if redis_client is None:
+        print(
+            f"⚠️  Redis not reachable at {settings.redis_url}: cached answer invalidation SKIPPED. "
+            f"Answers citing the {len(chunk_ids)} deleted chunks may be served until their TTL expires."
+        )
+        return
+    try:
+        answer_store = RedisAnswerStore(redis_client, max_entries=settings.answer_cache_max_entries)
+        invalidated = await answer_store.invalidate_chunks(chunk_ids)
+        pruned = await answer_store.prune_expired()
+        print(f"✓ Invalidated {invalidated} cached answers ({pruned} expired pruned)")
+    finally:
+        await redis_client.aclose()
 
 
 async def main():
-    parser = argparse.ArgumentParser(description="Index legal documents into PGVector")
+    parser = argparse.ArgumentParser(description="Index legal documents into the vector store")
     parser.add_argument(
         "--docs-dir",
         type=str,
@@ -135,6 +293,23 @@ async def main():
         action="store_true",
         help="Test mode: only index first 10 documents"
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest and re-embed every chunk"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Preprocessing processes (default: PREPROCESS_WORKERS or all cores)"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Path to the index manifest (default: <index_manifest_dir>/legal_embeddings.manifest.json)"
+    )
     
     args = parser.parse_args()
     
@@ -146,19 +321,43 @@ async def main():
         return
     
     print(f"📁 Loading documents from: {docs_dir}")
-    documents = load_documents(docs_dir)
+    files = discover_files(docs_dir)
     
-    if len(documents) == 0:
+    if len(files) == 0:
         print("❌ No documents found! Add .txt files to the docs directory.")
         return
     
     if args.test:
-        documents = documents[:10]
-        print(f"🧪 Test mode: Using only {len(documents)} documents")
+        files = files[:10]
+        print(f"🧪 Test mode: Using only {len(files)} documents")
+    
+    manifest_path = Path(args.manifest) if args.manifest else default_manifest_path(
+        settings.index_manifest_dir, COLLECTION_NAME
+    )
+    manifest = IndexManifest.load(manifest_path, COLLECTION_NAME, chunker=chunker_fingerprint())
+    previous = None
+    if args.full or manifest.rebuild_required:
+        # Re-embeber todo; lo registrado que ya no se genere se elimina
+        if manifest.rebuild_required:
+            print("⚠️  Chunker configuration changed: rebuilding the whole index")
+        previous, manifest = manifest, manifest.reset()
     
-    chunks = chunk_documents(documents)
+    plan = await index_documents(
+        files, docs_dir, manifest, prune_missing=not args.test, previous=previous,
+        workers=args.workers or settings.preprocess_workers or None
+    )
+    
+    if not plan.updates and not plan.removed_files and previous is None:
+        print("\n✅ Index is up to date. Nothing to do.")
+        return
     
-    await index_documents(chunks)
+    # Solo se persiste el manifiesto cuando las escrituras terminaron
+    for name, (content_hash, file_ids) in plan.updates.items():
+        manifest.update(name, content_hash, file_ids)
+    for name in plan.removed_files:
+        manifest.remove(name)
+    manifest.save()
+    print(f"✓ Manifest saved to {manifest_path} ({manifest.chunk_count()} chunks)")
     
     print("\n✅ Done! You can now use the RAG service.")
 
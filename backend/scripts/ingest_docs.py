@@ -1,25 +1,28 @@
 import os
+import sys
 import glob
 import asyncio
-from typing import List
+from typing import Iterable, Iterator, Tuple
+from pathlib import Path
 from dotenv import load_dotenv
 
 from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langchain_core.documents import Document
 
-load_dotenv()
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.rag.embedding_cache import build_embeddings
+from app.rag.embedding_pipeline import EmbeddingPipeline, aiter_in_thread, vectorstore_writer
+from app.rag.legal_chunker import LegalTextSplitter
+from app.rag.manifest import chunk_ids
+from app.rag.vectorstores import get_vector_store, persist_vector_store
 
-# Configuration
-DB_CONNECTION = f"postgresql+psycopg2://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
-COLLECTION_NAME = "legal_embeddings"
+load_dotenv()
 
-def load_documents(directory: str) -> List[Document]:
-    """Loads text files from the specified directory."""
-    documents = []
-    files = glob.glob(os.path.join(directory, "*.txt"))
+def iter_documents(directory: str) -> Iterator[Document]:
+    """Lazily loads text files from the specified directory."""
+    files = sorted(glob.glob(os.path.join(directory, "*.txt")))
     
     print(f"Found {len(files)} files in {directory}")
     
@@ -27,52 +30,49 @@ def load_documents(directory: str) -> List[Document]:
         try:
             loader = TextLoader(file_path, encoding="utf-8")
             docs = loader.load()
-            # Add metadata
-            for doc in docs:
-                doc.metadata["source"] = os.path.basename(file_path)
-                doc.metadata["area"] = "constitucional" # Default for sample
-            documents.extend(docs)
-            print(f"Loaded {file_path}")
         except Exception as e:
             print(f"Error loading {file_path}: {e}")
-            
-    return documents
+            continue
+        # Add metadata
+        for doc in docs:
+            doc.metadata["source"] = os.path.basename(file_path)
+            doc.metadata["area"] = "constitucional" # Default for sample (one of LEGAL_AREAS)
+        print(f"Loaded {file_path}")
+        yield from docs
 
-def split_documents(documents: List[Document]) -> List[Document]:
-    """Splits documents into chunks."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-    )
-    return text_splitter.split_documents(documents)
+def iter_chunks(documents: Iterable[Document]) -> Iterator[Tuple[Document, str]]:
+    """Splits documents into chunks, one document at a time.
+
+    Articles are kept whole when they fit (with título/capítulo/artículo
+    metadata) and each chunk gets a stable content-derived ID so re-ingesting
+    upserts instead of duplicating rows.
+    """
+    text_splitter = LegalTextSplitter(chunk_size=1500, chunk_overlap=150)
+    for document in documents:
+        chunks = text_splitter.split_documents([document])
+        ids = chunk_ids(document.metadata["source"], (chunk.page_content for chunk in chunks))
+        yield from zip(chunks, ids)
 
 def ingest_data():
     print("Starting ingestion process...")
-    
-    # 1. Load Documents
-    raw_docs = load_documents("data/raw")
-    if not raw_docs:
-        print("No documents found to ingest.")
-        return
-
-    # 2. Split Documents
-    chunks = split_documents(raw_docs)
-    print(f"Split into {len(chunks)} chunks.")
 
-    # 3. Initialize Embeddings & Vector Store
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    # 1. Initialize Embeddings & Vector Store
+    embeddings = build_embeddings("text-embedding-3-small", max_retries=0)
     
-    vector_store = PGVector(
-        embeddings=embeddings,
-        collection_name=COLLECTION_NAME,
-        connection=DB_CONNECTION,
-        use_jsonb=True,
-    )
+    # PGVector or local index, depending on VECTOR_STORE_BACKEND
+    vector_store = get_vector_store(embeddings)
 
-    # 4. Index Data (sync)
-    print("Indexing chunks into PGVector...")
-    vector_store.add_documents(chunks)
+    # 2. Stream load -> split -> embed -> write (sync I/O runs in worker threads,
+    #    at most INDEX_INFLIGHT_CHUNKS chunks are held in memory)
+    print("Indexing chunks into the vector store...")
+    pipeline = EmbeddingPipeline(embeddings, vectorstore_writer(vector_store, use_async=False))
+    chunks = aiter_in_thread(iter_chunks(iter_documents("data/raw")))
+    stats = asyncio.run(pipeline.run(chunks))
+    if not stats.chunks:
+        print("No documents found to ingest.")
+        return
+    persist_vector_store(vector_store)
+    print(stats.summary())
     
     print("Ingestion completed successfully!")
 
@@ -0,0 +1,468 @@
+"""
+Prueba de carga de extremo a extremo del endpoint de triaje.
+
+Arranca la aplicación (uvicorn, `--workers 1` por defecto) con proveedores
+falsos en proceso (`MODEL_PROVIDER=fake`, latencias con distribución
+configurable) y un índice local construido con data/raw, y la somete a
+etapas de carga:
+
+    --concurrency 1,8,32   lazo cerrado: N clientes que repiten al terminar
+    --rate 2,5,10          lazo abierto: llegadas de Poisson a R peticiones/s
+                           (la latencia se mide desde la llegada programada,
+                           así que la cola del lado cliente también cuenta)
+
+Por etapa reporta throughput, percentiles de latencia total y al primer
+byte, errores por tipo y el retraso del event loop del servidor (de
+/metrics). Marca la primera etapa que rompe el SLO (p95 o tasa de errores):
+la anterior es el punto de operación sostenible por worker. En lazo abierto
+la saturación se ve como latencia que crece sin techo (cola), no como menos
+throughput.
+
+USO:
+    python scripts/load_test.py --concurrency 1,4,16,64 --duration 20
+    python scripts/load_test.py --rate 2,5,10,20 --duration 30 \\
+        --llm-first-token-ms 800 --llm-token-delay-ms 25 --latency-distribution lognormal
+    python scripts/load_test.py --url http://localhost:8000 --rate 5 --duration 60
+
+REQUIERE:
+    uvicorn y httpx. Con --url no se arranca nada: el servidor ya debe estar
+    corriendo (por ejemplo con MODEL_PROVIDER=fake).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.parent
+RAW_DIR = BACKEND_DIR / "data" / "raw"
+COLLECTION_NAME = "legal_embeddings"   # app.rag.vectorstores.COLLECTION_NAME (sin importar settings)
+
+# Agregar parent directory al path
+sys.path.insert(0, str(BACKEND_DIR))
+
+QUERIES = [
+    "Me despidieron sin justa causa después de cinco años y no me pagaron la liquidación",
+    "Mi arrendador no me quiere devolver el depósito del apartamento",
+    "Compré un celular que salió defectuoso y la tienda no responde por la garantía",
+    "Quiero saber cómo se reparte la herencia de mi padre entre los hermanos",
+    "Mi expareja no paga la cuota de alimentos de nuestro hijo",
+    "Una empresa publicó mis datos personales sin autorización",
+    "Me acusan de un hurto que no cometí y me citaron a la fiscalía",
+    "El contratista abandonó la obra y ya le había pagado el anticipo",
+    "La EPS me negó un tratamiento que ordenó el médico tratante",
+    "Usaron mi logo registrado en otra marca sin permiso",
+    "Mi jefe me obliga a trabajar horas extra sin pagarlas",
+    "Quiero divorciarme de mutuo acuerdo y tenemos una casa en común",
+]
+
+_SAMPLE_RE = re.compile(r'^(event_loop_lag_\w+?)(?:\{quantile="([\d.]+)"\})? ([\d.eE+-]+)$', re.MULTILINE)
+
+
+# ----------------------------------------------------------------------
+# Servidor bajo prueba
+# ----------------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_local_index(index_dir: Path):
+    """Índice local de data/raw con los mismos embeddings falsos que usa la app."""
+    from langchain_core.documents import Document
+
+    from app.rag.fakes import DeterministicFakeEmbeddings
+    from app.rag.legal_chunker import LegalTextSplitter
+    from app.rag.local_store import LocalVectorStore
+    from app.rag.manifest import chunk_ids
+    from app.rag.preprocessing import normalize_text
+
+    store = LocalVectorStore(DeterministicFakeEmbeddings(), str(index_dir / COLLECTION_NAME))
+    splitter = LegalTextSplitter()
+    for path in sorted(RAW_DIR.glob("*.txt")):
+        document = Document(page_content=normalize_text(path.read_text(encoding="utf-8")), metadata={"source": path.name})
+        chunks = splitter.split_documents([document])
+        texts = [c.page_content for c in chunks]
+        store.add_texts(texts, [c.metadata for c in chunks], chunk_ids(path.name, texts))
+    store.persist()
+    return len(store)
+
+
+def server_env(args, index_dir: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    for required in ("OPENAI_API_KEY", "POSTGRES_PASSWORD", "SECRET_KEY"):
+        env.setdefault(required, "load-test")
+    env.update({
+        "MODEL_PROVIDER": "fake",
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_INDEX_DIR": str(index_dir),
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.llm_first_token_ms),
+        "FAKE_LLM_TOKEN_DELAY_MS": str(args.llm_token_delay_ms),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "FAKE_LATENCY_JITTER": str(args.latency_jitter),
+        "RATE_LIMIT_ENABLED": "false",
+        "TRACING_ENABLED": "false",
+        "LOG_LEVEL": args.server_log_level,
+    })
+    return env
+
+
+async def wait_ready(client: httpx.AsyncClient, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"El servidor terminó al arrancar (código {process.returncode})")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("El servidor no respondió a tiempo")
+
+
+async def loop_lag_snapshot(client: httpx.AsyncClient) -> Dict[str, float]:
+    """Métricas `event_loop_lag_*` del servidor (vacío si /metrics no responde)."""
+    try:
+        text = (await client.get("/metrics")).text
+    except httpx.HTTPError:
+        return {}
+    values = {}
+    for name, quantile, value in _SAMPLE_RE.findall(text):
+        values[f"{name}:{quantile}" if quantile else name] = float(value)
+    return values
+
+
+# ----------------------------------------------------------------------
+# Generador de carga
+# ----------------------------------------------------------------------
+
+@dataclass
+class StageStats:
+    kind: str                   # closed | open
+    level: float                # concurrencia o tasa ofrecida
+    duration_s: float
+    latencies_ms: List[float] = field(default_factory=list)
+    ttfb_ms: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    sent: int = 0
+    max_inflight: int = 0
+    elapsed_s: float = 0.0
+
+    def report(self, lag_before: Dict[str, float], lag_after: Dict[str, float], client_lag_ms: float) -> Dict[str, Any]:
+        ok = len(self.latencies_ms)
+        failed = sum(self.errors.values())
+        samples = lag_after.get("event_loop_lag_milliseconds_count", 0) - lag_before.get("event_loop_lag_milliseconds_count", 0)
+        lag_sum = lag_after.get("event_loop_lag_milliseconds_sum", 0) - lag_before.get("event_loop_lag_milliseconds_sum", 0)
+        return {
+            "mode": self.kind,
+            "concurrency" if self.kind == "closed" else "offered_rps": self.level,
+            "duration_s": round(self.elapsed_s, 2),
+            "sent": self.sent,
+            "ok": ok,
+            "errors": dict(self.errors),
+            "error_rate": round(failed / self.sent, 4) if self.sent else 0.0,
+            "throughput_rps": round(ok / self.elapsed_s, 2) if self.elapsed_s else 0.0,
+            **({"arrival_rps": round(self.sent / self.duration_s, 2)} if self.kind == "open" else {}),
+            "latency_ms": percentiles(self.latencies_ms),
+            "ttfb_ms": percentiles(self.ttfb_ms),
+            "max_inflight": self.max_inflight,
+            "server_loop_lag_ms": {
+                "mean": round(lag_sum / samples, 3) if samples else None,
+                "samples": int(samples),
+                # Percentiles acumulados desde el arranque del servidor
+                "p99_cumulative": lag_after.get("event_loop_lag_milliseconds:0.99"),
+                "max_cumulative": lag_after.get("event_loop_lag_max_milliseconds"),
+            },
+            "client_loop_lag_max_ms": round(client_lag_ms, 3),
+        }
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "max": round(max(samples), 2)}
+
+
+class LoadGenerator:
+    """Envía consultas de triaje y mide cada stream SSE hasta el evento `result`."""
+
+    def __init__(self, client: httpx.AsyncClient, api_prefix: str, seed: int):
+        self.client = client
+        self.path = f"{api_prefix}/triaje"
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self.inflight = 0
+
+    def _payload(self) -> Dict[str, str]:
+        # Número de caso para que no coincidan con caché ni coalescing
+        self.counter += 1
+        return {"query": f"{self.rng.choice(QUERIES)} (caso {self.counter})", "user_id": f"load-{self.counter % 1000}"}
+
+    async def request(self, stats: StageStats, started: Optional[float] = None):
+        """Una consulta; `started` es la llegada programada (lazo abierto)."""
+        started = started or time.perf_counter()
+        stats.sent += 1
+        self.inflight += 1
+        stats.max_inflight = max(stats.max_inflight, self.inflight)
+        ttfb = None
+        outcome = "no_result"
+        try:
+            async with self.client.stream("POST", self.path, json=self._payload()) as response:
+                if response.status_code != 200:
+                    outcome = f"http_{response.status_code}"
+                else:
+                    async for line in response.aiter_lines():
+                        if ttfb is None:
+                            ttfb = (time.perf_counter() - started) * 1000
+                        if line == "event: result":
+                            outcome = "ok"
+                        elif line == "event: error":
+                            outcome = "stream_error"
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as exc:
+            outcome = type(exc).__name__
+        finally:
+            self.inflight -= 1
+
+        if outcome == "ok":
+            stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+            stats.ttfb_ms.append(ttfb)
+        else:
+            stats.errors[outcome] += 1
+
+    async def closed_stage(self, concurrency: int, duration: float) -> StageStats:
+        stats = StageStats("closed", concurrency, duration)
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await self.request(stats)
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        stats.elapsed_s = time.perf_counter() - start
+        return stats
+
+    async def open_stage(self, rate: float, duration: float, max_inflight: int, poisson: bool) -> StageStats:
+        stats = StageStats("open", rate, duration)
+        tasks = set()
+        start = time.perf_counter()
+        arrival = start
+        while True:
+            arrival += self.rng.expovariate(rate) if poisson else 1 / rate
+            if arrival >= start + duration:
+                break
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            if self.inflight >= max_inflight:
+                stats.sent += 1
+                stats.errors["client_overload"] += 1
+                continue
+            task = asyncio.create_task(self.request(stats, started=arrival))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        stats.elapsed_s = time.perf_counter() - start
+        return stats
+
+
+async def client_lag_probe(interval: float, result: List[float]):
+    """Retraso máximo del loop del propio generador (si crece, el cliente es el cuello)."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        result[0] = max(result[0], (time.perf_counter() - started - interval) * 1000)
+
+
+def saturation(stages: List[Dict[str, Any]], slo_p95_ms: float, max_error_rate: float) -> Dict[str, Any]:
+    """Última etapa dentro del SLO y primera que lo rompe (con el motivo)."""
+    healthy, reasons = None, []
+    for stage in stages:
+        p95 = stage["latency_ms"]["p95"]
+        reasons = []
+        if stage["error_rate"] > max_error_rate:
+            reasons.append(f"error_rate {stage['error_rate']:.2%} > {max_error_rate:.2%}")
+        if p95 is None or p95 > slo_p95_ms:
+            reasons.append(f"p95 {p95} ms > {slo_p95_ms} ms")
+        if reasons:
+            return {"sustainable": healthy, "saturated": stage, "reasons": reasons}
+        healthy = stage
+    return {"sustainable": healthy, "saturated": None, "reasons": []}
+
+
+def stage_label(stage: Dict[str, Any]) -> str:
+    return f"c={stage['concurrency']}" if stage["mode"] == "closed" else f"{stage['offered_rps']} rps"
+
+
+def float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+async def run(args) -> Dict[str, Any]:
+    index_dir = None
+    if args.url is None:
+        index_dir = Path(tempfile.mkdtemp(prefix="load_test_index_"))
+    try:
+        return await run_stages(args, index_dir)
+    finally:
+        if index_dir is not None:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+
+async def run_stages(args, index_dir: Optional[Path]) -> Dict[str, Any]:
+    process = None
+    url = args.url
+    if url is None:
+        chunks = build_local_index(index_dir)
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        print(f"🚀 Arrancando app en {url} ({args.workers} worker(s), índice de {chunks} chunks)", file=sys.stderr)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR,
+            env=server_env(args, index_dir),
+        )
+
+    levels = max([*args.concurrency, args.max_inflight] or [1])
+    client = httpx.AsyncClient(
+        base_url=url,
+        timeout=httpx.Timeout(args.timeout, connect=10.0),
+        limits=httpx.Limits(max_connections=int(levels) + 10, max_keepalive_connections=int(levels) + 10),
+    )
+    client_lag = [0.0]
+    lag_task = asyncio.create_task(client_lag_probe(0.05, client_lag))
+    stages = []
+    try:
+        await wait_ready(client, process)
+        generator = LoadGenerator(client, args.api_prefix, args.seed)
+        if args.warmup > 0:
+            await generator.closed_stage(1, args.warmup)
+
+        plan = [("closed", c) for c in args.concurrency] + [("open", r) for r in args.rate]
+        for kind, level in plan:
+            lag_before = await loop_lag_snapshot(client)
+            client_lag[0] = 0.0
+            if kind == "closed":
+                stats = await generator.closed_stage(int(level), args.duration)
+            else:
+                stats = await generator.open_stage(level, args.duration, args.max_inflight, not args.constant_arrivals)
+            stage = stats.report(lag_before, await loop_lag_snapshot(client), client_lag[0])
+            stages.append(stage)
+            lag = stage["server_loop_lag_ms"]["mean"]
+            print(
+                f"   {stage_label(stage):<10} {stage['throughput_rps']:7.2f} rps  "
+                f"p50={stage['latency_ms']['p50']}ms p95={stage['latency_ms']['p95']}ms "
+                f"p99={stage['latency_ms']['p99']}ms ttfb_p95={stage['ttfb_ms']['p95']}ms "
+                f"errores={stage['error_rate']:.1%} loop_lag={lag}ms",
+                file=sys.stderr,
+            )
+            if client_lag[0] > 100:
+                print(f"   ⚠️  El generador tuvo {client_lag[0]:.0f} ms de retraso: resultados limitados por el cliente",
+                      file=sys.stderr)
+            if args.sleep_between > 0:
+                await asyncio.sleep(args.sleep_between)
+    finally:
+        lag_task.cancel()
+        await client.aclose()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "load_test": "triaje",
+        "target": url if args.url else "local",
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "params": {
+            "workers": args.workers if args.url is None else None,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "arrivals": "constant" if args.constant_arrivals else "poisson",
+            "llm_first_token_ms": args.llm_first_token_ms,
+            "llm_token_delay_ms": args.llm_token_delay_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "latency_distribution": args.latency_distribution,
+            "latency_jitter": args.latency_jitter,
+            "slo_p95_ms": args.slo_p95_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "stages": stages,
+        "saturation": saturation(stages, args.slo_p95_ms, args.max_error_rate),
+    }
+
+
+def main():
+    from app.rag.fakes import LATENCY_DISTRIBUTIONS
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del triaje con proveedores falsos")
+    parser.add_argument("--url", help="Servidor ya corriendo (no se arranca uno)")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn del servidor arrancado")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in float_list(v)], default=[],
+                        help="Etapas de lazo cerrado (clientes concurrentes)")
+    parser.add_argument("--rate", type=float_list, default=[], help="Etapas de lazo abierto (peticiones/s)")
+    parser.add_argument("--constant-arrivals", action="store_true", help="Llegadas equiespaciadas en vez de Poisson")
+    parser.add_argument("--max-inflight", type=int, default=500, help="Tope de peticiones abiertas (lazo abierto)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos por etapa")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos de calentamiento (no se reportan)")
+    parser.add_argument("--sleep-between", type=float, default=1.0, help="Pausa entre etapas")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por petición")
+    parser.add_argument("--llm-first-token-ms", type=float, default=500.0)
+    parser.add_argument("--llm-token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--server-log-level", default="ERROR")
+    parser.add_argument("--slo-p95-ms", type=float, default=15_000.0, help="p95 máximo aceptable del stream completo")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON (por defecto, stdout)")
+    args = parser.parse_args()
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1, 4, 16]
+
+    report = asyncio.run(run(args))
+    result = report["saturation"]
+    if result["saturated"] is not None:
+        sustainable = stage_label(result["sustainable"]) if result["sustainable"] else "ninguna"
+        print(f"\n📉 Saturación en {stage_label(result['saturated'])} ({'; '.join(result['reasons'])}); "
+              f"última etapa sostenible: {sustainable}", file=sys.stderr)
+    else:
+        print("\n✅ Todas las etapas dentro del SLO", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"✅ Resultados en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
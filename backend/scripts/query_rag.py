@@ -1,42 +1,57 @@
 
-import os
+import sys
 import asyncio
+import argparse
+from functools import lru_cache
+from pathlib import Path
 from dotenv import load_dotenv
 
 from langchain.chains.retrieval_qa import RetrievalQA
-from langchain_openai import OpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
+from langchain_openai import OpenAI
 from langchain_core.documents import Document
 
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.rag.answer_cache import CachedAnswer, create_answer_cache
+from app.rag.areas import normalize_area
+from app.rag.embedding_cache import CachedEmbeddings, TracedEmbeddings
+from app.rag.retrieval import get_retriever
+from app.resources import AppResources
+
 load_dotenv()
 
-# Configuration
-DB_CONNECTION = f"postgresql+psycopg2://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
-COLLECTION_NAME = "legal_embeddings"
-
-# Initialize components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-vector_store = PGVector(
-    embeddings=embeddings,
-    collection_name=COLLECTION_NAME,
-    connection=DB_CONNECTION,
-    use_jsonb=True,
-)
-retriever = vector_store.as_retriever(search_kwargs={"k": 4})
-
-# LLM for answering
-llm = OpenAI(model="gpt-4o-mini")
-
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=retriever,
-    return_source_documents=True,
-)
-
-def ask_question(question: str):
-    result = qa_chain.invoke({"query": question})
-    answer = result.get("result")
-    sources = result.get("source_documents", [])
+
+# Shared clients (HTTP keep-alive, DB/Redis pools), vector store, LLM and
+# answer cache are created once in main(): they need a running event loop.
+resources = None
+llm = None
+answer_cache = None
+
+
+@lru_cache()
+def get_qa_chain(area: str = None):
+    """QA chain whose retriever is restricted to `area` (None = whole corpus)."""
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        retriever=get_retriever(resources.vector_store, k=4, area=area),
+        return_source_documents=True,
+    )
+
+
+async def ask_question(question: str, area: str = None):
+    area = normalize_area(area)
+    cached = await answer_cache.lookup(question, area) if answer_cache else None
+    if cached is not None:
+        answer, sources = cached.answer, cached.documents()
+        print(f"\n(cached answer, {cached.match} match, similarity {cached.similarity:.3f})")
+    else:
+        result = await get_qa_chain(area).ainvoke({"query": question})
+        answer = result.get("result")
+        sources = result.get("source_documents", [])
+        if answer_cache and answer:
+            await answer_cache.store_answer(CachedAnswer.from_documents(question, answer, sources, area))
+
     print("\nAnswer:\n", answer)
     if sources:
         print("\nSources:")
@@ -44,18 +59,46 @@ def ask_question(question: str):
             source = doc.metadata.get("source", "unknown")
             print(f"  {i}. {source}")
 
-def main():
+async def main():
+    global resources, llm, answer_cache
+
+    parser = argparse.ArgumentParser(description="Interactive RAG queries over the legal corpus")
+    parser.add_argument(
+        "--area",
+        default=None,
+        help="Restrict retrieval to a legal area (laboral, penal, civil, ...)"
+    )
+    args = parser.parse_args()
+
+    resources = await AppResources.create()
+    llm = OpenAI(model="gpt-4o-mini", http_async_client=resources.http_client)
+    answer_cache = await create_answer_cache(resources.embeddings, resources.redis)
+    if answer_cache:
+        answer_cache.start()
+
     print("Legal AI RAG Query Interface (type 'exit' to quit)")
+    if args.area:
+        print(f"Area filter: {args.area}")
     while True:
         try:
-            query = input("\nYour question: ")
+            query = await asyncio.to_thread(input, "\nYour question: ")
         except (EOFError, KeyboardInterrupt):
             break
         if query.strip().lower() in {"exit", "quit"}:
             break
         if not query.strip():
             continue
-        ask_question(query)
+        await ask_question(query, area=args.area)
+    
+    embeddings = resources.embeddings
+    if isinstance(embeddings, TracedEmbeddings):
+        embeddings = embeddings.embeddings
+    if isinstance(embeddings, CachedEmbeddings):
+        print(f"\nEmbedding cache: {embeddings.store.stats()}")
+    if answer_cache:
+        print(f"Answer cache: {answer_cache.stats()}")
+        await answer_cache.stop()
+    await resources.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,8 +1,29 @@
+"""
+Crea la base, la tabla legal_embeddings y sus índices.
+
+USO:
+    python scripts/setup_db.py
+    python scripts/setup_db.py --defer-index   # carga masiva primero, luego:
+    python scripts/tune_hnsw.py build
+
+Con --defer-index no se crean los índices HNSW: insertar en una tabla sin
+índice vectorial es mucho más rápido y el grafo se construye una sola vez,
+en bloque, al final. Los parámetros salen de HNSW_M, HNSW_EF_CONSTRUCTION y
+HNSW_EF_SEARCH (este último se fija a nivel de base con ALTER DATABASE).
+"""
 import os
+import sys
+import argparse
 import asyncio
 import asyncpg
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.rag.pg_store import HNSW_DEFAULT_EF_CONSTRUCTION, HNSW_DEFAULT_M, hnsw_indexes
+
 load_dotenv()
 
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
@@ -10,8 +31,11 @@ DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 DB_NAME = os.getenv("POSTGRES_DB", "tuavocadonet")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+HNSW_M = int(os.getenv("HNSW_M", HNSW_DEFAULT_M))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", HNSW_DEFAULT_EF_CONSTRUCTION))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "0"))
 
-async def setup_database():
+async def setup_database(defer_index: bool = False):
     # Connect to default 'postgres' db to create the target db if it doesn't exist
     sys_conn = await asyncpg.connect(
         user=DB_USER,
@@ -56,16 +80,63 @@ async def setup_database():
         );
     """)
     
-    # Create HNSW index for faster similarity search
-    print("Creating vector index...")
+    # Spanish full-text search without accents ("articulo" matches "artículo")
+    print("Creating full-text search column...")
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
     await conn.execute("""
-        CREATE INDEX IF NOT EXISTS legal_embeddings_embedding_idx 
-        ON legal_embeddings 
-        USING hnsw (embedding vector_cosine_ops);
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish);
+                ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+            END IF;
+        END
+        $$;
     """)
+    await conn.execute("""
+        ALTER TABLE legal_embeddings
+        ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('spanish_unaccent'::regconfig, coalesce(content, ''))) STORED;
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS legal_embeddings_content_tsv_idx
+        ON legal_embeddings
+        USING gin (content_tsv);
+    """)
+
+
+    # Chunk IDs are content hashes; upserts from the indexer rely on this
+    await conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS legal_embeddings_document_id_key
+        ON legal_embeddings (document_id);
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS legal_embeddings_area_idx
+        ON legal_embeddings (area);
+    """)
+
+    # HNSW index for similarity search, plus one partial graph per area:
+    # area-filtered queries walk only that graph instead of post-filtering the
+    # global one (which loses recall and explores far more nodes when the area
+    # is a small slice of the corpus).
+    if defer_index:
+        print("Skipping vector indexes (--defer-index); build them after loading with scripts/tune_hnsw.py build")
+    else:
+        print(f"Creating vector indexes (m={HNSW_M}, ef_construction={HNSW_EF_CONSTRUCTION})...")
+        for _, statement in hnsw_indexes(m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION):
+            await conn.execute(statement)
+
+    # Default for every new connection (the app pool also sets it per session)
+    if HNSW_EF_SEARCH > 0:
+        print(f"Setting hnsw.ef_search = {HNSW_EF_SEARCH} for database {DB_NAME}...")
+        await conn.execute(f"ALTER DATABASE {DB_NAME} SET hnsw.ef_search = {HNSW_EF_SEARCH}")
 
     print("Database setup completed successfully.")
     await conn.close()
 
 if __name__ == "__main__":
-    asyncio.run(setup_database())
+    parser = argparse.ArgumentParser(description="Create the database, legal_embeddings and its indexes")
+    parser.add_argument("--defer-index", action="store_true", help="Do not create HNSW indexes (bulk load first)")
+    args = parser.parse_args()
+    asyncio.run(setup_database(defer_index=args.defer_index))
@@ -0,0 +1,323 @@
+"""
+Mantenimiento y ajuste de los índices HNSW de legal_embeddings.
+
+Comandos:
+    status          índices HNSW (parámetros y tamaño) y hnsw.ef_search vigente
+    build           borra y construye en bloque los índices (después de una carga
+                    masiva con setup_db.py --defer-index); --concurrently construye
+                    una copia sin bloquear escrituras y la intercambia al final
+    sweep           barre m / ef_construction / ef_search sobre el índice global y
+                    reporta tiempo de construcción, tamaño, latencia y recall@k
+                    contra la búsqueda exacta; --apply deja la mejor combinación
+    set-ef-search   fija hnsw.ef_search para la base (ALTER DATABASE)
+
+USO:
+    python scripts/tune_hnsw.py status
+    python scripts/tune_hnsw.py build --m 16 --ef-construction 128 --maintenance-work-mem 4GB
+    python scripts/tune_hnsw.py sweep --m 8,16,32 --ef-construction 64,128 \\
+        --ef-search 20,40,80,160 --target-recall 0.95 --output hnsw_sweep.json
+    python scripts/tune_hnsw.py set-ef-search 80
+
+Las consultas del barrido son puntos medios entre pares de embeddings de la
+tabla (semilla fija): no coinciden con ninguna fila, pero caen en regiones
+pobladas del espacio como las consultas reales.
+
+La API toma ef_search de HNSW_EF_SEARCH (parámetro de sesión del pool); el
+valor de la base (set-ef-search, --apply) cubre además scripts y psql.
+
+REQUIERE:
+    PostgreSQL con pgvector >= 0.5 y la tabla de scripts/setup_db.py.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Agregar parent directory al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncpg
+
+from app.config import settings
+from app.rag.pg_store import TABLE_NAME, hnsw_indexes, vector_literal
+
+
+_MEMORY_RE = re.compile(r"^\d+\s*(kB|MB|GB)$")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+async def configure_build_session(conn, maintenance_work_mem: str, parallel_workers: int):
+    """Memoria y workers para la construcción: con el grafo en memoria el build es varias veces más rápido."""
+    if not _MEMORY_RE.match(maintenance_work_mem):
+        raise SystemExit(f"maintenance_work_mem inválido: {maintenance_work_mem} (p. ej. 2GB)")
+    await conn.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+    await conn.execute(f"SET max_parallel_maintenance_workers = {int(parallel_workers)}")
+
+
+async def build_index(conn, name: str, statement: str, concurrently: bool = False) -> Dict[str, Any]:
+    """Reconstruye un índice; con `concurrently` lo construye como `<name>_new` y lo intercambia."""
+    started = time.perf_counter()
+    if concurrently:
+        staging = f"{name}_new"
+        await conn.execute(f"DROP INDEX IF EXISTS {staging}")
+        await conn.execute(
+            statement.replace(f"CREATE INDEX IF NOT EXISTS {name}", f"CREATE INDEX CONCURRENTLY {staging}", 1)
+        )
+        async with conn.transaction():
+            await conn.execute(f"DROP INDEX IF EXISTS {name}")
+            await conn.execute(f"ALTER INDEX {staging} RENAME TO {name}")
+    else:
+        await conn.execute(f"DROP INDEX IF EXISTS {name}")
+        await conn.execute(statement)
+    build_s = time.perf_counter() - started
+    size = await conn.fetchval("SELECT pg_relation_size($1::text::regclass)", name)
+    return {"index": name, "build_s": round(build_s, 2), "size_bytes": size}
+
+
+async def build(conn, args, m: int, ef_construction: int, global_only: bool = False) -> List[Dict[str, Any]]:
+    await configure_build_session(conn, args.maintenance_work_mem, args.parallel_workers)
+    results = []
+    indexes = hnsw_indexes(args.table, m, ef_construction)
+    for name, statement in indexes[:1] if global_only else indexes:
+        result = await build_index(conn, name, statement, concurrently=getattr(args, "concurrently", False))
+        print(f"   🏗️  {name}: {result['build_s']}s, {result['size_bytes'] / 2**20:.1f} MiB", file=sys.stderr)
+        results.append(result)
+    await conn.execute(f"ANALYZE {args.table}")
+    return results
+
+
+# ----------------------------------------------------------------------
+# Barrido
+# ----------------------------------------------------------------------
+
+async def sample_queries(conn, table: str, count: int, seed: int) -> List[List[float]]:
+    """Puntos medios normalizados entre pares de embeddings al azar (reproducible con `seed`)."""
+    total = await conn.fetchval(f"SELECT count(*) FROM {table}")
+    if total < 2:
+        raise SystemExit(f"{table} tiene {total} filas: no hay con qué medir")
+    # Muestra por id: evita ORDER BY random() sobre toda la tabla
+    ids = await conn.fetch(f"SELECT id FROM {table}")
+    rng = random.Random(seed)
+    chosen = rng.sample([row["id"] for row in ids], min(len(ids), 2 * count))
+    rows = await conn.fetch(f"SELECT id, embedding::text AS embedding FROM {table} WHERE id = ANY($1::int[])", chosen)
+    vectors = {row["id"]: np.asarray(json.loads(row["embedding"]), dtype=np.float32) for row in rows}
+    queries = []
+    for first, second in zip(chosen[0::2], chosen[1::2]):
+        midpoint = vectors[first] + vectors[second]
+        queries.append((midpoint / (np.linalg.norm(midpoint) or 1.0)).tolist())
+    return queries
+
+
+def search_sql(table: str) -> str:
+    return f"SELECT id FROM {table} ORDER BY embedding <=> $1::vector LIMIT $2"
+
+
+async def exact_neighbors(conn, table: str, queries: List[str], k: int) -> List[List[int]]:
+    """Top-k exacto: sin índices, el planificador recorre la tabla completa."""
+    truth = []
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_indexscan = off")
+        await conn.execute("SET LOCAL enable_bitmapscan = off")
+        for literal in queries:
+            truth.append([row["id"] for row in await conn.fetch(search_sql(table), literal, k)])
+    return truth
+
+
+async def measure(conn, table: str, queries: List[str], truth: List[List[int]], k: int, ef_search: int, warmup: int):
+    await conn.execute(f"SET hnsw.ef_search = {int(ef_search)}")
+    sql = search_sql(table)
+    for literal in queries[:warmup]:
+        await conn.fetch(sql, literal, k)
+    latencies, hits = [], 0
+    for literal, expected in zip(queries, truth):
+        started = time.perf_counter()
+        rows = await conn.fetch(sql, literal, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({row["id"] for row in rows} & set(expected))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    expected_total = sum(len(expected) for expected in truth)
+    return {
+        "ef_search": ef_search,
+        "recall": round(hits / expected_total, 4) if expected_total else 1.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def best_setting(results: List[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """La combinación más rápida (p95) que alcanza `target_recall`."""
+    candidates = [
+        {**build_result, **point}
+        for build_result in results
+        for point in build_result["ef_search"]
+        if point["recall"] >= target_recall
+    ]
+    return min(candidates, key=lambda c: (c["p95_ms"], c["build_s"]), default=None)
+
+
+async def sweep(conn, args) -> Dict[str, Any]:
+    k = args.k
+    if min(args.ef_search) < k:
+        print(f"⚠️  ef_search < k ({k}) limita los resultados a ef_search filas", file=sys.stderr)
+
+    print(f"🎯 {args.queries} consultas, verdad exacta (recorrido completo)...", file=sys.stderr)
+    queries = [vector_literal(q) for q in await sample_queries(conn, args.table, args.queries, args.seed)]
+    started = time.perf_counter()
+    truth = await exact_neighbors(conn, args.table, queries, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    results = []
+    for m in args.m:
+        for ef_construction in args.ef_construction:
+            print(f"\n🔧 m={m} ef_construction={ef_construction}", file=sys.stderr)
+            built = (await build(conn, args, m, ef_construction, global_only=True))[0]
+            points = []
+            for ef_search in args.ef_search:
+                point = await measure(conn, args.table, queries, truth, k, ef_search, args.warmup)
+                points.append(point)
+                print(
+                    f"   ef_search={ef_search:<4} recall@{k}={point['recall']:.3f} "
+                    f"p50={point['p50_ms']:.2f}ms p95={point['p95_ms']:.2f}ms",
+                    file=sys.stderr,
+                )
+            results.append({"m": m, "ef_construction": ef_construction, "build_s": built["build_s"],
+                            "size_bytes": built["size_bytes"], "ef_search": points})
+
+    best = best_setting(results, args.target_recall)
+    await conn.execute("RESET hnsw.ef_search")
+    if best is not None and args.apply:
+        print(f"\n✅ Aplicando m={best['m']} ef_construction={best['ef_construction']} "
+              f"ef_search={best['ef_search']}", file=sys.stderr)
+        await build(conn, args, best["m"], best["ef_construction"])
+        await set_ef_search(conn, best["ef_search"])
+    else:
+        # Dejar el índice global como lo define la configuración
+        print(f"\n↩️  Restaurando m={settings.hnsw_m} ef_construction={settings.hnsw_ef_construction}", file=sys.stderr)
+        await build(conn, args, settings.hnsw_m, settings.hnsw_ef_construction, global_only=True)
+
+    rows = await conn.fetchval(f"SELECT count(*) FROM {args.table}")
+    return {
+        "table": args.table,
+        "rows": rows,
+        "queries": len(queries),
+        "k": k,
+        "target_recall": args.target_recall,
+        "exact_scan_ms_per_query": round(exact_ms, 3),
+        "results": results,
+        "best": best,
+    }
+
+
+# ----------------------------------------------------------------------
+# ef_search y estado
+# ----------------------------------------------------------------------
+
+async def set_ef_search(conn, ef_search: int):
+    database = await conn.fetchval("SELECT quote_ident(current_database())")
+    await conn.execute(f"ALTER DATABASE {database} SET hnsw.ef_search = {int(ef_search)}")
+    print(f"✅ hnsw.ef_search = {ef_search} para la base {database} (conexiones nuevas).", file=sys.stderr)
+    print(f"   Para el pool de la API: HNSW_EF_SEARCH={ef_search}", file=sys.stderr)
+
+
+async def status(conn, table: str) -> Dict[str, Any]:
+    indexes = await conn.fetch(
+        """
+        SELECT c.relname AS name, c.reloptions AS options, pg_relation_size(c.oid) AS size_bytes,
+               pg_get_expr(i.indpred, i.indrelid) AS predicate
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am a ON a.oid = c.relam
+        WHERE i.indrelid = $1::text::regclass AND a.amname = 'hnsw'
+        ORDER BY c.relname
+        """,
+        table,
+    )
+    try:
+        ef_search = await conn.fetchval("SHOW hnsw.ef_search")
+    except asyncpg.PostgresError:
+        ef_search = None
+    return {
+        "table": table,
+        "rows": await conn.fetchval(f"SELECT count(*) FROM {table}"),
+        "ef_search": ef_search,
+        "indexes": [
+            {"name": row["name"], "options": row["options"] or ["m=16", "ef_construction=64"],
+             "size_bytes": row["size_bytes"], "predicate": row["predicate"]}
+            for row in indexes
+        ],
+    }
+
+
+async def main(args) -> Optional[Dict[str, Any]]:
+    conn = await asyncpg.connect(args.dsn or settings.postgres_url)
+    try:
+        # pgvector carga sus parámetros (hnsw.*) al usarse por primera vez en la sesión
+        await conn.execute("SELECT '[1]'::vector")
+        if args.command == "status":
+            return await status(conn, args.table)
+        if args.command == "build":
+            started = time.perf_counter()
+            results = await build(conn, args, args.m, args.ef_construction)
+            print(f"✅ Índices construidos en {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            return {"m": args.m, "ef_construction": args.ef_construction, "indexes": results}
+        if args.command == "sweep":
+            return await sweep(conn, args)
+        if args.command == "set-ef-search":
+            await set_ef_search(conn, args.ef_search)
+            return None
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste y mantenimiento de índices HNSW")
+    parser.add_argument("--dsn", help="URL de PostgreSQL (por defecto la de la configuración)")
+    parser.add_argument("--table", default=TABLE_NAME)
+    parser.add_argument("--output", help="Archivo JSON con el resultado (por defecto, stdout)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="Índices y ef_search actual")
+
+    build_parser = commands.add_parser("build", help="Construir (o reconstruir) los índices HNSW")
+    build_parser.add_argument("--m", type=int, default=settings.hnsw_m)
+    build_parser.add_argument("--ef-construction", type=int, default=settings.hnsw_ef_construction)
+    build_parser.add_argument("--concurrently", action="store_true", help="Sin bloquear escrituras (más lento)")
+
+    sweep_parser = commands.add_parser("sweep", help="Barrido de parámetros: recall vs latencia")
+    sweep_parser.add_argument("--m", type=int_list, default=[8, 16, 32])
+    sweep_parser.add_argument("--ef-construction", type=int_list, default=[64, 128])
+    sweep_parser.add_argument("--ef-search", type=int_list, default=[20, 40, 80, 160])
+    sweep_parser.add_argument("--queries", type=int, default=200)
+    sweep_parser.add_argument("--warmup", type=int, default=20)
+    sweep_parser.add_argument("--k", type=int, default=10)
+    sweep_parser.add_argument("--seed", type=int, default=42)
+    sweep_parser.add_argument("--target-recall", type=float, default=0.95)
+    sweep_parser.add_argument("--apply", action="store_true", help="Reconstruir con la mejor combinación y fijar ef_search")
+
+    for sub in (build_parser, sweep_parser):
+        sub.add_argument("--maintenance-work-mem", default="1GB", help="Memoria para construir (idealmente > tamaño del grafo)")
+        sub.add_argument("--parallel-workers", type=int, default=4, help="max_parallel_maintenance_workers")
+
+    ef_parser = commands.add_parser("set-ef-search", help="Fijar hnsw.ef_search para la base")
+    ef_parser.add_argument("ef_search", type=int)
+
+    args = parser.parse_args()
+    result = asyncio.run(main(args))
+    if result is not None:
+        output = json.dumps(result, indent=2, ensure_ascii=False, default=str)
+        if args.output:
+            Path(args.output).write_text(output + "\n", encoding="utf-8")
+            print(f"✅ Resultados en {args.output}", file=sys.stderr)
+        else:
+            print(output)
@@ -0,0 +1,6 @@
+import os
+
+# `app.config.Settings` exige estas variables al importarse; los tests no
+# usan servicios externos, así que basta con valores de relleno.
+for _name in ("OPENAI_API_KEY", "POSTGRES_PASSWORD", "SECRET_KEY"):
+    os.environ.setdefault(_name, "test")
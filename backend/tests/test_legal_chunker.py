@@ -0,0 +1,32 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.rag.legal_chunker import LegalTextSplitter
+
+
+def _articles(text: str) -> list:
+    chunks = LegalTextSplitter().split_documents([Document(page_content=text, metadata={})])
+    return [chunk.metadata.get("articulo") for chunk in chunks]
+
+
+@pytest.mark.parametrize(
+    ("heading", "expected"),
+    [
+        ("ARTÍCULO 86 y siguientes. Texto del artículo.", "86"),
+        ("Artículo 20 a los trabajadores se les reconoce.", "20"),
+        ("ARTÍCULO 5 e indemnización.", "5"),
+        ("ARTÍCULO 1o. Objeto.", "1"),
+        ("ARTÍCULO 1°. Objeto.", "1"),
+        ("ARTÍCULO 5A. Adicionado.", "5A"),
+        ("ARTÍCULO 5-A. Adicionado.", "5A"),
+        ("Artículo 5o-A. Adicionado.", "5A"),
+        ("ARTÍCULO TRANSITORIO. Vigencia.", "TRANSITORIO"),
+    ],
+)
+def test_article_heading_number(heading, expected):
+    assert _articles(heading) == [expected]
+
+
+def test_articles_split_sections():
+    text = "ARTÍCULO 1. Primero.\nARTÍCULO 2 y último. Segundo."
+    assert _articles(text) == ["1", "2"]
@@ -0,0 +1,26 @@
+import pytest
+
+from app.rag.lexical import extract_citations
+
+
+@pytest.mark.parametrize(
+    ("query", "articles"),
+    [
+        ("¿Qué dice el artículo 86 y cómo aplica?", ["86"]),
+        ("artículo 20 a quién aplica", ["20"]),
+        ("art. 5 e indemnización", ["5"]),
+        ("artículo 10 o 11 del código", ["10"]),
+        ("¿Qué establece el artículo 5A?", ["5A"]),
+        ("art. 20-A de la ley", ["20A"]),
+        ("artículo 1o del decreto", ["1"]),
+        ("el art 22 y el artículo 23", ["22", "23"]),
+    ],
+)
+def test_extract_article_citations(query, articles):
+    assert extract_citations(query).articles == articles
+
+
+def test_extract_norm_citations():
+    citations = extract_citations("Ley 1581 de 2012 y la sentencia T-760")
+    assert citations.articles == []
+    assert citations.norms == ["ley 1581", "t 760"]
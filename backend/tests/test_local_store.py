@@ -0,0 +1,13 @@
+from app.rag.fakes import DeterministicFakeEmbeddings
+from app.rag.local_store import LocalVectorStore
+
+
+def test_add_embeddings_dedupes_ids_within_batch():
+    store = LocalVectorStore(DeterministicFakeEmbeddings())
+    vectors = [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]
+    store.add_embeddings(["viejo", "otro", "nuevo"], vectors, ids=["a", "b", "a"])
+
+    assert len(store) == 2
+    assert [doc.page_content for doc in store.get_by_ids(["a", "b"])] == ["nuevo", "otro"]
+    results = store.similarity_search_by_vector([1.0, 0.0], k=5)
+    assert sorted(doc.page_content for doc in results) == ["nuevo", "otro"]